@@ -16,6 +16,8 @@ from dendro.api_helpers.routers.processor.router import router as processor_rout
 from dendro.api_helpers.routers.compute_resource.router import router as compute_resource_router
 from dendro.api_helpers.routers.client.router import router as client_router
 from dendro.api_helpers.routers.gui.router import router as gui_router
+from dendro.api_helpers.clients._get_http_session import _close_http_session
+from dendro.api_helpers.clients.pubsub import PubsubFlushMiddleware
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -42,6 +44,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# publish pubsub messages after the request has been handled (when ENABLE_DEFERRED_PUBSUB_PUBLISHING is set)
+app.add_middleware(PubsubFlushMiddleware)
+
+# close the pooled session used for outbound http requests
+@app.on_event("shutdown")
+async def shutdown_event():
+    await _close_http_session()
+
 # requests from a processing job
 app.include_router(processor_router, prefix="/api/processor", tags=["Processor"])
 
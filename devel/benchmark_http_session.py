@@ -0,0 +1,70 @@
+# Compare outbound request latency from the API when opening a new aiohttp session
+# per request (old behavior) versus using the pooled per-event-loop session.
+# A local stub server is used so that the results are not dominated by the network.
+#
+# Usage: python devel/benchmark_http_session.py [num_requests] [concurrency]
+
+import os
+import sys
+import time
+import asyncio
+import aiohttp
+from aiohttp import web
+
+thisdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(thisdir + "/../python")
+from dendro.api_helpers.clients._get_http_session import _get_http_session, _close_http_session # noqa: E402
+
+
+async def _start_stub_server():
+
+    async def handle(request):
+        return web.Response(text='{"files": []}', content_type='application/json')
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1] # type: ignore
+    return runner, f'http://127.0.0.1:{port}'
+
+async def _request_with_new_session(url: str):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as resp:
+            await resp.read()
+
+async def _request_with_pooled_session(url: str):
+    session = _get_http_session()
+    async with session.get(url) as resp:
+        await resp.read()
+
+async def _run(label: str, func, url: str, num_requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await func(f'{url}/file_manifest_{i}.json')
+            latencies.append(time.perf_counter() - t0)
+    timer = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(num_requests)])
+    elapsed = time.perf_counter() - timer
+    latencies.sort()
+    print(f'{label}: total {elapsed:.3f} s; mean {1000 * sum(latencies) / len(latencies):.2f} ms; p50 {1000 * latencies[len(latencies) // 2]:.2f} ms; p99 {1000 * latencies[int(len(latencies) * 0.99)]:.2f} ms')
+
+async def main():
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    runner, url = await _start_stub_server()
+    try:
+        print(f'{num_requests} requests with concurrency {concurrency} against {url}')
+        await _run('new session per request', _request_with_new_session, url, num_requests, concurrency)
+        await _run('pooled session         ', _request_with_pooled_session, url, num_requests, concurrency)
+    finally:
+        await _close_http_session()
+        await runner.cleanup()
+
+if __name__ == '__main__':
+    asyncio.run(main())
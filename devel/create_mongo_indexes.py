@@ -0,0 +1,48 @@
+# Create the mongo indexes that the queries of the API rely on.
+# This is idempotent, so it can be run after each deployment.
+#
+# Usage: MONGO_URI=... python devel/create_mongo_indexes.py
+
+import os
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+INDEXES = {
+    'files': [
+        # project files, and the one-level folder listing (prefix query on fileName)
+        [('projectId', 1), ('fileName', 1)],
+        # files produced by given jobs (removal of detached files)
+        [('projectId', 1), ('jobId', 1)]
+    ],
+    'jobs': [
+        [('jobId', 1)],
+        [('projectId', 1)],
+        # jobs that produce a given output file (create_job)
+        [('projectId', 1), ('outputFiles.fileName', 1)],
+        # jobs that use given files (removal of detached jobs)
+        [('projectId', 1), ('inputFileIds', 1)],
+        [('projectId', 1), ('outputFileIds', 1)],
+        # unfinished jobs of a compute resource
+        [('computeResourceId', 1), ('status', 1)],
+        # archiving of old finished jobs
+        [('status', 1), ('timestampFinished', 1)]
+    ],
+    'jobs_archive': [
+        [('jobId', 1)],
+        [('projectId', 1), ('outputFiles.fileName', 1)],
+        [('computeResourceId', 1), ('userId', 1)]
+    ]
+}
+
+async def main():
+    mongo_uri = os.environ.get('MONGO_URI', None)
+    assert mongo_uri is not None, 'MONGO_URI environment variable not set'
+    client = AsyncIOMotorClient(mongo_uri)
+    for collection_name, indexes in INDEXES.items():
+        for keys in indexes:
+            name = await client['dendro'][collection_name].create_index(keys)
+            print(f'{collection_name}: {name}')
+
+if __name__ == '__main__':
+    asyncio.run(main())
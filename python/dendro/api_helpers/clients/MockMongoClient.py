@@ -1,4 +1,5 @@
 from typing import Dict, Union, List
+import re
 import uuid
 
 
@@ -23,8 +24,12 @@ class MockMongoDatabase:
 class MockMongoCollection:
     def __init__(self):
         self._documents: Dict[str, Dict] = {}
-    def find(self, query: Dict):
-        return MockMongoCursor(self._documents, query)
+    def find(self, query: Dict, projection: Union[Dict, None] = None):
+        return MockMongoCursor(self._documents, query, projection)
+    def aggregate(self, pipeline: List[Dict]):
+        return MockMongoAggregationCursor(self._documents, pipeline)
+    async def count_documents(self, query: Dict):
+        return len([d for d in self._documents.values() if _document_matches_query(d, query)])
     async def find_one(self, query: Dict):
         for document in self._documents.values():
             if _document_matches_query(document, query):
@@ -39,17 +44,55 @@ class MockMongoCollection:
                 document.update(update_val)
                 return
         if upsert:
-            # create a random ID
+            # like mongo, the new document includes the equality conditions of the query
             update_val_2 = {
+                **{k: v for k, v in query.items() if not isinstance(v, dict) and '.' not in k},
                 **update_val,
                 '_id': str(uuid.uuid4())
             }
             self._documents[update_val_2['_id']] = update_val_2
             return
         raise KeyError("No document matches query") # pragma: no cover
+    async def update_many(self, query: Dict, update: Dict):
+        if '$set' not in update:
+            raise NotImplementedError() # pragma: no cover
+        for document in self._documents.values():
+            if _document_matches_query(document, query):
+                document.update(update['$set'])
+    async def find_one_and_update(self, query: Dict, update: Dict, *, return_document=False):
+        if '$set' not in update:
+            raise NotImplementedError() # pragma: no cover
+        for document in self._documents.values():
+            if _document_matches_query(document, query):
+                before = {**document}
+                document.update(update['$set'])
+                # return_document is ReturnDocument.AFTER (True) or ReturnDocument.BEFORE (False)
+                return {**document} if return_document else before
+        return None
+    async def bulk_write(self, requests: List, *, ordered=True):
+        for request in requests:
+            if not isinstance(request, MockReplaceOne):
+                raise NotImplementedError() # pragma: no cover
+            self._replace_one(request.filter, request.replacement, upsert=request.upsert)
+    def _replace_one(self, query: Dict, replacement: Dict, *, upsert: bool = False):
+        for key, document in self._documents.items():
+            if _document_matches_query(document, query):
+                self._documents[key] = {**replacement, '_id': key}
+                return
+        if upsert:
+            _id = str(uuid.uuid4())
+            self._documents[_id] = {**replacement, '_id': _id}
+    async def create_index(self, keys, **kwargs): # indexes are not needed here
+        pass
     async def insert_one(self, document: Dict):
-        # create a random ID
-        _id = str(uuid.uuid4())
+        if '_id' in document:
+            _id = document['_id']
+            if _id in self._documents:
+                from pymongo.errors import DuplicateKeyError
+                raise DuplicateKeyError(f'Duplicate key: {_id}')
+        else:
+            # create a random ID
+            _id = str(uuid.uuid4())
         document2 = {
             **document,
             '_id': _id
@@ -63,35 +106,121 @@ class MockMongoCollection:
         raise KeyError("No document matches query") # pragma: no cover
     async def delete_many(self, query: Dict):
         document_items = list(self._documents.items()) # need to do it this way because we're deleting from the dict
+        deleted_count = 0
         for key, document in document_items:
             if _document_matches_query(document, query):
                 del self._documents[key]
-        return
+                deleted_count += 1
+        return MockDeleteResult(deleted_count)
+
+class MockReplaceOne:
+    """The mock version of pymongo's ReplaceOne operation (see _create_replace_one_operation)"""
+    def __init__(self, filter: Dict, replacement: Dict, *, upsert: bool = False):
+        self.filter = filter
+        self.replacement = replacement
+        self.upsert = upsert
+
+class MockDeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
 
 class MockMongoCursor:
-    def __init__(self, documents: Dict[str, Dict], query: Dict):
+    def __init__(self, documents: Dict[str, Dict], query: Dict, projection: Union[Dict, None] = None):
         self._documents = documents
         self._query = query
+        self._projection = projection
     async def to_list(self, length: Union[int, None]) -> List[Dict]:
-        assert length is None, 'non-None length is not supported for now'
         documents: List[Dict] = []
         for document in self._documents.values():
+            if length is not None and len(documents) >= length:
+                break
             if _document_matches_query(document, self._query):
-                documents.append(document)
+                documents.append(_apply_projection(document, self._projection))
         return documents
 
+class MockMongoAggregationCursor:
+    """Only $match followed by $group is supported (see _apply_group_stage)"""
+    def __init__(self, documents: Dict[str, Dict], pipeline: List[Dict]):
+        self._documents = documents
+        self._pipeline = pipeline
+    async def to_list(self, length: Union[int, None]) -> List[Dict]:
+        documents = list(self._documents.values())
+        for stage in self._pipeline:
+            if '$match' in stage:
+                documents = [d for d in documents if _document_matches_query(d, stage['$match'])]
+            elif '$group' in stage:
+                documents = _apply_group_stage(documents, stage['$group'])
+            else:
+                raise NotImplementedError() # pragma: no cover
+        return documents if length is None else documents[:length]
+
+def _apply_group_stage(documents: List[Dict], group: Dict) -> List[Dict]:
+    groups: Dict = {}
+    for document in documents:
+        key = _evaluate_expression(document, group['_id'])
+        if key not in groups:
+            groups[key] = {'_id': key, **{k: 0 for k in group.keys() if k != '_id'}}
+        for k, accumulator in group.items():
+            if k == '_id':
+                continue
+            if '$sum' not in accumulator:
+                raise NotImplementedError() # pragma: no cover
+            value = _evaluate_expression(document, accumulator['$sum'])
+            # like mongo, non-numeric values are ignored
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                groups[key][k] += value
+    return list(groups.values())
+
+def _evaluate_expression(document: Dict, expression):
+    # only the expressions used by the API are supported
+    if isinstance(expression, str) and expression.startswith('$'):
+        return document.get(expression[1:], None)
+    if isinstance(expression, dict):
+        if '$split' in expression:
+            value, delimiter = [_evaluate_expression(document, e) for e in expression['$split']]
+            return value.split(delimiter)
+        if '$arrayElemAt' in expression:
+            array, index = [_evaluate_expression(document, e) for e in expression['$arrayElemAt']]
+            return array[index] if -len(array) <= index < len(array) else None
+        raise NotImplementedError() # pragma: no cover
+    return expression
+
+def _apply_projection(document: Dict, projection: Union[Dict, None]) -> Dict:
+    # only top-level fields are supported
+    if not projection:
+        return document
+    if any(v for v in projection.values()):
+        return {k: v for k, v in document.items() if projection.get(k, False) or k == '_id'}
+    return {k: v for k, v in document.items() if k not in projection}
+
 def _document_matches_query(document: Dict, query: Dict) -> bool:
     # handle $in
     for key, value in query.items():
-        if isinstance(value, dict):
+        if '.' in key:
+            # e.g., 'outputFiles.fileName' where outputFiles is a list of subdocuments (only $in is supported for now)
+            if not isinstance(value, dict) or '$in' not in value:
+                raise NotImplementedError() # pragma: no cover
+            if not any(v in value['$in'] for v in _get_values_at_path(document, key)):
+                return False
+        elif isinstance(value, dict):
             if '$in' in value:
                 if key not in document:
-                    return False # pragma: no cover
-                if document[key] not in value['$in']:
+                    return False
+                if isinstance(document[key], list):
+                    # like mongo, an array field matches if any of its elements is in the list
+                    if not any(v in value['$in'] for v in document[key]):
+                        return False
+                elif document[key] not in value['$in']:
                     return False
             elif '$ne' in value:
                 if document.get(key, None) == value['$ne']:
                     return False
+            elif '$regex' in value:
+                if not isinstance(document.get(key, None), str) or re.search(value['$regex'], document[key]) is None:
+                    return False
+            elif '$lt' in value:
+                if key not in document or document[key] is None or document[key] >= value['$lt']:
+                    return False
             else:
                 raise NotImplementedError()
         else:
@@ -104,3 +233,15 @@ def _document_matches_query(document: Dict, query: Dict) -> bool:
                 if document[key] != value:
                     return False
     return True
+
+def _get_values_at_path(document: Dict, path: str) -> list:
+    values = [document]
+    for part in path.split('.'):
+        new_values = []
+        for v in values:
+            items = v if isinstance(v, list) else [v]
+            for item in items:
+                if isinstance(item, dict) and part in item:
+                    new_values.append(item[part])
+        values = new_values
+    return values
@@ -0,0 +1,49 @@
+from typing import TYPE_CHECKING
+import asyncio
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+# Connection pool settings for outbound http requests from the API
+HTTP_CONNECTION_LIMIT = 100
+HTTP_CONNECTION_LIMIT_PER_HOST = 20
+HTTP_DNS_CACHE_TTL_SEC = 300
+HTTP_KEEPALIVE_TIMEOUT_SEC = 30
+HTTP_TIMEOUT_TOTAL_SEC = 60
+HTTP_TIMEOUT_CONNECT_SEC = 10
+HTTP_TIMEOUT_SOCK_READ_SEC = 30
+
+
+# pyright: reportGeneralTypeIssues=false
+def _get_http_session() -> 'aiohttp.ClientSession':
+    # We want one pooled http session per event loop (same as for the mongo client)
+    # so that outbound requests reuse connections, TLS sessions, and resolved DNS
+    loop = asyncio.get_event_loop()
+    session = getattr(loop, "_http_session", None)
+    if session is not None and not session.closed:
+        return session
+
+    # aiohttp is imported here rather than at the top to keep the import time of the API low
+    import aiohttp
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_CONNECTION_LIMIT,
+        limit_per_host=HTTP_CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL_SEC,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT_SEC
+    )
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT_TOTAL_SEC, connect=HTTP_TIMEOUT_CONNECT_SEC, sock_read=HTTP_TIMEOUT_SOCK_READ_SEC)
+    session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    # Store the session on the event loop
+    setattr(loop, "_http_session", session)
+
+    return session
+
+
+async def _close_http_session():
+    loop = asyncio.get_event_loop()
+    session = getattr(loop, "_http_session", None)
+    if session is not None:
+        setattr(loop, "_http_session", None)
+        await session.close()
@@ -1,6 +1,7 @@
+from typing import Any
 import asyncio
 from ..core.settings import get_settings
-from .MockMongoClient import MockMongoClient
+from .MockMongoClient import MockMongoClient, MockReplaceOne
 from ...mock import using_mock
 
 _globals = {"mock_mongo_client": None}
@@ -34,6 +35,14 @@ def _get_mongo_client():
     return client
 
 
+def _create_replace_one_operation(filter: dict, replacement: dict, *, upsert: bool = False) -> Any:
+    # an operation for bulk_write, of the kind the client expects (pymongo's ReplaceOne or MockReplaceOne)
+    if using_mock():
+        return MockReplaceOne(filter, replacement, upsert=upsert)
+    from pymongo import ReplaceOne # not imported at the top to keep the import time of the API low
+    return ReplaceOne(filter, replacement, upsert=upsert)
+
+
 def _clear_mock_mongo_databases():
     client: MockMongoClient = _globals["mock_mongo_client"]  # type: ignore
     if client is not None:
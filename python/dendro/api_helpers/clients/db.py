@@ -1,8 +1,9 @@
+import re
 import time
-from typing import List, Union
-from ._get_mongo_client import _get_mongo_client
+from typing import List, Tuple, Union
+from ._get_mongo_client import _get_mongo_client, _create_replace_one_operation
 from ._remove_id_field import _remove_id_field
-from ...common.dendro_types import DendroProject, DendroFile, DendroJob, DendroComputeResource, ComputeResourceSpec, DendroScript, DendroUser
+from ...common.dendro_types import DendroProject, DendroFile, DendroJob, DendroComputeResource, ComputeResourceSpec, DendroScript, DendroUser, DendroFolderSummary
 from ..core._get_project_role import _project_has_user
 from ..core._model_dump import _model_dump
 from ..core._hide_secret_params_in_job import _hide_secret_params_in_job
@@ -55,6 +56,9 @@ async def fetch_project(project_id: str, *, raise_on_not_found=False) -> Union[D
             return None
     return DendroProject(**project) # validate project
 
+# The file manifests of folders can be large, so they are only returned when a single file is fetched (see fetch_file)
+_FILE_LISTING_PROJECTION = {'fileManifest': False}
+
 async def fetch_project_files(project_id: str, *, pending_only=False) -> List[DendroFile]:
     client = _get_mongo_client()
     files_collection = client['dendro']['files']
@@ -63,12 +67,43 @@ async def fetch_project_files(project_id: str, *, pending_only=False) -> List[De
     }
     if pending_only:
         query['content'] = 'pending'
-    files = await files_collection.find(query).to_list(length=None) # type: ignore
+    files = await files_collection.find(query, _FILE_LISTING_PROJECTION).to_list(length=None) # type: ignore
     for file in files:
         _remove_id_field(file)
     files = [DendroFile(**file) for file in files] # validate files
     return files
 
+async def fetch_project_folder(project_id: str, path: str) -> Tuple[List[DendroFile], List[DendroFolderSummary]]:
+    """Returns the files directly in the folder and summaries of its immediate subfolders (path '' is the root folder)"""
+    client = _get_mongo_client()
+    files_collection = client['dendro']['files']
+    prefix = f'{path}/' if path else ''
+    # anchored, case-sensitive prefix regexes can use the (projectId, fileName) index
+    files = await files_collection.find({
+        'projectId': project_id,
+        'fileName': {'$regex': '^' + re.escape(prefix) + '[^/]*$'}
+    }, _FILE_LISTING_PROJECTION).to_list(length=None) # type: ignore
+    for file in files:
+        _remove_id_field(file)
+    files = sorted([DendroFile(**file) for file in files], key=lambda f: f.fileName) # validate files
+    # the subfolder summaries are computed by the database, grouping the files below the folder by the next path segment
+    groups = await files_collection.aggregate([
+        {'$match': {
+            'projectId': project_id,
+            'fileName': {'$regex': '^' + re.escape(prefix) + '[^/]*/'}
+        }},
+        {'$group': {
+            '_id': {'$arrayElemAt': [{'$split': ['$fileName', '/']}, prefix.count('/')]},
+            'numFiles': {'$sum': 1},
+            'totalSize': {'$sum': '$size'}
+        }}
+    ]).to_list(length=None) # type: ignore
+    folders = sorted([
+        DendroFolderSummary(path=prefix + group['_id'], numFiles=group['numFiles'], totalSize=group['totalSize'])
+        for group in groups
+    ], key=lambda f: f.path)
+    return files, folders
+
 async def fetch_multi_project_files(project_ids: List[str], *, pending_only=False) -> List[DendroFile]:
     client = _get_mongo_client()
     files_collection = client['dendro']['files']
@@ -77,19 +112,17 @@ async def fetch_multi_project_files(project_ids: List[str], *, pending_only=Fals
     }
     if pending_only:
         query['content'] = 'pending'
-    files = await files_collection.find(query).to_list(length=None) # type: ignore
+    files = await files_collection.find(query, _FILE_LISTING_PROJECTION).to_list(length=None) # type: ignore
     for file in files:
         _remove_id_field(file)
     files = [DendroFile(**file) for file in files] # validate files
     return files
 
-async def fetch_project_jobs(project_id: str, include_private_keys=False) -> List[DendroJob]:
-    client = _get_mongo_client()
-    jobs_collection = client['dendro']['jobs']
-    jobs = await jobs_collection.find({
+async def fetch_project_jobs(project_id: str, include_private_keys=False, include_archived=False) -> List[DendroJob]:
+    jobs = await _find_jobs({
         'projectId': project_id,
         'deleted': {'$ne': True}
-    }).to_list(length=None) # type: ignore
+    }, include_archived=include_archived)
     for job in jobs:
         _remove_id_field(job)
     jobs = [DendroJob(**job) for job in jobs] # validate jobs
@@ -136,6 +169,9 @@ async def delete_all_files_in_project(project_id: str):
 async def delete_all_jobs_in_project(project_id: str):
     client = _get_mongo_client()
     jobs_collection = client['dendro']['jobs']
+    await client['dendro']['jobs_archive'].delete_many({
+        'projectId': project_id
+    })
     jobs = await jobs_collection.find({
         'projectId': project_id,
         'deleted': {'$ne': True}
@@ -219,18 +255,18 @@ async def register_compute_resource(compute_resource_id: str, name: str, user_id
         )
         await compute_resources_collection.insert_one(_model_dump(new_compute_resource, exclude_none=True))
 
-async def fetch_compute_resource_jobs(compute_resource_id: str, statuses: Union[List[str], None], exclude_those_pending_approval: bool = False, include_private_keys: bool = False) -> List[DendroJob]:
-    client = _get_mongo_client()
-    jobs_collection = client['dendro']['jobs']
-    query = {
+async def fetch_compute_resource_jobs(compute_resource_id: str, statuses: Union[List[str], None], exclude_those_pending_approval: bool = False, include_private_keys: bool = False, include_archived: bool = False, job_ids: Union[List[str], None] = None) -> List[DendroJob]:
+    query: dict = {
         'computeResourceId': compute_resource_id,
         'deleted': {'$ne': True}
     }
+    if job_ids is not None:
+        query['jobId'] = {'$in': job_ids}
     if statuses is not None:
         query['status'] = {'$in': statuses}
     if exclude_those_pending_approval:
         query['pendingApproval'] = {'$ne': True}
-    jobs = await jobs_collection.find(query).to_list(length=None) # type: ignore
+    jobs = await _find_jobs(query, include_archived=include_archived)
     for job in jobs:
         _remove_id_field(job)
     jobs = [DendroJob(**job) for job in jobs] # validate jobs
@@ -263,6 +299,9 @@ async def fetch_job(job_id: str, *, include_dandi_api_key: bool = False, include
     client = _get_mongo_client()
     jobs_collection = client['dendro']['jobs']
     job = await jobs_collection.find_one({'jobId': job_id})
+    if job is None:
+        # the job may have been archived
+        job = await client['dendro']['jobs_archive'].find_one({'jobId': job_id})
     _remove_id_field(job)
     if job is None:
         if raise_on_not_found:
@@ -312,12 +351,64 @@ async def update_job(job_id: str, update: dict):
         '$set': update
     })
 
+async def update_job_if_status(job_id: str, update: dict, *, expected_statuses: Union[List[str], None]) -> Union[DendroJob, None]:
+    """Atomically update the job provided that its status is one of expected_statuses (any status if None).
+
+    Returns the updated job, or None if there was no matching job.
+    """
+    client = _get_mongo_client()
+    jobs_collection = client['dendro']['jobs']
+    query: dict = {
+        'jobId': job_id
+    }
+    if expected_statuses is not None:
+        query['status'] = {'$in': expected_statuses}
+    from pymongo import ReturnDocument # not imported at the top to keep the import time of the API low
+    job = await jobs_collection.find_one_and_update(query, {
+        '$set': update
+    }, return_document=ReturnDocument.AFTER)
+    if job is None:
+        return None
+    _remove_id_field(job)
+    job = DendroJob(**job) # validate job
+    job.dandiApiKey = None
+    _hide_secret_params_in_job(job)
+    job.jobPrivateKey = ''
+    return job
+
+async def claim_job_output_finalization(job_id: str, *, expected_statuses: Union[List[str], None]) -> Union[DendroJob, None]:
+    """Atomically mark that the outputs of the job are being finalized, provided that its status is one of expected_statuses
+    (any status if None) and that no one else is finalizing them. The mark is cleared by the update that completes the job.
+
+    Returns the job (including the private key), or None if the job could not be claimed.
+    """
+    client = _get_mongo_client()
+    jobs_collection = client['dendro']['jobs']
+    query: dict = {
+        'jobId': job_id,
+        'outputsFinalizing': {'$ne': True}
+    }
+    if expected_statuses is not None:
+        query['status'] = {'$in': expected_statuses}
+    from pymongo import ReturnDocument # not imported at the top to keep the import time of the API low
+    job = await jobs_collection.find_one_and_update(query, {
+        '$set': {'outputsFinalizing': True}
+    }, return_document=ReturnDocument.AFTER)
+    if job is None:
+        return None
+    _remove_id_field(job)
+    return DendroJob(**job) # validate job
+
 async def delete_job(job_id: str):
     client = _get_mongo_client()
     jobs_collection = client['dendro']['jobs']
 
     # Let's actually delete them rather than just marking them as deleted
-    await jobs_collection.delete_one({
+    # (delete_many because the job may be in the archive instead)
+    await jobs_collection.delete_many({
+        'jobId': job_id
+    })
+    await client['dendro']['jobs_archive'].delete_many({
         'jobId': job_id
     })
     # await jobs_collection.update_one({
@@ -328,6 +419,66 @@ async def delete_job(job_id: str):
     #     }
     # })
 
+async def count_project_jobs(project_id: str, statuses: List[str]) -> int:
+    # unfinished jobs are never archived, so only the live set is counted
+    client = _get_mongo_client()
+    jobs_collection = client['dendro']['jobs']
+    return await jobs_collection.count_documents({
+        'projectId': project_id,
+        'deleted': {'$ne': True},
+        'status': {'$in': statuses}
+    })
+
+async def fetch_jobs_producing_files(project_id: str, file_names: List[str]) -> List[DendroJob]:
+    """Returns the jobs (including archived ones) that are expected to produce any of the files (served by the (projectId, outputFiles.fileName) index)"""
+    if len(file_names) == 0:
+        return []
+    jobs = await _find_jobs({
+        'projectId': project_id,
+        'deleted': {'$ne': True},
+        'outputFiles.fileName': {'$in': file_names}
+    }, include_archived=True)
+    for job in jobs:
+        _remove_id_field(job)
+    jobs = [DendroJob(**job) for job in jobs] # validate jobs
+    for job in jobs:
+        job.jobPrivateKey = '' # hide the private key
+        job.dandiApiKey = None # hide the DANDI API key
+        _hide_secret_params_in_job(job)
+    return jobs
+
+async def fetch_jobs_using_files(project_id: str, file_ids: List[str]) -> List[DendroJob]:
+    """Returns the live jobs that have any of the files as an input or an output
+    (served by the (projectId, inputFileIds) and (projectId, outputFileIds) indexes)"""
+    if len(file_ids) == 0:
+        return []
+    jobs: List[dict] = []
+    for field in ['inputFileIds', 'outputFileIds']:
+        jobs2 = await _find_jobs({
+            'projectId': project_id,
+            'deleted': {'$ne': True},
+            field: {'$in': file_ids}
+        }, include_archived=False)
+        job_ids = set(job['jobId'] for job in jobs)
+        jobs.extend(job for job in jobs2 if job['jobId'] not in job_ids)
+    for job in jobs:
+        _remove_id_field(job)
+    jobs2 = [DendroJob(**job) for job in jobs] # validate jobs
+    for job in jobs2:
+        job.jobPrivateKey = '' # hide the private key
+        job.dandiApiKey = None # hide the DANDI API key
+        _hide_secret_params_in_job(job)
+    return jobs2
+
+async def delete_jobs(job_ids: List[str]):
+    if len(job_ids) == 0:
+        return
+    client = _get_mongo_client()
+    for collection_name in ['jobs', 'jobs_archive']:
+        await client['dendro'][collection_name].delete_many({
+            'jobId': {'$in': job_ids}
+        })
+
 async def approve_job(job_id: str):
     client = _get_mongo_client()
     jobs_collection = client['dendro']['jobs']
@@ -366,6 +517,41 @@ async def delete_file(project_id: str, file_name: str):
         'fileName': file_name
     })
 
+async def delete_files(project_id: str, file_names: List[str]) -> List[str]: # returns the IDs of the files that were deleted
+    if len(file_names) == 0:
+        return []
+    client = _get_mongo_client()
+    files_collection = client['dendro']['files']
+    files = await files_collection.find({
+        'projectId': project_id,
+        'fileName': {'$in': file_names}
+    }, {'fileId': True}).to_list(length=None) # type: ignore
+    file_ids = [file['fileId'] for file in files]
+    await delete_files_by_id(project_id, file_ids)
+    return file_ids
+
+async def delete_files_by_id(project_id: str, file_ids: List[str]):
+    if len(file_ids) == 0:
+        return
+    client = _get_mongo_client()
+    files_collection = client['dendro']['files']
+    await files_collection.delete_many({
+        'projectId': project_id,
+        'fileId': {'$in': file_ids}
+    })
+
+async def fetch_file_ids_produced_by_jobs(project_id: str, job_ids: List[str]) -> List[str]:
+    """Returns the IDs of the files whose jobId is one of the jobs (served by the (projectId, jobId) index)"""
+    if len(job_ids) == 0:
+        return []
+    client = _get_mongo_client()
+    files_collection = client['dendro']['files']
+    files = await files_collection.find({
+        'projectId': project_id,
+        'jobId': {'$in': job_ids}
+    }, {'fileId': True}).to_list(length=None) # type: ignore
+    return [file['fileId'] for file in files]
+
 async def insert_file(file: DendroFile):
     client = _get_mongo_client()
     files_collection = client['dendro']['files']
@@ -410,12 +596,10 @@ async def set_dendro_api_key_for_user(user_id: str, dendro_api_key: str):
     }, upsert=True)
 
 async def fetch_jobs_including_deleted(*, compute_resource_id: str, user_id: str, include_private_keys=False):
-    client = _get_mongo_client()
-    jobs_collection = client['dendro']['jobs']
-    jobs = await jobs_collection.find({
+    jobs = await _find_jobs({
         'computeResourceId': compute_resource_id,
         'userId': user_id
-    }).to_list(length=None) # type: ignore
+    }, include_archived=True)
     for job in jobs:
         _remove_id_field(job)
     jobs = [DendroJob(**job) for job in jobs] # validate jobs
@@ -498,3 +682,72 @@ async def insert_script(script: DendroScript):
     client = _get_mongo_client()
     scripts_collection = client['dendro']['scripts']
     await scripts_collection.insert_one(_model_dump(script, exclude_none=True))
+
+# Jobs that have been in a terminal status for a while are moved from the jobs collection to the jobs_archive collection
+# so that the queries on the hot path (e.g., the unfinished jobs of a compute resource) only touch the live set.
+# Archived jobs are still found by fetch_job and by the history/usage queries (include_archived=True).
+ARCHIVABLE_JOB_STATUSES = ['completed', 'failed']
+
+async def _find_jobs(query: dict, *, include_archived: bool) -> List[dict]:
+    client = _get_mongo_client()
+    jobs = await client['dendro']['jobs'].find(query).to_list(length=None) # type: ignore
+    if include_archived:
+        archived_jobs = await client['dendro']['jobs_archive'].find(query).to_list(length=None) # type: ignore
+        # a job can briefly be in both collections while it is being archived
+        live_job_ids = set(job['jobId'] for job in jobs)
+        jobs = jobs + [job for job in archived_jobs if job['jobId'] not in live_job_ids]
+    return jobs
+
+async def archive_old_jobs(*, min_age_sec: float, max_num_jobs: int = 1000) -> int: # returns the number of jobs archived
+    client = _get_mongo_client()
+    jobs_collection = client['dendro']['jobs']
+    jobs_archive_collection = client['dendro']['jobs_archive']
+    jobs = await jobs_collection.find({
+        'status': {'$in': ARCHIVABLE_JOB_STATUSES},
+        'timestampFinished': {'$lt': time.time() - min_age_sec}
+    }).to_list(length=max_num_jobs) # type: ignore
+    if len(jobs) == 0:
+        return 0
+    for job in jobs:
+        _remove_id_field(job)
+    # copy first, then remove from the live set, so that the job can always be found
+    await jobs_archive_collection.bulk_write([
+        _create_replace_one_operation({'jobId': job['jobId']}, job, upsert=True)
+        for job in jobs
+    ])
+    await jobs_collection.delete_many({
+        'jobId': {'$in': [job['jobId'] for job in jobs]},
+        'status': {'$in': ARCHIVABLE_JOB_STATUSES}
+    })
+    # bump the version of the affected projects (see _public_read_cache.py), since listings of the live set have changed
+    await client['dendro']['projects'].update_many({
+        'projectId': {'$in': list(set(job['projectId'] for job in jobs))}
+    }, {
+        '$set': {
+            'timestampModified': time.time()
+        }
+    })
+    return len(jobs)
+
+_session_nonces_globals = {
+    'ttl_index_created': False
+}
+
+async def insert_session_nonce(nonce: str, *, expires_at: float) -> bool:
+    """Returns False if the nonce was already used"""
+    import datetime
+    from pymongo.errors import DuplicateKeyError
+    client = _get_mongo_client()
+    session_nonces_collection = client['dendro']['sessionNonces']
+    if not _session_nonces_globals['ttl_index_created']:
+        # the documents are removed by the database once they expire
+        await session_nonces_collection.create_index('expiresAt', expireAfterSeconds=0)
+        _session_nonces_globals['ttl_index_created'] = True
+    try:
+        await session_nonces_collection.insert_one({
+            '_id': nonce, # unique, so the check is atomic across instances
+            'expiresAt': datetime.datetime.fromtimestamp(expires_at, tz=datetime.timezone.utc)
+        })
+    except DuplicateKeyError:
+        return False
+    return True
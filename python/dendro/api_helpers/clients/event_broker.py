@@ -0,0 +1,109 @@
+from typing import Dict, List, Tuple, Union
+import asyncio
+import threading
+import uuid
+from collections import deque
+
+
+# The event broker backs the compute resource event stream (see routers/compute_resource/router.py)
+# which is a low-latency alternative to pubnub for delivering job events to compute resources.
+# The in-process broker only works when the API runs as a single long-lived process (e.g., a self-hosted server).
+# Other brokers can be plugged in using set_event_broker()
+
+class EventBroker:
+    async def publish(self, *, channel: str, message: dict):
+        raise NotImplementedError()
+
+    async def wait_for_events(self, *, channel: str, since: Union[int, None], epoch: Union[str, None], timeout_sec: float) -> Tuple[List[dict], int, str]:
+        """Returns (events, seq, epoch) where events are those published after sequence number since.
+
+        Waits for up to timeout_sec for new events. If since is None, no events are returned, only the current sequence number.
+        Sequence numbers are only meaningful within an epoch, which changes when the broker is restarted.
+        If events may have been missed (e.g., the epoch does not match or the buffer overflowed) an eventsMissed event is returned,
+        in which case the subscriber should do a full resync.
+        """
+        raise NotImplementedError()
+
+class _InProcessChannel:
+    def __init__(self, max_buffered_events: int):
+        self.seq = 0
+        self.events: deque = deque(maxlen=max_buffered_events) # (seq, message)
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+class InProcessEventBroker(EventBroker):
+    def __init__(self, *, max_buffered_events_per_channel: int = 1000):
+        self._max_buffered_events_per_channel = max_buffered_events_per_channel
+        self._channels: Dict[str, _InProcessChannel] = {}
+        self._epoch = uuid.uuid4().hex
+        # publishers and subscribers may be on different event loops (threads), so we use a lock
+        # rather than asyncio primitives, and wake up waiters using call_soon_threadsafe
+        self._lock = threading.Lock()
+
+    async def publish(self, *, channel: str, message: dict):
+        with self._lock:
+            ch = self._get_channel(channel)
+            ch.seq += 1
+            ch.events.append((ch.seq, message))
+            waiters = ch.waiters
+            ch.waiters = []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_set_future_result_if_not_done, future)
+
+    async def wait_for_events(self, *, channel: str, since: Union[int, None], epoch: Union[str, None], timeout_sec: float) -> Tuple[List[dict], int, str]:
+        if since is not None and epoch is not None and epoch != self._epoch:
+            # the subscriber's sequence number is from a different broker (e.g., before a restart)
+            with self._lock:
+                ch = self._get_channel(channel)
+                return [{'type': 'eventsMissed'}], ch.seq, self._epoch
+        loop = asyncio.get_running_loop()
+        future = None
+        with self._lock:
+            ch = self._get_channel(channel)
+            events, seq = self._get_events_since(ch, since)
+            if len(events) == 0 and since is not None and timeout_sec > 0:
+                future = loop.create_future()
+                ch.waiters.append((loop, future))
+        if future is None:
+            return events, seq, self._epoch
+        try:
+            await asyncio.wait_for(future, timeout=timeout_sec)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                ch.waiters = [w for w in ch.waiters if w[1] is not future]
+        with self._lock:
+            events, seq = self._get_events_since(ch, since)
+            return events, seq, self._epoch
+
+    def _get_channel(self, channel: str) -> _InProcessChannel:
+        if channel not in self._channels:
+            self._channels[channel] = _InProcessChannel(max_buffered_events=self._max_buffered_events_per_channel)
+        return self._channels[channel]
+
+    def _get_events_since(self, ch: _InProcessChannel, since: Union[int, None]) -> Tuple[List[dict], int]:
+        if since is None or since == ch.seq:
+            return [], ch.seq
+        oldest_buffered_seq = ch.events[0][0] if len(ch.events) > 0 else ch.seq + 1
+        if since > ch.seq or since < oldest_buffered_seq - 1:
+            # the subscriber is ahead of us (we were restarted) or we no longer have the events it needs
+            return [{'type': 'eventsMissed'}], ch.seq
+        return [msg for s, msg in ch.events if s > since], ch.seq
+
+def _set_future_result_if_not_done(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+_globals: Dict[str, Union[EventBroker, None]] = {
+    'event_broker': None
+}
+
+def get_event_broker() -> EventBroker:
+    broker = _globals['event_broker']
+    if broker is None:
+        broker = InProcessEventBroker()
+        _globals['event_broker'] = broker
+    return broker
+
+def set_event_broker(broker: Union[EventBroker, None]):
+    _globals['event_broker'] = broker
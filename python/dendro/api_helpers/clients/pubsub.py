@@ -1,35 +1,190 @@
+from typing import Any, Dict, List, Tuple, Union
 import json
-import aiohttp
+import asyncio
+import traceback
+import contextvars
 import urllib.parse
+from collections import OrderedDict
 from ..core.settings import get_settings
+from ._get_http_session import _get_http_session
+from .event_broker import get_event_broker
 from ...mock import using_mock
 
 
 class PubsubError(Exception):
     pass
 
+# When deferred publishing is enabled, messages published while handling an API request are sent once the request has been handled (see PubsubFlushMiddleware).
+# Messages with the same channel, type, and project are coalesced into one. When other requests are being handled at
+# the same time, we wait a short window so that their messages can be coalesced as well.
+PUBSUB_COALESCE_WINDOW_SEC = 0.05
+
 async def publish_pubsub_message(*, channel: str, message: dict):
-    settings = get_settings()
-    # see https://www.pubnub.com/docs/sdks/rest-api/publish-message-to-channel
-    sub_key = settings.PUBNUB_SUBSCRIBE_KEY
-    pub_key = settings.PUBNUB_PUBLISH_KEY
-    uuid = 'dendro'
-    # payload is url encoded json
-    payload = json.dumps(message)
-    payload = urllib.parse.quote(payload)
-    url = f"https://ps.pndsn.com/publish/{pub_key}/{sub_key}/0/{channel}/0/{payload}?uuid={uuid}"
-
-    headers = {
-        'Accept': 'application/json'
-    }
-
-    if using_mock():
-        # don't actually publish the message for the mock case
-        return True
-
-    # async http get request
-    async with aiohttp.ClientSession() as session: # pragma: no cover
+    publisher = _get_pubsub_publisher()
+    publisher.enqueue(channel=channel, message=message)
+    if not _defer_pubsub_publishing.get():
+        # not within an API request, so we publish right away (and the caller gets the errors)
+        await publisher.flush(delay_sec=0, raise_on_error=True)
+    return True
+
+async def flush_pubsub_messages(*, delay_sec: float = PUBSUB_COALESCE_WINDOW_SEC):
+    await _get_pubsub_publisher().flush(delay_sec=delay_sec)
+
+def get_pubsub_metrics() -> dict:
+    return {**_pubsub_metrics}
+
+class PubsubFlushMiddleware:
+    """ASGI middleware that publishes the pubsub messages queued by a request once the request has been handled
+
+    Only enabled when ENABLE_DEFERRED_PUBSUB_PUBLISHING is set. Hosts which buffer the response until the app returns
+    (e.g., vercel) send the response after the flush, and handle one request at a time per instance, so there the
+    request latency still includes the publish and messages are only coalesced within a single request.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not get_settings().ENABLE_DEFERRED_PUBSUB_PUBLISHING:
+            await self.app(scope, receive, send)
+            return
+        publisher = _get_pubsub_publisher()
+        publisher.num_requests_in_progress += 1
+        token = _defer_pubsub_publishing.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _defer_pubsub_publishing.reset(token)
+            publisher.num_requests_in_progress -= 1
+            # there is nothing to coalesce with unless other requests are in progress
+            await publisher.flush(delay_sec=PUBSUB_COALESCE_WINDOW_SEC if publisher.num_requests_in_progress > 0 else 0)
+
+# Backends
+class PubsubBackend:
+    async def publish(self, *, channel: str, message: dict):
+        raise NotImplementedError()
+
+class PubNubPubsubBackend(PubsubBackend):
+    async def publish(self, *, channel: str, message: dict): # pragma: no cover
+        settings = get_settings()
+        # see https://www.pubnub.com/docs/sdks/rest-api/publish-message-to-channel
+        sub_key = settings.PUBNUB_SUBSCRIBE_KEY
+        pub_key = settings.PUBNUB_PUBLISH_KEY
+        uuid = 'dendro'
+        # payload is url encoded json
+        payload = json.dumps(message)
+        payload = urllib.parse.quote(payload)
+        url = f"https://ps.pndsn.com/publish/{pub_key}/{sub_key}/0/{channel}/0/{payload}?uuid={uuid}"
+
+        headers = {
+            'Accept': 'application/json'
+        }
+
+        # async http get request
+        session = _get_http_session()
         async with session.get(url, headers=headers) as resp:
             if resp.status != 200:
-                raise PubsubError(f"Error publishing to pubsub: {resp.status} {resp.text}")
-            return True
+                raise PubsubError(f"Error publishing to pubsub: {resp.status} {await resp.text()}")
+
+class EventBrokerPubsubBackend(PubsubBackend):
+    """Publishes to the event broker that backs the compute resource event stream (in-process by default)"""
+    async def publish(self, *, channel: str, message: dict):
+        await get_event_broker().publish(channel=channel, message=message)
+
+_globals: Dict[str, Union[List[PubsubBackend], None]] = {
+    'pubsub_backends': None
+}
+
+def set_pubsub_backends(backends: Union[List[PubsubBackend], None]):
+    """Override the default pubsub backends (set to None to restore the defaults)"""
+    _globals['pubsub_backends'] = backends
+
+def _get_pubsub_backends() -> List[PubsubBackend]:
+    backends = _globals['pubsub_backends']
+    if backends is not None:
+        return backends
+    backends = []
+    if not using_mock():
+        # don't actually publish to pubnub for the mock case
+        backends.append(PubNubPubsubBackend()) # pragma: no cover
+    if get_settings().ENABLE_COMPUTE_RESOURCE_EVENT_STREAM or using_mock():
+        backends.append(EventBrokerPubsubBackend())
+    return backends
+
+# Publisher
+_pubsub_metrics: Dict[str, Any] = {
+    'numPublished': 0,
+    'numFailed': 0,
+    'lastError': None
+}
+
+_defer_pubsub_publishing: 'contextvars.ContextVar[bool]' = contextvars.ContextVar('_defer_pubsub_publishing', default=False)
+
+class _PubsubPublisher:
+    def __init__(self):
+        self._pending: 'OrderedDict[Tuple[str, Union[str, None], Union[str, None]], Tuple[str, dict]]' = OrderedDict()
+        self._flush_task: Union[asyncio.Future, None] = None
+        self.num_requests_in_progress = 0
+
+    def enqueue(self, *, channel: str, message: dict):
+        key = (channel, message.get('type', None), message.get('projectId', None))
+        existing = self._pending.get(key, None)
+        if existing is not None:
+            message = _coalesce_messages(existing[1], message)
+        self._pending[key] = (channel, message)
+
+    async def flush(self, *, delay_sec: float, raise_on_error: bool = False):
+        # messages may be enqueued while a flush is in progress, so we keep going until there is nothing left
+        errors: List[BaseException] = []
+        while len(self._pending) > 0:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.ensure_future(self._flush_after(delay_sec))
+            errors.extend(await asyncio.shield(self._flush_task))
+        if raise_on_error and len(errors) > 0:
+            raise PubsubError(f'Error publishing pubsub messages: {errors[0]}')
+
+    async def _flush_after(self, delay_sec: float) -> List[BaseException]:
+        if delay_sec > 0:
+            await asyncio.sleep(delay_sec)
+        pending = list(self._pending.values())
+        self._pending.clear()
+        backends = _get_pubsub_backends()
+        results = await asyncio.gather(*[
+            _publish_to_backend(backend, channel=channel, message=message)
+            for channel, message in pending
+            for backend in backends
+        ])
+        return [e for e in results if e is not None]
+
+async def _publish_to_backend(backend: PubsubBackend, *, channel: str, message: dict) -> Union[BaseException, None]:
+    # a pubsub failure should not affect the outcome of the request that triggered it,
+    # so the failures are counted (see get_pubsub_metrics) and returned rather than raised
+    try:
+        await backend.publish(channel=channel, message=message)
+    except Exception as e: # pylint: disable=broad-except
+        traceback.print_exc()
+        _pubsub_metrics['numFailed'] += 1
+        _pubsub_metrics['lastError'] = f'{type(backend).__name__}: {e}'
+        return e
+    _pubsub_metrics['numPublished'] += 1
+    return None
+
+def _coalesce_messages(a: dict, b: dict) -> dict:
+    # the coalesced message is the most recent one, along with the IDs of all the jobs involved
+    job_ids = list(a.get('jobIds', [a['jobId']] if 'jobId' in a else []))
+    for job_id in b.get('jobIds', [b['jobId']] if 'jobId' in b else []):
+        if job_id not in job_ids:
+            job_ids.append(job_id)
+    ret = {**b}
+    if len(job_ids) > 0:
+        ret['jobIds'] = job_ids
+    return ret
+
+# pyright: reportGeneralTypeIssues=false
+def _get_pubsub_publisher() -> _PubsubPublisher:
+    # one publisher per event loop (same as for the mongo client)
+    loop = asyncio.get_event_loop()
+    publisher = getattr(loop, "_pubsub_publisher", None)
+    if publisher is None:
+        publisher = _PubsubPublisher()
+        setattr(loop, "_pubsub_publisher", publisher)
+    return publisher
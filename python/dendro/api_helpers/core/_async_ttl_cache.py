@@ -0,0 +1,105 @@
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type, Union
+from collections import OrderedDict
+import asyncio
+import time
+
+
+class _CacheEntry:
+    def __init__(self, *, value: Any, exception: Union[BaseException, None], expires_at: float):
+        self.value = value
+        self.exception = exception
+        self.expires_at = expires_at
+
+class AsyncTTLCache:
+    """A bounded LRU cache with per-entry expiration for async lookups.
+
+    Concurrent lookups of the same missing key are coalesced into a single call of the fetch function.
+    Exceptions of the types in negative_exceptions are cached (for negative_ttl_sec) and re-raised on subsequent lookups.
+    If get_ttl_sec is provided, it is called with each fetched value to determine how long that value may be cached.
+    """
+    def __init__(self, *,
+        max_size: int,
+        ttl_sec: float,
+        negative_ttl_sec: float = 0,
+        negative_exceptions: Tuple[Type[BaseException], ...] = (),
+        get_ttl_sec: Union[Callable[[Any], float], None] = None
+    ):
+        self._max_size = max_size
+        self._ttl_sec = ttl_sec
+        self._negative_ttl_sec = negative_ttl_sec
+        self._negative_exceptions = negative_exceptions
+        self._get_ttl_sec = get_ttl_sec
+        self._entries: 'OrderedDict[Any, _CacheEntry]' = OrderedDict()
+        self._in_flight: Dict[Any, asyncio.Future] = {}
+        self._num_hits = 0
+        self._num_negative_hits = 0
+        self._num_misses = 0
+        self._num_coalesced = 0
+
+    async def get(self, key: Any, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key, None)
+        if entry is not None:
+            if entry.expires_at > time.time():
+                self._entries.move_to_end(key)
+                if entry.exception is not None:
+                    self._num_negative_hits += 1
+                    raise entry.exception.with_traceback(None)
+                self._num_hits += 1
+                return entry.value
+            del self._entries[key]
+
+        loop = asyncio.get_running_loop()
+        in_flight = self._in_flight.get(key, None)
+        # futures can only be awaited on the loop that created them
+        if in_flight is not None and in_flight.get_loop() is loop:
+            self._num_coalesced += 1
+            # shield so that a cancelled waiter does not cancel the lookup for the others
+            return await asyncio.shield(in_flight)
+
+        self._num_misses += 1
+        future = loop.create_future()
+        self._in_flight[key] = future
+        try:
+            value = await fetch()
+        except BaseException as e:
+            if isinstance(e, self._negative_exceptions) and self._negative_ttl_sec > 0:
+                self._set(key, _CacheEntry(value=None, exception=e, expires_at=time.time() + self._negative_ttl_sec))
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception() # mark as retrieved so asyncio does not warn when there are no other waiters
+            raise
+        else:
+            ttl_sec = self._get_ttl_sec(value) if self._get_ttl_sec is not None else self._ttl_sec
+            if ttl_sec > 0:
+                self._set(key, _CacheEntry(value=value, exception=None, expires_at=time.time() + ttl_sec))
+            future.set_result(value)
+            return value
+        finally:
+            if self._in_flight.get(key, None) is future:
+                del self._in_flight[key]
+
+    def invalidate(self, key: Any):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_metrics(self) -> dict:
+        num_lookups = self._num_hits + self._num_negative_hits + self._num_misses + self._num_coalesced
+        return {
+            'size': len(self._entries),
+            'maxSize': self._max_size,
+            'hits': self._num_hits,
+            'negativeHits': self._num_negative_hits,
+            'misses': self._num_misses,
+            'coalesced': self._num_coalesced,
+            'hitRate': (self._num_hits + self._num_negative_hits + self._num_coalesced) / num_lookups if num_lookups > 0 else 0
+        }
+
+    def _set(self, key: Any, entry: _CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,65 @@
+from typing import Awaitable, Callable, TypeVar, Union
+import asyncio
+from fastapi import HTTPException, Request, Response
+from ...common.dendro_types import DendroProject
+
+
+# Reads of publicly readable projects (the project, its files, and its jobs) can be served by the CDN.
+# The version of a project is its timestampModified, which is bumped after every write to the project, its files, or its jobs.
+# A response to a request that specifies the current version (?v=<timestampModified>) never changes, so it could be cached for a long time.
+# However, the CDN is not purged when a project is made private (which also bumps the version), so the cached responses
+# of the previous versions must expire soon. Other responses must be revalidated, which is cheap when the version has
+# not changed (304 based on the ETag).
+VERSIONED_S_MAXAGE_SEC = 60 * 5
+VERSIONED_STALE_WHILE_REVALIDATE_SEC = 60
+
+T = TypeVar('T')
+
+async def _public_read(*,
+    request: Request,
+    response: Response,
+    v: Union[str, None],
+    fetch_project: Callable[[], Awaitable[Union[DendroProject, None]]],
+    fetch_data: Callable[[], Awaitable[T]]
+) -> Union[Response, T]:
+    """Read data of a project (e.g., its files) with the caching headers of the project.
+
+    Returns a 304 response if the client already has the current version, and raises a 404 if there is no such project.
+    Unless the client may have the current version, the project and the data are fetched at the same time.
+    """
+    if request.headers.get('if-none-match', None) is None:
+        project, data = await asyncio.gather(fetch_project(), fetch_data())
+        if project is None:
+            raise HTTPException(status_code=404, detail='Project not found')
+        _apply_public_read_cache_headers(request=request, response=response, project=project, v=v)
+        return data
+    project = await fetch_project()
+    if project is None:
+        raise HTTPException(status_code=404, detail='Project not found')
+    not_modified_response = _apply_public_read_cache_headers(request=request, response=response, project=project, v=v)
+    if not_modified_response is not None:
+        return not_modified_response
+    return await fetch_data()
+
+def _apply_public_read_cache_headers(*, request: Request, response: Response, project: DendroProject, v: Union[str, None]) -> Union[Response, None]:
+    """Set the caching headers for a read of the project. Returns a 304 response if the client already has the current version."""
+    if not project.publiclyReadable:
+        response.headers['Cache-Control'] = 'private, no-store'
+        return None
+    version = project.timestampModified
+    etag = f'"{project.projectId}-{version}"'
+    response.headers['ETag'] = etag
+    response.headers['Surrogate-Key'] = f'project-{project.projectId} project-{project.projectId}-{version}'
+    if v is not None and _parse_version(v) == version:
+        response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={VERSIONED_S_MAXAGE_SEC}, stale-while-revalidate={VERSIONED_STALE_WHILE_REVALIDATE_SEC}'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    if request.headers.get('if-none-match', None) == etag:
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
+def _parse_version(v: str) -> Union[float, None]:
+    try:
+        return float(v)
+    except ValueError:
+        return None
@@ -23,5 +23,17 @@ class Settings:
         self.OUTPUT_BUCKET_CREDENTIALS: Optional[str] = os.environ.get("OUTPUT_BUCKET_CREDENTIALS", None)
         self.FSBUCKET_SECRET_KEY: Optional[str] = os.environ.get("FSBUCKET_SECRET_KEY", None)
 
+        self.COMPUTE_RESOURCE_SESSION_SECRET: Optional[str] = os.environ.get("COMPUTE_RESOURCE_SESSION_SECRET", None)
+
+        # Set to 1 to deliver job events to compute resources via the event stream endpoint (requires a long-lived API process)
+        self.ENABLE_COMPUTE_RESOURCE_EVENT_STREAM: bool = os.environ.get("ENABLE_COMPUTE_RESOURCE_EVENT_STREAM", "0") == "1"
+
+        # Set to 1 to publish the pubsub messages of a request after it has been handled, coalescing them with those of concurrent
+        # requests (see PubsubFlushMiddleware). This only helps a long-lived API process; on serverless hosts the response waits for the flush anyway.
+        self.ENABLE_DEFERRED_PUBSUB_PUBLISHING: bool = os.environ.get("ENABLE_DEFERRED_PUBSUB_PUBLISHING", "0") == "1"
+
+        # Completed and failed jobs that finished more than this many days ago are moved to the jobs archive
+        self.JOB_ARCHIVE_MIN_AGE_DAYS: float = float(os.environ.get("JOB_ARCHIVE_MIN_AGE_DAYS", "30"))
+
 def get_settings():
     return Settings()
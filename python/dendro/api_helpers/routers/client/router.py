@@ -1,9 +1,10 @@
 from typing import List, Union
 from .... import BaseModel
-from fastapi import APIRouter, Header
-from ....common.dendro_types import DendroProject, DendroFile, DendroJob
-from ...clients.db import fetch_project, fetch_project_files, fetch_project_jobs, fetch_compute_resource
+from fastapi import APIRouter, Header, Request, Response
+from ....common.dendro_types import DendroProject, DendroFile, DendroJob, DendroFolderSummary
+from ...clients.db import fetch_project, fetch_project_files, fetch_project_folder, fetch_project_jobs, fetch_compute_resource
 from ..common import api_route_wrapper
+from ...clients._get_http_session import _get_http_session
 from ....common.dendro_types import CreateJobRequest, CreateJobResponse, DendroComputeResource
 from ..gui.create_job_route import create_job_handler
 from ...core.settings import get_settings
@@ -11,6 +12,7 @@ from ..gui._authenticate_gui_request import _authenticate_gui_request
 from ...core._get_project_role import _check_user_can_edit_project
 from ...services.gui.set_file import set_file as service_set_file, set_file_metadata as service_set_file_metadata
 from ...services.processor.get_upload_url import _get_upload_url_for_object_key
+from ...core._public_read_cache import _apply_public_read_cache_headers, _public_read
 
 router = APIRouter()
 
@@ -24,10 +26,13 @@ class ProjectError(Exception):
 
 @router.get("/projects/{project_id}")
 @api_route_wrapper
-async def get_project(project_id) -> GetProjectResponse:
+async def get_project(project_id, request: Request, response: Response, v: Union[str, None] = None) -> GetProjectResponse:
     project = await fetch_project(project_id)
     if project is None:
         raise ProjectError(f"No project with ID {project_id}")
+    not_modified_response = _apply_public_read_cache_headers(request=request, response=response, project=project, v=v)
+    if not_modified_response is not None:
+        return not_modified_response # type: ignore
     if not project.computeResourceId:
         project.computeResourceId = get_settings().DEFAULT_COMPUTE_RESOURCE_ID
     return GetProjectResponse(project=project, success=True)
@@ -39,10 +44,28 @@ class GetProjectFilesResponse(BaseModel):
 
 @router.get("/projects/{project_id}/files")
 @api_route_wrapper
-async def get_project_files(project_id) -> GetProjectFilesResponse:
-    files = await fetch_project_files(project_id)
+async def get_project_files(project_id, request: Request, response: Response, v: Union[str, None] = None) -> GetProjectFilesResponse:
+    files = await _public_read(request=request, response=response, v=v, fetch_project=lambda: fetch_project(project_id), fetch_data=lambda: fetch_project_files(project_id))
+    if isinstance(files, Response):
+        return files # type: ignore
     return GetProjectFilesResponse(files=files, success=True)
 
+# get project folder
+# lists one level of the folder (for large projects, this is much cheaper than getting all the files)
+class GetProjectFolderResponse(BaseModel):
+    files: List[DendroFile]
+    folders: List[DendroFolderSummary]
+    success: bool
+
+@router.get("/projects/{project_id}/folder")
+@api_route_wrapper
+async def get_project_folder(project_id, request: Request, response: Response, path: str = '', v: Union[str, None] = None) -> GetProjectFolderResponse:
+    listing = await _public_read(request=request, response=response, v=v, fetch_project=lambda: fetch_project(project_id), fetch_data=lambda: fetch_project_folder(project_id, path.strip('/')))
+    if isinstance(listing, Response):
+        return listing # type: ignore
+    files, folders = listing
+    return GetProjectFolderResponse(files=files, folders=folders, success=True)
+
 # set project file
 class SetProjectFileRequest(BaseModel):
     content: str
@@ -74,10 +97,9 @@ async def set_project_file(project_id, file_name, data: SetProjectFileRequest, d
             headers = {
                 'Accept-Encoding': 'identity' # don't accept encoding in order to get the actual size
             }
-            from aiohttp import ClientSession
-            async with ClientSession() as session:
-                async with session.head(content[len("url:"):], headers=headers) as response:
-                    size = int(response.headers['Content-Length'])
+            session = _get_http_session()
+            async with session.head(content[len("url:"):], headers=headers) as response:
+                size = int(response.headers['Content-Length'])
         else:
             raise Exception("size must be specified")
 
@@ -141,8 +163,10 @@ class GetProjectJobsResponse(BaseModel):
 
 @router.get("/projects/{project_id}/jobs")
 @api_route_wrapper
-async def get_project_jobs(project_id) -> GetProjectJobsResponse:
-    jobs = await fetch_project_jobs(project_id)
+async def get_project_jobs(project_id, request: Request, response: Response, v: Union[str, None] = None, include_archived: bool = True) -> GetProjectJobsResponse:
+    jobs = await _public_read(request=request, response=response, v=v, fetch_project=lambda: fetch_project(project_id), fetch_data=lambda: fetch_project_jobs(project_id, include_archived=include_archived))
+    if isinstance(jobs, Response):
+        return jobs # type: ignore
     return GetProjectJobsResponse(jobs=jobs, success=True)
 
 @router.post("/jobs")
@@ -13,6 +13,8 @@ def api_route_wrapper(route_func):
             return await route_func(*args, **kwargs)
         except AuthException as ae:
             raise HTTPException(status_code=401, detail=str(ae))
+        except HTTPException:
+            raise # e.g., 404
         except Exception as e:
             traceback.print_exc()
             raise HTTPException(status_code=500, detail=str(e)) from e
@@ -1,12 +1,14 @@
-from typing import List
+from typing import List, Union
 from .... import BaseModel
-from fastapi import APIRouter, Header
+from fastapi import APIRouter, Header, HTTPException
 from ...services._crypto_keys import _verify_signature_str
+from ...services._session_tokens import create_session_token, check_session_nonce, verify_session_request, session_tokens_are_enabled
 from ....common.dendro_types import DendroComputeResourceApp, DendroFile, DendroJob, ComputeResourceSpec, PubsubSubscription
 from ...clients.db import fetch_compute_resource, fetch_compute_resource_jobs, fetch_multi_project_files, set_compute_resource_spec
 from ...core.settings import get_settings
+from ...clients.event_broker import get_event_broker
 from ....mock import using_mock
-from ..common import api_route_wrapper
+from ..common import api_route_wrapper, AuthException
 
 router = APIRouter()
 
@@ -23,7 +25,8 @@ class ComputeResourceNotFoundException(Exception):
 async def compute_resource_get_apps(
     compute_resource_id: str,
     compute_resource_payload: str = Header(...),
-    compute_resource_signature: str = Header(...)
+    compute_resource_signature: str = Header(...),
+    compute_resource_session_token: Union[str, None] = Header(None)
 ) -> GetAppsResponse:
     # authenticate the request
     expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/apps'
@@ -31,7 +34,8 @@ async def compute_resource_get_apps(
         compute_resource_id=compute_resource_id,
         compute_resource_payload=compute_resource_payload,
         compute_resource_signature=compute_resource_signature,
-        expected_payload=expected_payload
+        expected_payload=expected_payload,
+        compute_resource_session_token=compute_resource_session_token
     )
 
     compute_resource = await fetch_compute_resource(compute_resource_id, raise_on_not_found=True)
@@ -49,7 +53,8 @@ class GetPubsubSubscriptionResponse(BaseModel):
 async def compute_resource_get_pubsub_subscription(
     compute_resource_id: str,
     compute_resource_payload: str = Header(...),
-    compute_resource_signature: str = Header(...)
+    compute_resource_signature: str = Header(...),
+    compute_resource_session_token: Union[str, None] = Header(None)
 ):
     # authenticate the request
     expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/pubsub_subscription'
@@ -57,7 +62,8 @@ async def compute_resource_get_pubsub_subscription(
         compute_resource_id=compute_resource_id,
         compute_resource_payload=compute_resource_payload,
         compute_resource_signature=compute_resource_signature,
-        expected_payload=expected_payload
+        expected_payload=expected_payload,
+        compute_resource_session_token=compute_resource_session_token
     )
 
     compute_resource = await fetch_compute_resource(compute_resource_id, raise_on_not_found=True)
@@ -66,7 +72,8 @@ async def compute_resource_get_pubsub_subscription(
         subscription = PubsubSubscription(
             pubnubSubscribeKey='mock-subscribe-key',
             pubnubChannel=compute_resource_id,
-            pubnubUser=compute_resource_id
+            pubnubUser=compute_resource_id,
+            eventStream=True
         )
         return GetPubsubSubscriptionResponse(subscription=subscription, success=True)
     else: # pragma: no cover
@@ -76,13 +83,59 @@ async def compute_resource_get_pubsub_subscription(
         subscription = PubsubSubscription(
             pubnubSubscribeKey=VITE_PUBNUB_SUBSCRIBE_KEY,
             pubnubChannel=compute_resource_id,
-            pubnubUser=compute_resource_id
+            pubnubUser=compute_resource_id,
+            eventStream=get_settings().ENABLE_COMPUTE_RESOURCE_EVENT_STREAM
         )
         return GetPubsubSubscriptionResponse(subscription=subscription, success=True)
 
+# get events (long poll)
+# This is a low-latency alternative to pubnub for delivering job events to the compute resource
+MAX_EVENTS_LONG_POLL_TIMEOUT_SEC = 25
+
+class GetEventsResponse(BaseModel):
+    events: List[dict]
+    seq: int
+    epoch: Union[str, None] = None
+    success: bool
+
+@router.get("/compute_resources/{compute_resource_id}/events")
+@api_route_wrapper
+async def compute_resource_get_events(
+    compute_resource_id: str,
+    since: Union[int, None] = None,
+    epoch: Union[str, None] = None,
+    timeout: float = 0,
+    compute_resource_payload: str = Header(...),
+    compute_resource_signature: str = Header(...),
+    compute_resource_session_token: Union[str, None] = Header(None)
+) -> GetEventsResponse:
+    # authenticate the request
+    expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/events'
+    _authenticate_compute_resource_request(
+        compute_resource_id=compute_resource_id,
+        compute_resource_payload=compute_resource_payload,
+        compute_resource_signature=compute_resource_signature,
+        expected_payload=expected_payload,
+        compute_resource_session_token=compute_resource_session_token
+    )
+
+    if not get_settings().ENABLE_COMPUTE_RESOURCE_EVENT_STREAM and not using_mock():
+        raise Exception('The compute resource event stream is not enabled')
+
+    # returns immediately if there are events after sequence number since, otherwise waits for up to timeout seconds
+    # (since is only meaningful within the epoch in which it was returned)
+    events, seq, current_epoch = await get_event_broker().wait_for_events(
+        channel=compute_resource_id,
+        since=since,
+        epoch=epoch,
+        timeout_sec=min(max(timeout, 0), MAX_EVENTS_LONG_POLL_TIMEOUT_SEC)
+    )
+    return GetEventsResponse(events=events, seq=seq, epoch=current_epoch, success=True)
+
 # get unfinished jobs
 class GetUnfinishedJobsResponse(BaseModel):
     jobs: List[DendroJob]
+    waitingJobIds: Union[List[str], None] = None # unfinished jobs that are not ready because their input files are pending
     success: bool
 
 @router.get("/compute_resources/{compute_resource_id}/unfinished_jobs")
@@ -91,6 +144,7 @@ async def compute_resource_get_unfinished_jobs(
     compute_resource_id: str,
     compute_resource_payload: str = Header(...),
     compute_resource_signature: str = Header(...),
+    compute_resource_session_token: Union[str, None] = Header(None)
 ) -> GetUnfinishedJobsResponse:
     # authenticate the request
     expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/unfinished_jobs'
@@ -98,10 +152,48 @@ async def compute_resource_get_unfinished_jobs(
         compute_resource_id=compute_resource_id,
         compute_resource_payload=compute_resource_payload,
         compute_resource_signature=compute_resource_signature,
-        expected_payload=expected_payload
+        expected_payload=expected_payload,
+        compute_resource_session_token=compute_resource_session_token
     )
 
-    jobs = await fetch_compute_resource_jobs(compute_resource_id, statuses=['pending', 'queued', 'starting', 'running'], exclude_those_pending_approval=True, include_private_keys=True)
+    ready_jobs, waiting_job_ids = await _fetch_ready_unfinished_jobs(compute_resource_id, job_ids=None)
+
+    return GetUnfinishedJobsResponse(jobs=ready_jobs, waitingJobIds=waiting_job_ids, success=True)
+
+# get unfinished jobs by ID
+# This is used by the compute resource to update its local job table in response to job events, without fetching all the unfinished jobs
+# Jobs that are not returned (and are not waiting) are finished, deleted, pending approval, or do not belong to the compute resource
+MAX_NUM_JOB_IDS_PER_REQUEST = 100
+
+@router.get("/compute_resources/{compute_resource_id}/jobs")
+@api_route_wrapper
+async def compute_resource_get_jobs(
+    compute_resource_id: str,
+    job_ids: str, # comma-separated
+    compute_resource_payload: str = Header(...),
+    compute_resource_signature: str = Header(...),
+    compute_resource_session_token: Union[str, None] = Header(None)
+) -> GetUnfinishedJobsResponse:
+    # authenticate the request
+    expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/jobs'
+    _authenticate_compute_resource_request(
+        compute_resource_id=compute_resource_id,
+        compute_resource_payload=compute_resource_payload,
+        compute_resource_signature=compute_resource_signature,
+        expected_payload=expected_payload,
+        compute_resource_session_token=compute_resource_session_token
+    )
+
+    job_ids_list = [x for x in job_ids.split(',') if x]
+    if len(job_ids_list) > MAX_NUM_JOB_IDS_PER_REQUEST:
+        raise Exception(f'Too many job IDs: {len(job_ids_list)} > {MAX_NUM_JOB_IDS_PER_REQUEST}')
+
+    ready_jobs, waiting_job_ids = await _fetch_ready_unfinished_jobs(compute_resource_id, job_ids=job_ids_list)
+
+    return GetUnfinishedJobsResponse(jobs=ready_jobs, waitingJobIds=waiting_job_ids, success=True)
+
+async def _fetch_ready_unfinished_jobs(compute_resource_id: str, *, job_ids: Union[List[str], None]):
+    jobs = await fetch_compute_resource_jobs(compute_resource_id, statuses=['pending', 'queued', 'starting', 'running'], exclude_those_pending_approval=True, include_private_keys=True, job_ids=job_ids)
 
     # exclude those for which the input files are pending
     relevant_project_ids: list[str] = []
@@ -111,6 +203,7 @@ async def compute_resource_get_unfinished_jobs(
     pending_output_files: List[DendroFile] = await fetch_multi_project_files(project_ids=relevant_project_ids, pending_only=True)
     pending_output_file_names = set([f.fileName for f in pending_output_files])
     ready_jobs: List[DendroJob] = []
+    waiting_job_ids: List[str] = []
     for job in jobs:
         okay = True
         for input_file in job.inputFiles:
@@ -119,8 +212,9 @@ async def compute_resource_get_unfinished_jobs(
                 break
         if okay:
             ready_jobs.append(job)
-
-    return GetUnfinishedJobsResponse(jobs=ready_jobs, success=True)
+        else:
+            waiting_job_ids.append(job.jobId)
+    return ready_jobs, waiting_job_ids
 
 # set spec
 class SetSpecRequest(BaseModel):
@@ -135,7 +229,8 @@ async def compute_resource_set_spec(
     compute_resource_id,
     data: SetSpecRequest,
     compute_resource_payload: str = Header(...),
-    compute_resource_signature: str = Header(...)
+    compute_resource_signature: str = Header(...),
+    compute_resource_session_token: Union[str, None] = Header(None)
 ) -> SetSpecResponse:
     # authenticate the request
     expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/spec'
@@ -143,7 +238,8 @@ async def compute_resource_set_spec(
         compute_resource_id=compute_resource_id,
         compute_resource_payload=compute_resource_payload,
         compute_resource_signature=compute_resource_signature,
-        expected_payload=expected_payload
+        expected_payload=expected_payload,
+        compute_resource_session_token=compute_resource_session_token
     )
 
     spec = data.spec
@@ -152,6 +248,43 @@ async def compute_resource_set_spec(
 
     return SetSpecResponse(success=True)
 
+# create session
+class CreateSessionRequest(BaseModel):
+    nonce: str
+    timestamp: float
+
+class CreateSessionResponse(BaseModel):
+    sessionToken: str
+    sessionKey: str
+    expiresAt: float
+    success: bool
+
+@router.post("/compute_resources/{compute_resource_id}/session")
+@api_route_wrapper
+async def compute_resource_create_session(
+    compute_resource_id: str,
+    data: CreateSessionRequest,
+    compute_resource_payload: str = Header(...),
+    compute_resource_signature: str = Header(...)
+) -> CreateSessionResponse:
+    if not session_tokens_are_enabled():
+        # checked before anything else (in particular before the nonce is stored), so the client can cheaply back off
+        raise HTTPException(status_code=501, detail='Session tokens are not enabled on this server')
+
+    # authenticate the request
+    # the nonce and timestamp are included in the signed payload so that the signature cannot be replayed
+    expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/session:{data.nonce}:{data.timestamp}'
+    _authenticate_compute_resource_request(
+        compute_resource_id=compute_resource_id,
+        compute_resource_payload=compute_resource_payload,
+        compute_resource_signature=compute_resource_signature,
+        expected_payload=expected_payload
+    )
+    await check_session_nonce(nonce=data.nonce, timestamp=data.timestamp)
+
+    session_token, session_key, expires_at = create_session_token(compute_resource_id)
+    return CreateSessionResponse(sessionToken=session_token, sessionKey=session_key, expiresAt=expires_at, success=True)
+
 class UnexpectedException(Exception):
     pass
 
@@ -163,9 +296,20 @@ def _authenticate_compute_resource_request(
     compute_resource_id: str,
     compute_resource_payload: str,
     compute_resource_signature: str,
-    expected_payload: str
+    expected_payload: str,
+    compute_resource_session_token: Union[str, None] = None
 ):
     if compute_resource_payload != expected_payload:
         raise UnexpectedException('Unexpected payload: ' + compute_resource_payload)
+    if compute_resource_session_token is not None:
+        # the signature is an HMAC of the payload and a timestamp using the session key
+        if not verify_session_request(
+            compute_resource_id=compute_resource_id,
+            session_token=compute_resource_session_token,
+            payload=compute_resource_payload,
+            signature=compute_resource_signature
+        ):
+            raise AuthException('Invalid or expired session token')
+        return
     if not _verify_signature_str(compute_resource_payload, compute_resource_id, compute_resource_signature):
         raise InvalidSignatureException(f'Invalid signature: {compute_resource_signature}')
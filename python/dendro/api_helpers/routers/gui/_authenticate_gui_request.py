@@ -1,13 +1,29 @@
 from typing import List, Union
-import time
-import aiohttp
 import uuid
 from ..common import AuthException
-from ...clients.db import fetch_user_for_dendro_api_key
+from ...clients.db import fetch_user_for_dendro_api_key, UserNotFoundError
+from ...core._async_ttl_cache import AsyncTTLCache
+from ...clients._get_http_session import _get_http_session
 
 
-_user_ids_for_github_access_tokens = {} # github access token -> {user_id: string, timestamp: float}
-_user_ids_for_dendro_api_keys = {} # dendro api key -> {user_id: string, timestamp: float}
+class GithubUnavailableException(Exception):
+    """GitHub could not check the access token right now (server error or rate limit), so this is not cached"""
+    pass
+
+# github access token -> user id
+_user_ids_for_github_access_tokens = AsyncTTLCache(
+    max_size=10000,
+    ttl_sec=60 * 60, # one hour
+    negative_ttl_sec=30,
+    negative_exceptions=(AuthException,)
+)
+# dendro api key -> user id
+_user_ids_for_dendro_api_keys = AsyncTTLCache(
+    max_size=10000,
+    ttl_sec=60 * 1, # one minute (the api key might get revoked so we don't want to cache it for too long)
+    negative_ttl_sec=10,
+    negative_exceptions=(UserNotFoundError,)
+)
 
 _mock_github_access_tokens: List[str] = []
 def _create_mock_github_access_token():
@@ -15,6 +31,12 @@ def _create_mock_github_access_token():
     _mock_github_access_tokens.append(token)
     return token
 
+def get_auth_cache_metrics() -> dict:
+    return {
+        'githubAccessTokens': _user_ids_for_github_access_tokens.get_metrics(),
+        'dendroApiKeys': _user_ids_for_dendro_api_keys.get_metrics()
+    }
+
 async def _authenticate_gui_request(*,
     github_access_token: Union[str, None] = None,
     dendro_api_key: Union[str, None] = None,
@@ -22,61 +44,53 @@ async def _authenticate_gui_request(*,
 ) -> Union[str, None]:
     try:
         if github_access_token:
-            if github_access_token in _user_ids_for_github_access_tokens:
-                a = _user_ids_for_github_access_tokens[github_access_token]
-                elapsed = time.time() - a['timestamp']
-                if elapsed > 60 * 60: # one hour
-                    del _user_ids_for_github_access_tokens[github_access_token] # pragma: no cover
-                else:
-                    return a['user_id']
-            if not github_access_token.startswith('mock:'):
-                user_id = await _get_user_id_for_access_token(github_access_token)
-                if not user_id:
-                    raise AuthException('Invalid github access token')
-                user_id = 'github|' + user_id # pragma: no cover
-            else:
-                if github_access_token not in _mock_github_access_tokens:
-                    raise AuthException('Invalid mock github access token')
-                user_id = 'github|' + github_access_token[len('mock:'):]
-            _user_ids_for_github_access_tokens[github_access_token] = {
-                'user_id': user_id,
-                'timestamp': time.time()
-            }
-            return user_id
+            return await _user_ids_for_github_access_tokens.get(
+                github_access_token,
+                lambda: _fetch_user_id_for_github_access_token(github_access_token)
+            )
         elif dendro_api_key:
-            if dendro_api_key in _user_ids_for_dendro_api_keys:
-                a = _user_ids_for_dendro_api_keys[dendro_api_key]
-                elapsed = time.time() - a['timestamp']
-                if elapsed > 60 * 1: # one minute (the api key might get revoked so we don't want to cache it for too long)
-                    del _user_ids_for_dendro_api_keys[dendro_api_key]
-                else:
-                    return a['user_id']
-            user = await fetch_user_for_dendro_api_key(dendro_api_key)
-            assert user.dendroApiKey == dendro_api_key
-            assert user.userId
-            user_id = user.userId
-            _user_ids_for_dendro_api_keys[dendro_api_key] = {
-                'user_id': user_id,
-                'timestamp': time.time()
-            }
-            return user_id
+            return await _user_ids_for_dendro_api_keys.get(
+                dendro_api_key,
+                lambda: _fetch_user_id_for_dendro_api_key(dendro_api_key)
+            )
         else:
             raise AuthException('User is not authenticated')
-    except AuthException as e:
+    except (AuthException, GithubUnavailableException) as e:
+        # when authentication is optional, a caller whose token can't be checked right now is treated as anonymous
         if raise_on_not_authenticated:
             raise e
         else:
             return None
 
+async def _fetch_user_id_for_github_access_token(github_access_token: str) -> str:
+    if not github_access_token.startswith('mock:'):
+        user_id = await _get_user_id_for_access_token(github_access_token)
+        if not user_id:
+            raise AuthException('Invalid github access token')
+        return 'github|' + user_id # pragma: no cover
+    else:
+        if github_access_token not in _mock_github_access_tokens:
+            raise AuthException('Invalid mock github access token')
+        return 'github|' + github_access_token[len('mock:'):]
+
+async def _fetch_user_id_for_dendro_api_key(dendro_api_key: str) -> str:
+    user = await fetch_user_for_dendro_api_key(dendro_api_key)
+    assert user.dendroApiKey == dendro_api_key
+    assert user.userId
+    return user.userId
+
 async def _get_user_id_for_access_token(github_access_token: str):
     url = 'https://api.github.com/user'
     headers = {
         'Authorization': f'token {github_access_token}'
     }
     # do async request
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as response:
-            if response.status != 200:
-                raise AuthException(f'Error getting user ID from github access token: {response.status}')
-            data = await response.json() # pragma: no cover
-            return data['login'] # pragma: no cover
+    session = _get_http_session()
+    async with session.get(url, headers=headers) as response:
+        if response.status >= 500 or response.status in [403, 429]:
+            # transient: the token may well be valid
+            raise GithubUnavailableException(f'Unable to get user ID from github access token: {response.status}')
+        if response.status != 200:
+            raise AuthException(f'Error getting user ID from github access token: {response.status}')
+        data = await response.json() # pragma: no cover
+        return data['login'] # pragma: no cover
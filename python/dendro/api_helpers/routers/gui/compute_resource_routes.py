@@ -171,7 +171,7 @@ class GetJobsForComputeResourceResponse(BaseModel):
 
 @router.get("/{compute_resource_id}/jobs")
 @api_route_wrapper
-async def get_jobs_for_compute_resource(compute_resource_id, github_access_token: str = Header(...)) -> GetJobsForComputeResourceResponse:
+async def get_jobs_for_compute_resource(compute_resource_id, github_access_token: str = Header(...), include_archived: bool = True) -> GetJobsForComputeResourceResponse:
     # authenticate the request
     user_id = await _authenticate_gui_request(github_access_token=github_access_token, raise_on_not_authenticated=True)
     assert user_id
@@ -181,7 +181,7 @@ async def get_jobs_for_compute_resource(compute_resource_id, github_access_token
     if compute_resource.ownerId != user_id:
         raise AuthException('User does not have permission to view jobs for this compute resource')
 
-    jobs = await fetch_compute_resource_jobs(compute_resource_id, statuses=None, include_private_keys=False)
+    jobs = await fetch_compute_resource_jobs(compute_resource_id, statuses=None, include_private_keys=False, include_archived=include_archived)
 
     return GetJobsForComputeResourceResponse(jobs=jobs, success=True)
 
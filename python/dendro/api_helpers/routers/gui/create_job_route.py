@@ -39,6 +39,7 @@ async def create_job_handler(
     dandi_api_key = data.dandiApiKey
     required_resources = data.requiredResources
     run_method = data.runMethod
+    priority = data.priority
 
     job_id = await create_job(
         project_id=project_id,
@@ -52,6 +53,7 @@ async def create_job_handler(
         dandi_api_key=dandi_api_key,
         required_resources=required_resources,
         run_method=run_method,
+        priority=priority,
         pending_approval=True if force_require_approval else None  # None means determine automatically
     )
 
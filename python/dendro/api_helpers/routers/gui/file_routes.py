@@ -1,13 +1,16 @@
 from typing import Union, List
+import time
 from .... import BaseModel
-from fastapi import APIRouter, Header
+from fastapi import APIRouter, Header, Request, Response
 from ...services._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
 from ....common.dendro_types import DendroFile
 from ._authenticate_gui_request import _authenticate_gui_request
 from ...core._get_project_role import _check_user_can_edit_project
-from ...clients.db import fetch_file, fetch_project_files, fetch_project, delete_file as db_delete_file
+from ...clients.db import fetch_file, fetch_project_files, fetch_project, update_project, delete_file as db_delete_file
 from ...services.gui.set_file import set_file as service_set_file
 from ..common import api_route_wrapper
+from ...core._public_read_cache import _public_read
+from ...clients._get_http_session import _get_http_session
 from ...core._create_random_id import _create_random_id
 from ...services.processor.get_upload_url import _get_upload_url_for_object_key
 
@@ -32,8 +35,10 @@ class GetFilesResponse(BaseModel):
 
 @router.get("/projects/{project_id}/files")
 @api_route_wrapper
-async def get_files(project_id):
-    files = await fetch_project_files(project_id)
+async def get_files(project_id, request: Request, response: Response, v: Union[str, None] = None):
+    files = await _public_read(request=request, response=response, v=v, fetch_project=lambda: fetch_project(project_id), fetch_data=lambda: fetch_project_files(project_id))
+    if isinstance(files, Response):
+        return files
     return GetFilesResponse(files=files, success=True)
 
 # set file
@@ -68,10 +73,9 @@ async def set_file(project_id, file_name, data: SetFileRequest, github_access_to
             headers = {
                 'Accept-Encoding': 'identity' # don't accept encoding in order to get the actual size
             }
-            from aiohttp import ClientSession
-            async with ClientSession() as session:
-                async with session.head(content[len("url:"):], headers=headers) as response:
-                    size = int(response.headers['Content-Length'])
+            session = _get_http_session()
+            async with session.head(content[len("url:"):], headers=headers) as response:
+                size = int(response.headers['Content-Length'])
         else:
             raise Exception("size must be specified")
 
@@ -100,10 +104,15 @@ async def delete_file(project_id, file_name, github_access_token: str = Header(.
 
     _check_user_can_edit_project(project, user_id)
 
+    file = await fetch_file(project_id, file_name)
     await db_delete_file(project_id, file_name)
 
     # remove detached files and jobs
-    await _remove_detached_files_and_jobs(project_id)
+    if file is not None:
+        await _remove_detached_files_and_jobs(project_id, deleted_file_ids=[file.fileId], deleted_job_ids=[])
+
+    # bump the version of the project (see _public_read_cache.py)
+    await update_project(project_id=project_id, update={'timestampModified': time.time()})
 
     return DeleteFileResponse(success=True)
 
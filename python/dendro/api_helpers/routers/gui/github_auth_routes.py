@@ -1,7 +1,7 @@
 from .... import BaseModel
 from fastapi import APIRouter
-import aiohttp
 from ...core.settings import get_settings
+from ...clients._get_http_session import _get_http_session
 
 
 router = APIRouter()
@@ -24,12 +24,12 @@ async def github_auth(code) -> GithubAuthResponse:
     headers = {
         'accept': 'application/json'
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            r = await resp.json()
-            if 'access_token' in r:
-                return GithubAuthResponse(access_token=r['access_token']) # pragma: no cover
-            elif 'error' in r:
-                raise GithubAuthError(f'Error in github oauth response: {r["error"]}')
-            else:
-                raise Exception('No access_token in github oauth response.') # pragma: no cover
+    session = _get_http_session()
+    async with session.get(url, headers=headers) as resp:
+        r = await resp.json()
+        if 'access_token' in r:
+            return GithubAuthResponse(access_token=r['access_token']) # pragma: no cover
+        elif 'error' in r:
+            raise GithubAuthError(f'Error in github oauth response: {r["error"]}')
+        else:
+            raise Exception('No access_token in github oauth response.') # pragma: no cover
@@ -1,10 +1,12 @@
+import time
 from fastapi import APIRouter, Header
 from .... import BaseModel
 from ...services._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
+from ...services._publish_jobs_deleted import _publish_jobs_deleted
 from ....common.dendro_types import DendroJob
 from ._authenticate_gui_request import _authenticate_gui_request
 from ...core._get_project_role import _check_user_can_edit_project
-from ...clients.db import fetch_compute_resource, fetch_job, fetch_project, delete_job as db_delete_job, approve_job as db_approve_job
+from ...clients.db import fetch_compute_resource, fetch_job, fetch_project, update_project, delete_job as db_delete_job, approve_job as db_approve_job
 from ...clients.pubsub import publish_pubsub_message
 from ..common import api_route_wrapper
 
@@ -46,9 +48,13 @@ async def delete_job(job_id, github_access_token: str = Header(...)) -> DeleteJo
     _check_user_can_edit_project(project, user_id)
 
     await db_delete_job(job_id)
+    await _publish_jobs_deleted([job])
 
     # remove detached files and jobs
-    await _remove_detached_files_and_jobs(job.projectId)
+    await _remove_detached_files_and_jobs(job.projectId, deleted_file_ids=[], deleted_job_ids=[job_id])
+
+    # bump the version of the project (see _public_read_cache.py)
+    await update_project(project_id=job.projectId, update={'timestampModified': time.time()})
 
     return DeleteJobResponse(success=True)
 
@@ -76,6 +82,9 @@ async def approve_job(job_id, github_access_token: str = Header(...)) -> Approve
 
     await db_approve_job(job_id)
 
+    # bump the version of the project (see _public_read_cache.py)
+    await update_project(project_id=job.projectId, update={'timestampModified': time.time()})
+
     # not really a status change, but we need to notify the compute resource
     await publish_pubsub_message(
         channel=job.computeResourceId,
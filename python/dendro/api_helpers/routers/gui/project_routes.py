@@ -2,7 +2,7 @@ import os
 import json
 from typing import List, Optional
 import time
-from fastapi import APIRouter, Header
+from fastapi import APIRouter, Header, Request, Response
 from .... import BaseModel
 from ...core._create_random_id import _create_random_id
 from ....common.dendro_types import DendroJob, DendroProject, DendroProjectUser, DendroScript
@@ -11,6 +11,7 @@ from ...core._get_project_role import _check_user_can_edit_project, _check_user_
 from ...clients.db import fetch_project, fetch_project_scripts, insert_project, update_project, fetch_project_jobs, fetch_projects_for_user, fetch_all_projects, fetch_projects_with_tag, insert_script
 from ...services.gui.delete_project import delete_project as service_delete_project
 from ..common import api_route_wrapper
+from ...core._public_read_cache import _apply_public_read_cache_headers, _public_read
 
 
 router = APIRouter()
@@ -22,9 +23,12 @@ class GetProjectResponse(BaseModel):
 
 @router.get("/{project_id}")
 @api_route_wrapper
-async def get_project(project_id):
+async def get_project(project_id, request: Request, response: Response, v: Optional[str] = None):
     project = await fetch_project(project_id, raise_on_not_found=True)
     assert project
+    not_modified_response = _apply_public_read_cache_headers(request=request, response=response, project=project, v=v)
+    if not_modified_response is not None:
+        return not_modified_response
     return GetProjectResponse(project=project, success=True)
 
 # get projects
@@ -194,8 +198,11 @@ class GetJobsResponse(BaseModel):
 
 @router.get("/{project_id}/jobs")
 @api_route_wrapper
-async def get_jobs(project_id):
-    jobs = await fetch_project_jobs(project_id, include_private_keys=False)
+async def get_jobs(project_id, request: Request, response: Response, v: Optional[str] = None, include_archived: bool = True):
+    # archived jobs (finished a while ago, see archive_old_jobs) are part of the history, so they are included unless the caller only wants the live set
+    jobs = await _public_read(request=request, response=response, v=v, fetch_project=lambda: fetch_project(project_id), fetch_data=lambda: fetch_project_jobs(project_id, include_private_keys=False, include_archived=include_archived))
+    if isinstance(jobs, Response):
+        return jobs
     return GetJobsResponse(jobs=jobs, success=True)
 
 # get scripts
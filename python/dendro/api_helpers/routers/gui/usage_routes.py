@@ -3,9 +3,12 @@ import json
 from fastapi import APIRouter, Header
 from .... import BaseModel
 from ....common.dendro_types import ComputeResourceUserUsage
-from ._authenticate_gui_request import _authenticate_gui_request
+from ._authenticate_gui_request import _authenticate_gui_request, get_auth_cache_metrics
 from ..common import api_route_wrapper
 from ...services.gui.get_compute_resource_user_usage import get_compute_resource_user_usage
+from ...clients.db import archive_old_jobs
+from ...clients.pubsub import get_pubsub_metrics
+from ...core.settings import get_settings
 
 
 router = APIRouter()
@@ -36,3 +39,73 @@ async def get_usage(compute_resource_id, user_id, github_access_token: str = Hea
     usage = await get_compute_resource_user_usage(compute_resource_id=compute_resource_id, user_id=user_id)
 
     return GetUsageResponse(usage=usage, success=True)
+
+# Admin get authentication cache metrics
+class AdminGetAuthCacheMetricsResponse(BaseModel):
+    metrics: dict
+    success: bool
+
+@router.get("/admin/auth_cache_metrics")
+@api_route_wrapper
+async def admin_get_auth_cache_metrics(github_access_token: str = Header(...)):
+    # authenticate the request
+    user_id = await _authenticate_gui_request(github_access_token=github_access_token, raise_on_not_authenticated=True)
+    assert user_id
+
+    ADMIN_USER_IDS_JSON = os.getenv('ADMIN_USER_IDS', '[]')
+    ADMIN_USER_IDS = json.loads(ADMIN_USER_IDS_JSON)
+
+    if user_id not in ADMIN_USER_IDS:
+        raise Exception('User is not admin')
+
+    return AdminGetAuthCacheMetricsResponse(metrics=get_auth_cache_metrics(), success=True)
+
+# Admin get pubsub metrics (e.g., to notice that publishing is failing, in which case compute resources miss job events)
+class AdminGetPubsubMetricsResponse(BaseModel):
+    metrics: dict
+    success: bool
+
+@router.get("/admin/pubsub_metrics")
+@api_route_wrapper
+async def admin_get_pubsub_metrics(github_access_token: str = Header(...)):
+    # authenticate the request
+    user_id = await _authenticate_gui_request(github_access_token=github_access_token, raise_on_not_authenticated=True)
+    assert user_id
+
+    ADMIN_USER_IDS_JSON = os.getenv('ADMIN_USER_IDS', '[]')
+    ADMIN_USER_IDS = json.loads(ADMIN_USER_IDS_JSON)
+
+    if user_id not in ADMIN_USER_IDS:
+        raise Exception('User is not admin')
+
+    return AdminGetPubsubMetricsResponse(metrics=get_pubsub_metrics(), success=True)
+
+# Admin archive old jobs
+# This is meant to be called periodically (e.g., by a scheduled job)
+class AdminArchiveJobsResponse(BaseModel):
+    numJobsArchived: int
+    success: bool
+
+@router.post("/admin/archive_jobs")
+@api_route_wrapper
+async def admin_archive_jobs(github_access_token: str = Header(...)):
+    # authenticate the request
+    user_id = await _authenticate_gui_request(github_access_token=github_access_token, raise_on_not_authenticated=True)
+    assert user_id
+
+    ADMIN_USER_IDS_JSON = os.getenv('ADMIN_USER_IDS', '[]')
+    ADMIN_USER_IDS = json.loads(ADMIN_USER_IDS_JSON)
+
+    if user_id not in ADMIN_USER_IDS:
+        raise Exception('User is not admin')
+
+    min_age_sec = get_settings().JOB_ARCHIVE_MIN_AGE_DAYS * 24 * 60 * 60
+    num_jobs_archived = 0
+    # archive in batches so that no single request to the database is too large
+    for _ in range(10):
+        num = await archive_old_jobs(min_age_sec=min_age_sec, max_num_jobs=1000)
+        num_jobs_archived += num
+        if num < 1000:
+            break
+
+    return AdminArchiveJobsResponse(numJobsArchived=num_jobs_archived, success=True)
@@ -1,6 +1,9 @@
 from typing import Union, List
+import time
+import calendar
+import hashlib
+import urllib.parse
 import traceback
-import aiohttp
 from fastapi import APIRouter, HTTPException, Header
 from .... import BaseModel
 from ...services.processor.update_job_status import update_job_status
@@ -9,6 +12,8 @@ from ....common.dendro_types import ProcessorGetJobResponse, ProcessorGetJobResp
 from ....common.dendro_types import ProcessorGetJobV2Response, ProcessorGetJobV2ResponseInput, ProcessorGetJobV2ResponseInputFolder, GetJobFileInfoResponse
 from ...clients.db import fetch_job, fetch_file, fetch_job_private_key
 from ...clients.db import _remove_id_field, _get_mongo_client
+from ...clients._get_http_session import _get_http_session
+from ...core._async_ttl_cache import AsyncTTLCache
 
 router = APIRouter()
 
@@ -53,10 +58,15 @@ async def processor_get_job(job_id: str, job_private_key: str = Header(...)) ->
                 # folder
                 if not file.isFolder:
                     raise Exception(f"Mismatch. input is folder but project file {input.fileName} is not a folder")
-                file_manifest_obj = await _download_file_manifest_obj(url)
+                if file.fileManifest is not None and file.fileManifest.files is not None:
+                    # the manifest was stored when the job producing this folder completed
+                    manifest_files = [{'name': f.name, 'size': f.size} for f in file.fileManifest.files]
+                else:
+                    file_manifest_obj = await _download_file_manifest_obj(url)
+                    manifest_files = file_manifest_obj['files']
                 # get all files in the folder
                 folder_files: List[ProcessorGetJobResponseInputFolderFile] = []
-                for f in file_manifest_obj['files']:
+                for f in manifest_files:
                     folder_files.append(ProcessorGetJobResponseInputFolderFile(
                         name=f['name'],
                         url=f'{url}/{f["name"]}',
@@ -178,17 +188,60 @@ async def processor_get_job_v2(job_id: str, job_private_key: str = Header(...))
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+# The same DANDI asset URL is typically resolved by many jobs (and repeatedly by each job as the URL is renewed)
+# so we cache the resolved (presigned) URL for a portion of its remaining lifetime
+DANDI_URL_CACHE_MAX_TTL_SEC = 60 * 30
+DANDI_URL_CACHE_DEFAULT_TTL_SEC = 60 * 10
+
+def _get_ttl_sec_for_resolved_dandi_url(resolved_url: str) -> float:
+    expires_at = _get_expiration_time_of_presigned_url(resolved_url)
+    if expires_at is None:
+        return DANDI_URL_CACHE_DEFAULT_TTL_SEC
+    # make sure that the url we hand out has at least half of its lifetime remaining
+    return min(DANDI_URL_CACHE_MAX_TTL_SEC, (expires_at - time.time()) / 2)
+
+_resolved_dandi_urls = AsyncTTLCache(
+    max_size=10000,
+    ttl_sec=DANDI_URL_CACHE_DEFAULT_TTL_SEC,
+    get_ttl_sec=_get_ttl_sec_for_resolved_dandi_url
+)
+
 async def _resolve_dandi_url(url: str, *, dandi_api_key: Union[str, None]) -> str:
     if url.startswith('https://api.dandiarchive.org/api/') or url.startswith('https://api-staging.dandiarchive.org/api/'):
-        headers = {}
-        if dandi_api_key is not None:
-            headers['Authorization'] = f'token {dandi_api_key}'
-        async with aiohttp.ClientSession() as session:
-            async with session.head(url, allow_redirects=True, headers=headers) as resp:
-                return str(resp.url)
+        # key on a hash of the api key since embargoed assets resolve differently for different users
+        dandi_api_key_hash = hashlib.sha256(dandi_api_key.encode('utf-8')).hexdigest() if dandi_api_key is not None else None
+        return await _resolved_dandi_urls.get(
+            (url, dandi_api_key_hash),
+            lambda: _resolve_dandi_url_uncached(url, dandi_api_key=dandi_api_key)
+        )
     else:
         return url
 
+async def _resolve_dandi_url_uncached(url: str, *, dandi_api_key: Union[str, None]) -> str:
+    headers = {}
+    if dandi_api_key is not None:
+        headers['Authorization'] = f'token {dandi_api_key}'
+    session = _get_http_session()
+    async with session.head(url, allow_redirects=True, headers=headers) as resp:
+        return str(resp.url)
+
+def _get_expiration_time_of_presigned_url(url: str) -> Union[float, None]:
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+    if 'X-Amz-Date' in query and 'X-Amz-Expires' in query:
+        # AWS signature version 4
+        try:
+            signed_at = calendar.timegm(time.strptime(query['X-Amz-Date'][0], '%Y%m%dT%H%M%SZ'))
+            return signed_at + int(query['X-Amz-Expires'][0])
+        except ValueError:
+            return None
+    if 'Expires' in query:
+        # AWS signature version 2
+        try:
+            return int(query['Expires'][0])
+        except ValueError:
+            return None
+    return None
+
 # update job status
 class ProcessorUpdateJobStatusRequest(BaseModel):
     status: str
@@ -202,13 +255,11 @@ class ProcessorUpdateJobStatusResponse(BaseModel):
 @router.put("/jobs/{job_id}/status")
 async def processor_update_job_status(job_id: str, data: ProcessorUpdateJobStatusRequest, job_private_key: str = Header(...)) -> ProcessorUpdateJobStatusResponse:
     try:
-        job = await fetch_job(job_id, include_private_key=True)
-        if job is None:
-            raise Exception(f"No job with ID {job_id}")
-        if job.jobPrivateKey != job_private_key:
+        true_job_private_key = await fetch_job_private_key(job_id)
+        if true_job_private_key != job_private_key:
             raise Exception(f"Invalid job private key for job {job_id}")
 
-        await update_job_status(job=job, status=data.status, error=data.error, force_update=data.force_update, output_file_sizes=data.output_file_sizes)
+        await update_job_status(job_id=job_id, status=data.status, error=data.error, force_update=data.force_update, output_file_sizes=data.output_file_sizes)
 
         return ProcessorUpdateJobStatusResponse(success=True)
     except Exception as e:
@@ -321,11 +372,11 @@ async def _download_file_manifest_obj(folder_url: str):
     url = f'{folder_url}/file_manifest.json'
     print(f'Downloading file manifest from {url}')
     # first, we get the text content
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                raise Exception(f"Error getting file manifest: {resp.status}")
-            text = await resp.text()
+    session = _get_http_session()
+    async with session.get(url) as resp:
+        if resp.status != 200:
+            raise Exception(f"Error getting file manifest: {resp.status}")
+        text = await resp.text()
     # then we parse it
     import json
     return json.loads(text)
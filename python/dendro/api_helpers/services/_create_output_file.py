@@ -1,10 +1,13 @@
-from typing import Union
+from typing import List, Tuple, Union
 import time
-import aiohttp
-from ..clients._get_mongo_client import _get_mongo_client
+import asyncio
+from ... import BaseModel
+from ..clients._get_mongo_client import _get_mongo_client, _create_replace_one_operation
+from ..clients._remove_id_field import _remove_id_field
+from ..clients._get_http_session import _get_http_session
 from ..core._create_random_id import _create_random_id
 from ._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
-from ...common.dendro_types import DendroFile
+from ...common.dendro_types import DendroFile, DendroFileManifest, DendroFileManifestFile
 from ..core._model_dump import _model_dump
 from ...mock import using_mock
 
@@ -18,21 +21,14 @@ async def _create_output_file(*,
     is_folder: Union[bool, None] = None,
     replace_pending: bool = False
 ) -> str: # returns the ID of the created file
+    file_manifest: Union[DendroFileManifest, None] = None
     if url == 'pending':
         if replace_pending:
             raise Exception('Cannot replace pending file with another pending file')
         # this is the output of a job that has not completed yet
         size = 0
-    elif url.startswith('dendro:?'):  # case of skipCloudUpload3
-        size = _parse_size_from_dendro_uri(url)
     else:
-        if not using_mock():
-            if not is_folder:
-                size = await _get_size_for_remote_file(url)
-            else:
-                size = await _get_size_from_file_manifest_json(url)
-        else:
-            size = 1 # size of mock file
+        size, file_manifest = await _get_size_and_file_manifest(url=url, is_folder=is_folder)
 
     client = _get_mongo_client()
     projects_collection = client['dendro']['projects']
@@ -85,12 +81,14 @@ async def _create_output_file(*,
         content=content,
         metadata=metadata,
         isFolder=is_folder,
-        jobId=job_id
+        jobId=job_id,
+        fileManifest=file_manifest
     )
     await files_collection.insert_one(_model_dump(new_file, exclude_none=True))
 
     if deleted_old_file:
-        await _remove_detached_files_and_jobs(project_id)
+        assert existing_file is not None
+        await _remove_detached_files_and_jobs(project_id, deleted_file_ids=[existing_file.fileId], deleted_job_ids=[])
 
     await projects_collection.update_one({
         'projectId': project_id
@@ -102,6 +100,99 @@ async def _create_output_file(*,
 
     return new_file.fileId
 
+class OutputFileToFinalize(BaseModel):
+    fileName: str
+    url: str
+    isFolder: Union[bool, None] = None
+    size: Union[int, None] = None # as reported by the job, if available
+
+# Limit on the number of concurrent HEAD requests / manifest downloads when finalizing the outputs of a job
+MAX_CONCURRENT_OUTPUT_SIZE_LOOKUPS = 16
+
+async def _replace_pending_output_files(*,
+    outputs: List[OutputFileToFinalize],
+    project_id: str,
+    user_id: str,
+    job_id: str
+) -> List[str]: # returns the IDs of the files, in the same order as outputs
+    """Replace the pending output files of a completed job using a single bulk write
+
+    The caller is responsible for bumping the timestampModified of the project (see update_job_status)
+    """
+    if len(outputs) == 0:
+        return []
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_OUTPUT_SIZE_LOOKUPS)
+
+    async def get_size_and_file_manifest(output: OutputFileToFinalize):
+        async with semaphore:
+            return await _get_size_and_file_manifest(url=output.url, is_folder=output.isFolder, known_size=output.size)
+    sizes_and_file_manifests = await asyncio.gather(*[get_size_and_file_manifest(output) for output in outputs])
+
+    client = _get_mongo_client()
+    files_collection = client['dendro']['files']
+
+    existing_files = await files_collection.find({
+        'projectId': project_id,
+        'fileName': {'$in': [output.fileName for output in outputs]}
+    }).to_list(length=None) # type: ignore
+    existing_files_by_name = {}
+    for existing_file in existing_files:
+        _remove_id_field(existing_file)
+        existing_files_by_name[existing_file['fileName']] = DendroFile(**existing_file)
+
+    file_ids: List[str] = []
+    requests = []
+    for output, (size, file_manifest) in zip(outputs, sizes_and_file_manifests):
+        if output.url == 'pending':
+            raise Exception('Cannot replace pending file with another pending file')
+        existing_file = existing_files_by_name.get(output.fileName, None)
+        if existing_file is None:
+            raise Exception('Cannot replace pending file because it does not exist')
+        if existing_file.content != 'pending':
+            raise Exception('Error replacing pending file: existing file is not pending')
+        file_id = existing_file.fileId # it's important to use the same file ID
+        if output.url.startswith('dendro:?'):
+            content = output.url.replace('$file_id$', file_id)
+        else:
+            content = f'url:{output.url}'
+        new_file = DendroFile(
+            projectId=project_id,
+            fileId=file_id,
+            userId=user_id,
+            fileName=output.fileName,
+            size=size,
+            timestampCreated=time.time(),
+            content=content,
+            metadata=existing_file.metadata, # we want to retain the metadata from the existing file
+            isFolder=output.isFolder,
+            jobId=job_id,
+            fileManifest=file_manifest
+        )
+        requests.append(_create_replace_one_operation({
+            'projectId': project_id,
+            'fileId': file_id
+        }, _model_dump(new_file, exclude_none=True)))
+        file_ids.append(file_id)
+    await files_collection.bulk_write(requests)
+
+    return file_ids
+
+async def _get_size_and_file_manifest(*, url: str, is_folder: Union[bool, None], known_size: Union[int, None] = None) -> Tuple[int, Union[DendroFileManifest, None]]:
+    if url.startswith('dendro:?'):  # case of skipCloudUpload
+        return _parse_size_from_dendro_uri(url), None
+    if using_mock():
+        return 1, None # size of mock file
+    if not is_folder:
+        if known_size is not None:
+            return known_size, None
+        return await _get_size_for_remote_file(url), None
+    # download the file manifest once and store it with the file
+    file_manifest = await _get_file_manifest_for_folder(url)
+    if file_manifest is not None:
+        return file_manifest.totalSize, file_manifest
+    return known_size if known_size is not None else 0, None
+
 class GetSizeForRemoteFileException(Exception):
     pass
 
@@ -115,26 +206,34 @@ async def _get_size_for_remote_file(url: str) -> int:
     return int(size)
 
 async def _head_request(url: str):
-    async with aiohttp.ClientSession() as session:
-        async with session.head(url) as response:
-            return response
+    session = _get_http_session()
+    async with session.head(url) as response:
+        return response
 
-async def _get_size_from_file_manifest_json(url: str) -> int:
+# Above this number of files, only the file count and total size are stored with the folder
+MAX_NUM_FILES_IN_STORED_FILE_MANIFEST = 1000
+
+async def _get_file_manifest_for_folder(url: str) -> Union[DendroFileManifest, None]:
     file_manifest_url = url + '/file_manifest.json'
     try:
         # load the file manifest
-        async with aiohttp.ClientSession() as session:
-            async with session.get(file_manifest_url) as response:
-                if response.status != 200:
-                    raise Exception(f"Error getting file manifest: {response.status}")
-                file_manifest = await response.json()
-        size = 0
-        for f in file_manifest['files']:
-            size += f['size']
-        return size
+        session = _get_http_session()
+        async with session.get(file_manifest_url) as response:
+            if response.status != 200:
+                raise Exception(f"Error getting file manifest: {response.status}")
+            file_manifest = await response.json()
+        files = [
+            DendroFileManifestFile(name=f['name'], size=f.get('size', None))
+            for f in file_manifest['files']
+        ]
+        return DendroFileManifest(
+            numFiles=len(files),
+            totalSize=sum([f.size for f in files if f.size is not None]),
+            files=files if len(files) <= MAX_NUM_FILES_IN_STORED_FILE_MANIFEST else None
+        )
     except Exception as e:
         print(f'Problem reading file manifest at {file_manifest_url}: {e}')
-        return 0
+        return None
 
 def _parse_size_from_dendro_uri(uri: str) -> int:
     if not uri.startswith('dendro:?'):
@@ -0,0 +1,20 @@
+from typing import List
+from ...common.dendro_types import DendroJob
+from ..clients.pubsub import publish_pubsub_message
+
+
+async def _publish_jobs_deleted(jobs: List[DendroJob]):
+    # The compute resource removes deleted jobs from its job table, so that a deleted pending job is not started.
+    # Finished jobs are not in that table, so there is nothing to tell.
+    for job in jobs:
+        if job.status in ['completed', 'failed']:
+            continue
+        await publish_pubsub_message(
+            channel=job.computeResourceId,
+            message={
+                'type': 'jobDeleted',
+                'projectId': job.projectId,
+                'computeResourceId': job.computeResourceId,
+                'jobId': job.jobId
+            }
+        )
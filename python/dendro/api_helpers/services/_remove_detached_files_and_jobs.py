@@ -1,64 +1,21 @@
-from ..clients._get_mongo_client import _get_mongo_client
-from ..clients._remove_id_field import _remove_id_field
-from ...common.dendro_types import DendroFile, DendroJob
+from typing import List
+from ..clients.db import fetch_jobs_using_files, fetch_file_ids_produced_by_jobs, delete_jobs, delete_files_by_id
+from ._publish_jobs_deleted import _publish_jobs_deleted
 
 
-async def _remove_detached_files_and_jobs(project_id: str):
-    client = _get_mongo_client()
-    files_collection = client['dendro']['files']
-    jobs_collection = client['dendro']['jobs']
-
-    files = await files_collection.find({
-        'projectId': project_id
-    }).to_list(length=None) # type: ignore
-    jobs = await jobs_collection.find({
-        'projectId': project_id,
-        'deleted': {'$ne': True}
-    }).to_list(length=None) # type: ignore
-
-    for file in files:
-        _remove_id_field(file)
-    for job in jobs:
-        _remove_id_field(job)
-    files = [DendroFile(**x) for x in files]
-    jobs = [DendroJob(**x) for x in jobs]
-
-    something_changed = True
-    while something_changed:
-        file_ids = set(x.fileId for x in files)
-        job_ids = set(x.jobId for x in jobs)
-
-        job_ids_to_delete = set()
-        for job in jobs:
-            if any(x not in file_ids for x in job.inputFileIds):
-                job_ids_to_delete.add(job.jobId)
-            if job.outputFileIds:
-                if any(x not in file_ids for x in job.outputFileIds):
-                    job_ids_to_delete.add(job.jobId)
-        file_ids_to_delete = set()
-        for file in files:
-            if file.jobId:
-                if file.jobId not in job_ids:
-                    file_ids_to_delete.add(file.fileId)
-        something_changed = False
-        if len(job_ids_to_delete) > 0:
-            something_changed = True
-            # Let's actually delete them rather than just marking them as deleted
-            jobs_collection.delete_many({
-                'jobId': {'$in': list(job_ids_to_delete)}
-            })
-            # for job_id in job_ids_to_delete:
-            #     await jobs_collection.update_one({
-            #         'jobId': job_id
-            #     }, {
-            #         '$set': {
-            #             'deleted': True
-            #         }
-            #     })
-            jobs = [x for x in jobs if x.jobId not in job_ids_to_delete]
-        if len(file_ids_to_delete) > 0:
-            something_changed = True
-            await files_collection.delete_many({
-                'fileId': {'$in': list(file_ids_to_delete)}
-            })
-            files = [x for x in files if x.fileId not in file_ids_to_delete]
+async def _remove_detached_files_and_jobs(project_id: str, *, deleted_file_ids: List[str], deleted_job_ids: List[str]):
+    # Starting from what was just deleted, remove the jobs whose input or output files are gone
+    # and the files whose producing job is gone, until nothing else becomes detached.
+    # Only those jobs and files are queried, so the cost does not depend on the size of the project.
+    # Archived jobs are finished jobs that are only listed on request, so they are not considered here.
+    file_ids = list(set(deleted_file_ids))
+    job_ids = list(set(deleted_job_ids))
+    while len(file_ids) > 0 or len(job_ids) > 0:
+        jobs_to_delete = await fetch_jobs_using_files(project_id, file_ids)
+        file_ids_to_delete = await fetch_file_ids_produced_by_jobs(project_id, job_ids)
+        # Let's actually delete them rather than just marking them as deleted
+        await delete_jobs([job.jobId for job in jobs_to_delete])
+        await _publish_jobs_deleted(jobs_to_delete)
+        await delete_files_by_id(project_id, file_ids_to_delete)
+        file_ids = file_ids_to_delete
+        job_ids = [job.jobId for job in jobs_to_delete]
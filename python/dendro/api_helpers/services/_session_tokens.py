@@ -0,0 +1,92 @@
+from typing import Dict, Tuple, Union
+import time
+import hmac
+import hashlib
+import secrets
+from ..core.settings import get_settings
+from ..clients.db import insert_session_nonce
+from ...mock import using_mock
+
+
+# Session tokens let a compute resource authenticate with a cheap HMAC
+# after a single Ed25519-signed handshake.
+# The server is stateless: the session key is derived from the token using the server secret.
+
+SESSION_TOKEN_LIFETIME_SEC = 60 * 60
+MAX_TIMESTAMP_SKEW_SEC = 60 * 5
+
+class SessionTokenException(Exception):
+    pass
+
+_globals: Dict[str, Union[str, None]] = {
+    'fallback_secret': None
+}
+
+def session_tokens_are_enabled() -> bool:
+    return bool(get_settings().COMPUTE_RESOURCE_SESSION_SECRET) or using_mock()
+
+def _get_session_secret() -> bytes:
+    secret = get_settings().COMPUTE_RESOURCE_SESSION_SECRET
+    if secret:
+        return secret.encode('utf-8')
+    if not using_mock():
+        # tokens created by one serverless instance would not be accepted by another
+        raise SessionTokenException('Session tokens are not enabled: COMPUTE_RESOURCE_SESSION_SECRET is not set')
+    if _globals['fallback_secret'] is None:
+        _globals['fallback_secret'] = secrets.token_hex(32)
+    return _globals['fallback_secret'].encode('utf-8') # type: ignore
+
+def _hmac_hex(key: bytes, msg: str) -> str:
+    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).hexdigest()
+
+def _session_key_for_token(session_token: str) -> str:
+    return _hmac_hex(_get_session_secret(), 'session-key:' + session_token)
+
+def create_session_token(compute_resource_id: str) -> Tuple[str, str, float]:
+    """Returns (session_token, session_key, expires_at)"""
+    expires_at = int(time.time() + SESSION_TOKEN_LIFETIME_SEC)
+    body = f'{compute_resource_id}.{expires_at}.{secrets.token_hex(8)}'
+    session_token = f'{body}.{_hmac_hex(_get_session_secret(), body)}'
+    return session_token, _session_key_for_token(session_token), expires_at
+
+async def check_session_nonce(*, nonce: str, timestamp: float):
+    if abs(time.time() - timestamp) > MAX_TIMESTAMP_SKEW_SEC:
+        raise SessionTokenException('Session request timestamp is out of range')
+    # The used nonces are stored in the database (not in memory) so that a handshake cannot be replayed on another
+    # serverless instance. They only need to be kept until they can no longer pass the timestamp check.
+    if not await insert_session_nonce(nonce, expires_at=time.time() + 2 * MAX_TIMESTAMP_SKEW_SEC):
+        raise SessionTokenException('Session request nonce has already been used')
+
+def sign_session_request(*, payload: str, session_key: str, timestamp: Union[float, None] = None) -> str:
+    if timestamp is None:
+        timestamp = time.time()
+    timestamp_str = str(int(timestamp))
+    return timestamp_str + '.' + _hmac_hex(session_key.encode('utf-8'), f'{payload}.{timestamp_str}')
+
+def verify_session_request(*, compute_resource_id: str, session_token: str, payload: str, signature: str) -> bool:
+    parts = session_token.split('.')
+    if len(parts) != 4:
+        return False
+    token_compute_resource_id, expires_at_str, _, token_mac = parts
+    if token_compute_resource_id != compute_resource_id:
+        return False
+    try:
+        expires_at = int(expires_at_str)
+    except ValueError:
+        return False
+    if expires_at < time.time():
+        return False
+    body = '.'.join(parts[:3])
+    if not hmac.compare_digest(token_mac, _hmac_hex(_get_session_secret(), body)):
+        return False
+    signature_parts = signature.split('.')
+    if len(signature_parts) != 2:
+        return False
+    try:
+        timestamp = int(signature_parts[0])
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp) > MAX_TIMESTAMP_SKEW_SEC:
+        return False
+    expected_signature = sign_session_request(payload=payload, session_key=_session_key_for_token(session_token), timestamp=timestamp)
+    return hmac.compare_digest(signature, expected_signature)
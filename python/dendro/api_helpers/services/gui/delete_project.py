@@ -1,9 +1,13 @@
 from ....common.dendro_types import DendroProject
-from ...clients.db import delete_all_files_in_project, delete_all_jobs_in_project, delete_project as db_delete_project
+from ...clients.db import fetch_project_jobs, delete_all_files_in_project, delete_all_jobs_in_project, delete_project as db_delete_project
+from .._publish_jobs_deleted import _publish_jobs_deleted
 
 
 async def delete_project(project: DendroProject):
+    # unfinished jobs are never archived, so the live jobs are all that the compute resources need to hear about
+    jobs = await fetch_project_jobs(project.projectId)
     await delete_all_files_in_project(project.projectId)
     await delete_all_jobs_in_project(project.projectId)
+    await _publish_jobs_deleted(jobs)
     await db_delete_project(project.projectId)
     return None
@@ -19,9 +19,6 @@ async def set_file(
     existing_file = await fetch_file(project_id, file_name)
     if existing_file is not None:
         await delete_file(project_id, file_name)
-        deleted_old_file = True
-    else:
-        deleted_old_file = False
 
     new_file = DendroFile(
         projectId=project_id,
@@ -37,8 +34,8 @@ async def set_file(
     )
     await insert_file(new_file)
 
-    if deleted_old_file:
-        await _remove_detached_files_and_jobs(project_id)
+    if existing_file is not None:
+        await _remove_detached_files_and_jobs(project_id, deleted_file_ids=[existing_file.fileId], deleted_job_ids=[])
 
     await update_project(
         project_id=project_id,
@@ -1,6 +1,4 @@
 from typing import Optional, Dict, Any
-import boto3
-from boto3.session import Config
 import json
 
 
@@ -18,6 +16,9 @@ async def _get_signed_upload_url(*,
     region_name = _get_region_name_from_uri(bucket_uri)
     bucket_name = _get_bucket_name_from_uri(bucket_uri)
 
+    # boto3 is imported here rather than at the top because it is slow to import (cold starts of the API)
+    import boto3
+    from boto3.session import Config
     s3_client = boto3.client(
         's3',
         aws_access_key_id=access_key_id,
@@ -1,77 +1,61 @@
 import time
-from typing import Union
+from typing import List, Union
 
 from dendro.mock import using_mock
-from ....common.dendro_types import DendroJob
 from ...core.settings import get_settings
 from ...core._model_dump import _model_dump
-from .._create_output_file import _create_output_file
-from ...clients.db import update_job
+from .._create_output_file import _replace_pending_output_files, OutputFileToFinalize
+from ....common.dendro_types import DendroJob
+from ...clients.db import fetch_job, claim_job_output_finalization, update_job_if_status, update_project
 from ...clients.pubsub import publish_pubsub_message
 
 
+# for each new status, the statuses that the job is allowed to transition from
+_ALLOWED_PREVIOUS_STATUSES = {
+    'starting': ['pending'],
+    'running': ['starting'],
+    'completed': ['running'],
+    'failed': ['running', 'starting', 'pending']
+}
+
+class JobStatusTransitionError(Exception):
+    pass
+
 async def update_job_status(
-    job: DendroJob,
+    job_id: str,
     status: str,
     error: Union[str, None],
     force_update: Union[bool, None] = None,
     output_file_sizes: Union[dict, None] = None
 ):
-    old_status = job.status
-
     new_status = status
     new_error = error
 
-    if not force_update:
-        if new_status == 'starting':
-            if old_status != 'pending':
-                raise Exception(f"Cannot set job status to starting when status is {old_status}")
-        elif new_status == 'running':
-            if old_status != 'starting':
-                raise Exception(f"Cannot set job status to running when status is {old_status}")
-        elif new_status == 'completed':
-            if old_status != 'running':
-                raise Exception(f"Cannot set job status to completed when status is {old_status}")
-        elif new_status == 'failed':
-            if (old_status != 'running') and (old_status != 'starting') and (old_status != 'pending'):
-                raise Exception(f"Cannot set job status to failed when status is {old_status}")
+    # The transition is done in a single conditional update filtered on the expected old status
+    # so that concurrent updates (from the job process, the compute resource daemon, monitors) can't race
+    expected_statuses = _ALLOWED_PREVIOUS_STATUSES.get(new_status, None) if not force_update else None
 
     update = {}
     if new_error:
         if new_status != 'failed':
             raise Exception(f"Cannot set job error when status is {new_status}")
     if new_status == 'completed':
-        # we need to create the output files before marking the job as completed
-        output_bucket_base_url = get_settings().OUTPUT_BUCKET_BASE_URL
-        if using_mock():
-            output_bucket_base_url = 'https://mock-bucket'
-        if output_bucket_base_url is None:
-            raise Exception('Environment variable not set: OUTPUT_BUCKET_BASE_URL')
-        output_file_ids = []
-        for output_file in job.outputFiles:
-            if not output_file.skipCloudUpload:
-                output_file_url = f"{output_bucket_base_url}/dendro-outputs/{job.projectId}/{job.jobId}/{output_file.name}"
-            else:
-                # file_id will be filled in
-                output_file_url = f'dendro:?project={job.projectId}&file_id=$file_id$&label={output_file.fileName}&compute_resource={job.computeResourceId}'
-                if output_file_sizes is not None:
-                    if output_file.name in output_file_sizes:
-                        output_file_url += f'&size={output_file_sizes[output_file.name]}'
-                if output_file.isFolder:
-                    output_file_url += '&folder=true'
-            output_file_id = await _create_output_file(
-                file_name=output_file.fileName,
-                url=output_file_url,
-                project_id=job.projectId,
-                user_id=job.userId,
-                job_id=job.jobId,
-                replace_pending=True,
-                is_folder=output_file.isFolder
-            )
-            output_file_ids.append(output_file_id)
-            output_file.fileId = output_file_id
-        update['outputFileIds'] = output_file_ids
-        update['outputFiles'] = [_model_dump(f, exclude_none=True) for f in job.outputFiles]
+        # we need to create the output files before marking the job as completed, so the completion is claimed first
+        # to make sure that only one of several concurrent completers rewrites the output files
+        job = await claim_job_output_finalization(job_id, expected_statuses=expected_statuses)
+        if job is None:
+            job = await fetch_job(job_id, raise_on_not_found=True)
+            assert job is not None
+            if expected_statuses is not None and job.status not in expected_statuses:
+                raise JobStatusTransitionError(f"Cannot set job status to {new_status} when status is {job.status}")
+            raise JobStatusTransitionError(f"Cannot set job status to {new_status} because the job is already being completed")
+        try:
+            update.update(await _finalize_output_files(job, output_file_sizes=output_file_sizes))
+        except Exception:
+            # release the claim so that the completion can be retried
+            await update_job_if_status(job_id=job_id, update={'outputsFinalizing': False}, expected_statuses=None)
+            raise
+        update['outputsFinalizing'] = False
 
     update['status'] = new_status
     if new_error:
@@ -87,15 +71,62 @@ async def update_job_status(
     elif new_status == 'failed':
         update['timestampFinished'] = time.time()
 
-    await update_job(job_id=job.jobId, update=update)
+    updated_job = await update_job_if_status(job_id=job_id, update=update, expected_statuses=expected_statuses)
+    if updated_job is None:
+        # the job does not exist or its status was not one of the expected ones
+        job = await fetch_job(job_id, raise_on_not_found=True)
+        assert job is not None
+        raise JobStatusTransitionError(f"Cannot set job status to {new_status} when status is {job.status}")
+
+    # bump the version of the project (see _public_read_cache.py)
+    await update_project(project_id=updated_job.projectId, update={'timestampModified': time.time()})
 
     await publish_pubsub_message(
-        channel=job.computeResourceId,
+        channel=updated_job.computeResourceId,
         message={
             'type': 'jobStatusChanged',
-            'projectId': job.projectId,
-            'computeResourceId': job.computeResourceId,
-            'jobId': job.jobId,
-            'status': new_status
+            'projectId': updated_job.projectId,
+            'computeResourceId': updated_job.computeResourceId,
+            'jobId': updated_job.jobId,
+            'status': updated_job.status
         }
     )
+
+async def _finalize_output_files(job: DendroJob, *, output_file_sizes: Union[dict, None]) -> dict:
+    # replaces the pending output files of the job, and returns the corresponding update for the job
+    output_bucket_base_url = get_settings().OUTPUT_BUCKET_BASE_URL
+    if using_mock():
+        output_bucket_base_url = 'https://mock-bucket'
+    if output_bucket_base_url is None:
+        raise Exception('Environment variable not set: OUTPUT_BUCKET_BASE_URL')
+    outputs_to_finalize: List[OutputFileToFinalize] = []
+    for output_file in job.outputFiles:
+        if not output_file.skipCloudUpload:
+            output_file_url = f"{output_bucket_base_url}/dendro-outputs/{job.projectId}/{job.jobId}/{output_file.name}"
+        else:
+            # file_id will be filled in
+            output_file_url = f'dendro:?project={job.projectId}&file_id=$file_id$&label={output_file.fileName}&compute_resource={job.computeResourceId}'
+            if output_file_sizes is not None:
+                if output_file.name in output_file_sizes:
+                    output_file_url += f'&size={output_file_sizes[output_file.name]}'
+            if output_file.isFolder:
+                output_file_url += '&folder=true'
+        outputs_to_finalize.append(OutputFileToFinalize(
+            fileName=output_file.fileName,
+            url=output_file_url,
+            isFolder=output_file.isFolder,
+            # use the size reported by the job when available, rather than looking it up
+            size=output_file_sizes.get(output_file.name, None) if output_file_sizes is not None else None
+        ))
+    output_file_ids = await _replace_pending_output_files(
+        outputs=outputs_to_finalize,
+        project_id=job.projectId,
+        user_id=job.userId,
+        job_id=job.jobId
+    )
+    for output_file, output_file_id in zip(job.outputFiles, output_file_ids):
+        output_file.fileId = output_file_id
+    return {
+        'outputFileIds': output_file_ids,
+        'outputFiles': [_model_dump(f, exclude_none=True) for f in job.outputFiles]
+    }
@@ -1,8 +1,9 @@
-from typing import List, Union
+from typing import Dict, List, Union
 import os
 import time
+import urllib.parse
 import requests
-from ..common.dendro_types import DendroComputeResource, DendroProject, DendroFile, DendroJob
+from ..common.dendro_types import DendroComputeResource, DendroProject, DendroFile, DendroJob, DendroFolderSummary
 from ..common._api_request import _client_get_api_request
 
 
@@ -12,7 +13,7 @@ class ProjectException(Exception):
 class Project:
     def __init__(self, *,
         project_data: DendroProject,
-        files_data: List[DendroFile],
+        files_data: Union[List[DendroFile], None], # None means that the files are listed from the server one folder at a time, as needed
         jobs_data: List[DendroJob],
         compute_resource: Union[DendroComputeResource, None]
     ) -> None:
@@ -27,7 +28,8 @@ class Project:
         self._files = [
             ProjectFile(f)
             for f in files_data
-        ]
+        ] if files_data is not None else None
+        self._folder_listings: Dict[str, _FolderListing] = {}
 
         self._jobs = [
             j # DendroJob
@@ -36,12 +38,29 @@ class Project:
 
         self._compute_resource = compute_resource
     def get_file(self, file_name: str) -> Union['ProjectFile', None]:
-        for f in self._files:
+        parent_path = '/'.join(file_name.split('/')[:-1])
+        for f in self._get_folder_listing(parent_path).files:
             if f._file_data.fileName == file_name:
                 return f
         return None
     def get_folder(self, path: str) -> 'ProjectFolder':
         return ProjectFolder(self, path)
+    def _get_folder_listing(self, path: str) -> '_FolderListing':
+        if path in self._folder_listings:
+            return self._folder_listings[path]
+        if self._files is not None:
+            # build the listings for all folders in one pass
+            if len(self._folder_listings) == 0:
+                self._folder_listings = _create_folder_listings(self._files)
+            return self._folder_listings.get(path, _FolderListing(files=[], folders=[]))
+        url_path = f'/api/client/projects/{self._project_id}/folder?path={urllib.parse.quote(path)}&v={self._timestamp_modified}'
+        resp = _client_get_api_request(url_path=url_path)
+        listing = _FolderListing(
+            files=[ProjectFile(DendroFile(**f)) for f in resp['files']],
+            folders=[DendroFolderSummary(**f) for f in resp['folders']]
+        )
+        self._folder_listings[path] = listing
+        return listing
 
 class ProjectFile:
     def __init__(self, file_data: DendroFile) -> None:
@@ -94,45 +113,68 @@ class ProjectFolder:
     def path(self) -> str:
         return self._path
     def get_files(self) -> List[ProjectFile]:
-        ret: List[ProjectFile] = []
-        for f in self._project._files:
-            a = f._file_data.fileName.split('/')
-            ok = False
-            if len(a) <= 1:
-                ok = (self._path == '')
-            else:
-                ok = '/'.join(a[:-1]) == self._path
-            if ok:
-                ret.append(f)
-        return ret
+        return list(self._project._get_folder_listing(self._path).files)
     def get_folders(self) -> List['ProjectFolder']:
-        folder_paths = set()
-        for f in self._project._files:
-            a = f._file_data.fileName.split('/')
-            if len(a) <= 1:
-                continue
-            folder_path = '/'.join(a[:-1])
-            if folder_path.startswith(self._path + '/'):
-                x = folder_path[len(self._path) + 1:]
-                if '/' in x:
-                    x = x[:x.index('/')]
-                folder_paths.add(self._path + '/' + x)
-        sorted_folder_paths = sorted(list(folder_paths))
         return [
-            ProjectFolder(self._project, p)
-            for p in sorted_folder_paths
+            ProjectFolder(self._project, f.path)
+            for f in self._project._get_folder_listing(self._path).folders
         ]
+    @property
+    def num_files(self) -> Union[int, None]:
+        """The number of files in this folder, including subfolders (None if unknown)"""
+        summary = self._get_summary()
+        return summary.numFiles if summary is not None else None
+    @property
+    def total_size(self) -> Union[int, None]:
+        """The total size of the files in this folder, including subfolders (None if unknown)"""
+        summary = self._get_summary()
+        return summary.totalSize if summary is not None else None
+    def _get_summary(self) -> Union[DendroFolderSummary, None]:
+        parent_path = '/'.join(self._path.split('/')[:-1])
+        return next((f for f in self._project._get_folder_listing(parent_path).folders if f.path == self._path), None)
+
+class _FolderListing:
+    def __init__(self, *, files: List[ProjectFile], folders: List[DendroFolderSummary]) -> None:
+        self.files = files
+        self.folders = folders
+
+def _create_folder_listings(files: List[ProjectFile]) -> Dict[str, _FolderListing]:
+    listings: Dict[str, _FolderListing] = {}
+    folder_summaries: Dict[str, DendroFolderSummary] = {}
+
+    def get_listing(path: str) -> _FolderListing:
+        if path not in listings:
+            listings[path] = _FolderListing(files=[], folders=[])
+        return listings[path]
+    for f in sorted(files, key=lambda x: x._file_data.fileName):
+        a = f._file_data.fileName.split('/')
+        get_listing('/'.join(a[:-1])).files.append(f)
+        # add the file to the summaries of all the folders that contain it
+        for i in range(1, len(a)):
+            folder_path = '/'.join(a[:i])
+            if folder_path not in folder_summaries:
+                folder_summaries[folder_path] = DendroFolderSummary(path=folder_path, numFiles=0, totalSize=0)
+                get_listing('/'.join(a[:i - 1])).folders.append(folder_summaries[folder_path])
+            folder_summaries[folder_path].numFiles += 1
+            folder_summaries[folder_path].totalSize += f._file_data.size
+    for listing in listings.values():
+        listing.folders.sort(key=lambda x: x.path)
+    return listings
 
-def load_project(project_id: str) -> Project:
+def load_project(project_id: str, *, lazy_files: bool = False) -> Project:
+    """Load a project. For very large projects, use lazy_files=True to list the files one folder at a time as needed."""
     url_path = f'/api/client/projects/{project_id}'
     project_resp = _client_get_api_request(url_path=url_path)
     project: DendroProject = DendroProject(**project_resp['project'])
 
-    url_path = f'/api/client/projects/{project_id}/files'
-    files_resp = _client_get_api_request(url_path=url_path)
-    files: List[DendroFile] = [DendroFile(**f) for f in files_resp['files']]
+    # specifying the version of the project allows the files and jobs to be served from the CDN cache
+    files: Union[List[DendroFile], None] = None
+    if not lazy_files:
+        url_path = f'/api/client/projects/{project_id}/files?v={project.timestampModified}'
+        files_resp = _client_get_api_request(url_path=url_path)
+        files = [DendroFile(**f) for f in files_resp['files']]
 
-    url_path = f'/api/client/projects/{project_id}/jobs'
+    url_path = f'/api/client/projects/{project_id}/jobs?v={project.timestampModified}'
     jobs_resp = _client_get_api_request(url_path=url_path)
     jobs: List[DendroJob] = [DendroJob(**j) for j in jobs_resp['jobs']]
 
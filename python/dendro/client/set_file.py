@@ -24,22 +24,22 @@ def set_file(*,
     url: str,
     metadata: dict = {}
 ):
-    # check if a file already exists
-    for file in project._files:
-        if file.file_name == file_name:
-            if file._file_data.content == f'url:{url}':
-                if _metadata_is_same(file._file_data.metadata, metadata):
-                    return
-                else:
-                    # Let's just update the metadata
-                    # It's important not to replace the entire file because it would
-                    # trigger deleting of jobs and other files
-                    set_file_metadata(
-                        project=project,
-                        file_name=file_name,
-                        metadata=metadata
-                    )
-                    return
+    # check if a file already exists (this also works when the files of the project are loaded lazily)
+    file = project.get_file(file_name)
+    if file is not None:
+        if file._file_data.content == f'url:{url}':
+            if _metadata_is_same(file._file_data.metadata, metadata):
+                return
+            else:
+                # Let's just update the metadata
+                # It's important not to replace the entire file because it would
+                # trigger deleting of jobs and other files
+                set_file_metadata(
+                    project=project,
+                    file_name=file_name,
+                    metadata=metadata
+                )
+                return
 
     req = SetProjectFileRequest(
         content=f'url:{url}',
@@ -62,10 +62,10 @@ def set_file_metadata(*,
     metadata: dict
 ):
     # Check if file already exists
-    for file in project._files:
-        if file.file_name == file_name:
-            if _metadata_is_same(file._file_data.metadata, metadata):
-                return
+    file = project.get_file(file_name)
+    if file is not None:
+        if _metadata_is_same(file._file_data.metadata, metadata):
+            return
 
     req = SetProjectFileMetadataRequest(
         metadata=metadata
@@ -4,6 +4,7 @@ from pydantic import BaseModel
 from .Project import Project
 from ..common.dendro_types import CreateJobRequest, CreateJobResponse, CreateJobRequestInputFile, CreateJobRequestOutputFile, CreateJobRequestInputParameter, ComputeResourceSpecProcessor, DendroJob, DendroJobRequiredResources
 from ..common._api_request import _client_post_api_request
+from ..common._processor_spec_validator import get_processor_spec_validator, ProcessorSpecValidationError
 
 
 class SubmitJobInputFile(BaseModel):
@@ -30,7 +31,8 @@ def submit_job(*,
     batch_id: Union[str, None] = None,
     rerun_policy: str = 'never', # always | never | if_failed
     required_resources: DendroJobRequiredResources,
-    run_method: Literal['local', 'aws_batch', 'slurm']
+    run_method: Literal['local', 'aws_batch', 'slurm'],
+    priority: Union[int, None] = None
 ):
     """Submit a job to the Dendro compute service.
 
@@ -42,6 +44,7 @@ def submit_job(*,
         parameters (List[SubmitJobParameter]): The input parameters for the job.
         batch_id (Union[str, None], optional): The batch ID to use. Defaults to None.
         rerun_policy (str, optional): The rerun policy to use. One of: 'always', 'never', 'if_failed'. Defaults to 'never'.
+        priority (Union[int, None], optional): Jobs with higher priority are started first, among your jobs in the project. Defaults to None (0).
 
     Returns:
         str: The job ID.
@@ -134,7 +137,8 @@ def submit_job(*,
         batchId=batch_id,
         dandiApiKey=os.environ.get('DANDI_API_KEY', None),
         requiredResources=required_resources,
-        runMethod=run_method
+        runMethod=run_method,
+        priority=priority
     )
 
     dendro_api_key = os.environ.get('DENDRO_API_KEY', None)
@@ -171,59 +175,16 @@ def _check_consistency_with_processor_spec(
     output_files: List[SubmitJobOutputFile],
     parameters: List[SubmitJobParameter]
 ):
-    # check that the processor name matches
-    if processor_spec.name != processor_name:
-        raise KeyError(f'Processor name mismatch: {processor_spec.name} != {processor_name}')
-    # check that the input files are consistent with the spec
-    for input_file in input_files:
-        if not input_file.is_folder:
-            pp = next((x for x in processor_spec.inputs if x.name == input_file.name), None)
-            if not pp:
-                raise KeyError(f"Processor input not found: {input_file.name}")
-        else:
-            pp = next((x for x in (processor_spec.inputFolders or []) if x.name == input_file.name), None)
-            if not pp:
-                raise KeyError(f"Processor input folder not found: {input_file.name}")
-
-    # check that no input files are missing
-    for input in processor_spec.inputs:
-        if not any(x.name == input.name and not x.is_folder for x in input_files):
-            raise KeyError(f"Required input not found: {input.name}")
-    # check that no input folders are missing
-    for input_folder in processor_spec.inputFolders or []:
-        if not any(x.name == input_folder.name and x.is_folder for x in input_files):
-            raise KeyError(f"Required input folder not found: {input_folder.name}")
-    # check that the output files are consistent with the spec
-    for output_file in output_files:
-        if not output_file.is_folder:
-            pp = next((x for x in processor_spec.outputs if x.name == output_file.name), None)
-            if not pp:
-                raise KeyError(f"Processor output not found: {output_file.name}")
-        else:
-            pp = next((x for x in (processor_spec.outputFolders or []) if x.name == output_file.name), None)
-            if not pp:
-                raise KeyError(f"Processor output folder not found: {output_file.name}")
-    # check that no output files are missing
-    for output in processor_spec.outputs:
-        if not any(x.name == output.name and not x.is_folder for x in output_files):
-            raise KeyError(f"Required output not found: {output.name}")
-    # check that no output folders are missing
-    for output_folder in processor_spec.outputFolders or []:
-        if not any(x.name == output_folder.name and x.is_folder for x in output_files):
-            raise KeyError(f"Required output folder not found: {output_folder.name}")
-    # check that the input parameters are consistent with the spec
-    for input_parameter in parameters:
-        pp = next((x for x in processor_spec.parameters if x.name == input_parameter.name), None)
-        if not pp:
-            raise KeyError(f"Processor parameter not found: {input_parameter.name}")
-
-    # For this we need to wait for the model to be updated to include the "required" flag
-    # # check that no required parameters are missing
-    # for pp in processor_spec.parameters:
-    #     if pp.required:
-    #         input_parameter = next((x for x in parameters if x.name == pp.name), None)
-    #         if not input_parameter:
-    #             raise KeyError(f"Required parameter not found: {pp.name}")
+    # same validator as used by the API, compiled once per spec
+    try:
+        get_processor_spec_validator(processor_spec).validate(
+            processor_name=processor_name,
+            input_files=[(x.name, bool(x.is_folder)) for x in input_files],
+            output_files=[(x.name, bool(x.is_folder)) for x in output_files],
+            parameters=[(x.name, x.value) for x in parameters]
+        )
+    except ProcessorSpecValidationError as e:
+        raise KeyError(str(e)) from e
 
 def _model_dump(model, exclude_none=False):
     # handle both pydantic v1 and v2
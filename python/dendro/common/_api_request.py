@@ -1,11 +1,18 @@
+from typing import Union
 import os
+import time
+import hmac
+import hashlib
+import secrets
 import requests
 from ._crypto_keys import _sign_message_str
 
 dendro_url = os.getenv('DENDRO_URL', 'https://dendro.vercel.app')
 
 _globals = {
-    'test_client': None
+    'test_client': None,
+    'session_tokens_disabled_until': 0,
+    'num_session_handshake_failures': 0
 }
 def _use_api_test_client(test_client):
     _globals['test_client'] = test_client
@@ -14,38 +21,22 @@ def _compute_resource_get_api_request(*,
     url_path: str,
     compute_resource_id: str,
     compute_resource_private_key: str,
+    params: Union[dict, None] = None, # query parameters (not included in the signed payload)
+    timeout: float = 60,
     _wrong_payload_for_testing: bool = False,
     _wrong_signature_for_testing: bool = False
 ):
-    payload = url_path
-    signature = _sign_message_str(payload, compute_resource_id, compute_resource_private_key)
-
-    if _wrong_payload_for_testing:
-        payload = 'wrong payload'
-    if _wrong_signature_for_testing:
-        signature = 'wrong signature'
-
-    headers = {
-        'compute-resource-id': compute_resource_id,
-        'compute-resource-payload': payload,
-        'compute-resource-signature': signature
-    }
-
-    test_client = _globals['test_client']
-    if test_client is None:
-        url = f'{dendro_url}{url_path}'
-        client = requests
-    else:
-        assert url_path.startswith('/api')
-        url = url_path
-        client = test_client
-    try:
-        resp = client.get(url, headers=headers, timeout=60)
-        resp.raise_for_status()
-    except Exception as e:
-        print(f'Error in compute resource get api request for {url}; {e}')
-        raise
-    return resp.json()
+    return _compute_resource_api_request(
+        method='get',
+        url_path=url_path,
+        compute_resource_id=compute_resource_id,
+        compute_resource_private_key=compute_resource_private_key,
+        data=None,
+        params=params,
+        timeout=timeout,
+        _wrong_payload_for_testing=_wrong_payload_for_testing,
+        _wrong_signature_for_testing=_wrong_signature_for_testing
+    )
 
 # not used right now
 # def _compute_resource_post_api_request(*,
@@ -55,7 +46,7 @@ def _compute_resource_get_api_request(*,
 #     data: dict
 # ):
 #     payload = url_path
-#     signature = _sign_message_str(payload, compute_resource_id, compute_resource_private_key)
+#     signature = _sign_message_str(payload, compute_resource_private_key)
 
 #     headers = {
 #         'compute-resource-id': compute_resource_id,
@@ -85,14 +76,49 @@ def _compute_resource_put_api_request(*,
     compute_resource_private_key: str,
     data: dict
 ):
+    return _compute_resource_api_request(
+        method='put',
+        url_path=url_path,
+        compute_resource_id=compute_resource_id,
+        compute_resource_private_key=compute_resource_private_key,
+        data=data
+    )
+
+def _compute_resource_api_request(*,
+    method: str,
+    url_path: str,
+    compute_resource_id: str,
+    compute_resource_private_key: str,
+    data: Union[dict, None],
+    params: Union[dict, None] = None,
+    timeout: float = 60,
+    _wrong_payload_for_testing: bool = False,
+    _wrong_signature_for_testing: bool = False,
+    _use_session: bool = True
+):
+    session = _get_compute_resource_session(
+        compute_resource_id=compute_resource_id,
+        compute_resource_private_key=compute_resource_private_key
+    ) if _use_session else None
+
     payload = url_path
-    signature = _sign_message_str(payload, compute_resource_id, compute_resource_private_key)
+    if session is not None:
+        signature = _sign_session_request(payload=payload, session_key=session['sessionKey'])
+    else:
+        signature = _sign_message_str(payload, compute_resource_private_key)
+
+    if _wrong_payload_for_testing:
+        payload = 'wrong payload'
+    if _wrong_signature_for_testing:
+        signature = 'wrong signature'
 
     headers = {
         'compute-resource-id': compute_resource_id,
         'compute-resource-payload': payload,
         'compute-resource-signature': signature
     }
+    if session is not None:
+        headers['compute-resource-session-token'] = session['sessionToken']
 
     test_client = _globals['test_client']
     if test_client is None:
@@ -103,13 +129,93 @@ def _compute_resource_put_api_request(*,
         url = url_path
         client = test_client
     try:
-        resp = client.put(url, headers=headers, json=data, timeout=60)
+        if method == 'get':
+            resp = client.get(url, headers=headers, params=params, timeout=timeout)
+        else:
+            resp = client.put(url, headers=headers, json=data, timeout=timeout)
+        if session is not None and resp.status_code == 401:
+            # the session may have been invalidated on the server (e.g., the secret was rotated)
+            # so we drop it (the next request creates a new one) and retry this request with an Ed25519 signature
+            print(f'Session token was rejected for {url}; retrying with signature')
+            _compute_resource_sessions.pop(compute_resource_id, None)
+            return _compute_resource_api_request(
+                method=method,
+                url_path=url_path,
+                compute_resource_id=compute_resource_id,
+                compute_resource_private_key=compute_resource_private_key,
+                data=data,
+                params=params,
+                timeout=timeout,
+                _wrong_payload_for_testing=_wrong_payload_for_testing,
+                _wrong_signature_for_testing=_wrong_signature_for_testing,
+                _use_session=False
+            )
         resp.raise_for_status()
     except Exception as e:
-        print(f'Error in compute resource put api request for {url}; {e}')
+        print(f'Error in compute resource {method} api request for {url}; {e}')
         raise
     return resp.json()
 
+# Compute resource session tokens (optional, enabled with COMPUTE_RESOURCE_USE_SESSION_TOKENS=1)
+# A single Ed25519-signed handshake is exchanged for a short-lived session token,
+# and subsequent requests are authenticated with an HMAC using the session key
+_compute_resource_sessions = {} # compute resource id -> {sessionToken, sessionKey, expiresAt}
+MIN_SESSION_HANDSHAKE_BACKOFF_SEC = 10
+MAX_SESSION_HANDSHAKE_BACKOFF_SEC = 60 * 10
+
+def _get_compute_resource_session(*, compute_resource_id: str, compute_resource_private_key: str) -> Union[dict, None]:
+    if os.getenv('COMPUTE_RESOURCE_USE_SESSION_TOKENS', '') != '1':
+        return None
+    if time.time() < _globals['session_tokens_disabled_until']:
+        return None
+    session = _compute_resource_sessions.get(compute_resource_id, None)
+    # renew the session a few minutes before it expires
+    if session is not None and session['expiresAt'] - time.time() > 60 * 5:
+        return session
+    url_path = f'/api/compute_resource/compute_resources/{compute_resource_id}/session'
+    nonce = secrets.token_hex(16)
+    timestamp = time.time()
+    payload = f'{url_path}:{nonce}:{timestamp}'
+    headers = {
+        'compute-resource-id': compute_resource_id,
+        'compute-resource-payload': payload,
+        'compute-resource-signature': _sign_message_str(payload, compute_resource_private_key)
+    }
+    test_client = _globals['test_client']
+    if test_client is None:
+        url = f'{dendro_url}{url_path}'
+        client = requests
+    else:
+        url = url_path
+        client = test_client
+    try:
+        resp = client.post(url, headers=headers, json={'nonce': nonce, 'timestamp': timestamp}, timeout=60)
+        if resp.status_code in [404, 405, 501]:
+            # the server does not support (or has not enabled) session tokens, so we sign each request for a while
+            print('Compute resource sessions are not supported by the server; falling back to signed requests')
+            _globals['session_tokens_disabled_until'] = time.time() + MAX_SESSION_HANDSHAKE_BACKOFF_SEC
+            return None
+        resp.raise_for_status()
+        session = resp.json()
+    except Exception as e:
+        # we sign requests for a while rather than attempting a handshake before each one (which would add to the load),
+        # backing off exponentially if the handshake keeps failing
+        num_failures = _globals['num_session_handshake_failures'] + 1
+        _globals['num_session_handshake_failures'] = num_failures
+        backoff_sec = min(MIN_SESSION_HANDSHAKE_BACKOFF_SEC * 2 ** (num_failures - 1), MAX_SESSION_HANDSHAKE_BACKOFF_SEC)
+        print(f'Unable to create compute resource session; falling back to signed requests for {backoff_sec} seconds; {e}')
+        _globals['session_tokens_disabled_until'] = time.time() + backoff_sec
+        return None
+    _globals['num_session_handshake_failures'] = 0
+    _compute_resource_sessions[compute_resource_id] = session
+    return session
+
+def _sign_session_request(*, payload: str, session_key: str) -> str:
+    # must match sign_session_request in api_helpers/services/_session_tokens.py
+    timestamp_str = str(int(time.time()))
+    mac = hmac.new(session_key.encode('utf-8'), f'{payload}.{timestamp_str}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'{timestamp_str}.{mac}'
+
 def _processor_get_api_request(*,
     url_path: str,
     headers: dict
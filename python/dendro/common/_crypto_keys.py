@@ -1,5 +1,9 @@
+from functools import lru_cache
+
+
 def sign_message(msg: dict, public_key_hex: str, private_key_hex: str) -> str:
-    return _sign_message(msg, public_key_hex, private_key_hex)
+    # public_key_hex is not needed for signing, but it is kept so that existing callers keep working
+    return _sign_message(msg, private_key_hex)
 
 ed25519PubKeyPrefix = "302a300506032b6570032100"
 ed25519PrivateKeyPrefix = "302e020100300506032b657004220420"
@@ -14,31 +18,38 @@ def _sha1_of_string(txt: str) -> str:
     ret = hh.hexdigest()
     return ret
 
-def _sign_message(msg: dict, public_key_hex: str, private_key_hex: str) -> str:
+def _sign_message(msg: dict, private_key_hex: str) -> str:
     msg_json = _deterministic_json_dumps(msg)
-    return _sign_message_str(msg_json, public_key_hex, private_key_hex)
+    return _sign_message_str(msg_json, private_key_hex)
 
 
-def _sign_message_str(msg: str, public_key_hex: str, private_key_hex: str) -> str:
-    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+def _sign_message_str(msg: str, private_key_hex: str) -> str:
+    # the key objects are cached since the compute resource daemon signs many requests with the same key
     msg_hash = _sha1_of_string(msg)
     msg_bytes = bytes.fromhex(msg_hash)
-    privk = Ed25519PrivateKey.from_private_bytes(bytes.fromhex(private_key_hex))
-    pubk = Ed25519PublicKey.from_public_bytes(bytes.fromhex(public_key_hex))
+    privk = _get_private_key(private_key_hex)
     signature = privk.sign(msg_bytes).hex()
-    pubk.verify(bytes.fromhex(signature), msg_bytes)
     return signature
 
+@lru_cache(maxsize=64)
+def _get_private_key(private_key_hex: str):
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    return Ed25519PrivateKey.from_private_bytes(bytes.fromhex(private_key_hex))
+
+@lru_cache(maxsize=1024)
+def _get_public_key(public_key_hex: str):
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    return Ed25519PublicKey.from_public_bytes(bytes.fromhex(public_key_hex))
+
 def _verify_signature(msg: dict, public_key_hex: str, signature: str):
     msg_json = _deterministic_json_dumps(msg)
     return _verify_signature_str(msg_json, public_key_hex, signature)
 
 def _verify_signature_str(msg: str, public_key_hex: str, signature: str):
-    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
     msg_hash = _sha1_of_string(msg)
     msg_bytes = bytes.fromhex(msg_hash)
-    pubk = Ed25519PublicKey.from_public_bytes(bytes.fromhex(public_key_hex))
     try:
+        pubk = _get_public_key(public_key_hex)
         pubk.verify(bytes.fromhex(signature), msg_bytes)
     except: # noqa: E722
         return False
@@ -59,6 +70,6 @@ def generate_keypair():
         format=serialization.PublicFormat.Raw
     ).hex() # type: ignore
     test_msg = {'a': 1}
-    test_signature = _sign_message(test_msg, public_key_hex, private_key_hex)
+    test_signature = _sign_message(test_msg, private_key_hex)
     assert _verify_signature(test_msg, public_key_hex, test_signature)
     return public_key_hex, private_key_hex
@@ -0,0 +1,148 @@
+from typing import Any, Callable, List, Tuple
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from .dendro_types import ComputeResourceSpecProcessor
+
+
+class ProcessorSpecValidationError(Exception):
+    pass
+
+class ProcessorSpecValidator:
+    """Checks that a job is consistent with a processor spec.
+
+    The lookups and required sets are computed once per spec, so use get_processor_spec_validator()
+    to share validators between jobs (e.g., in a batch submission). This is used by both the API and the client.
+    """
+    def __init__(self, processor_spec: ComputeResourceSpecProcessor):
+        self.processor_name = processor_spec.name
+        self.inputs = {x.name: x for x in processor_spec.inputs}
+        self.input_folders = {x.name: x for x in processor_spec.inputFolders or []}
+        self.output_names = set(x.name for x in processor_spec.outputs)
+        self.output_folder_names = set(x.name for x in processor_spec.outputFolders or [])
+        self.parameters = {x.name: x for x in processor_spec.parameters}
+        self.required_input_names = set(x.name for x in processor_spec.inputs if not x.list)
+        self.required_input_folder_names = set(x.name for x in processor_spec.inputFolders or [] if not x.list)
+        self.required_parameter_names = set(
+            pp.name for pp in processor_spec.parameters
+            if pp.default is None and not pp.type.startswith('Optional[')
+        )
+        self._parameter_type_checkers = {pp.name: _get_parameter_type_checker(pp.type) for pp in processor_spec.parameters}
+
+    def validate(self, *,
+        processor_name: str,
+        input_files: List[Tuple[str, bool]], # (name, is_folder)
+        output_files: List[Tuple[str, bool]], # (name, is_folder)
+        parameters: List[Tuple[str, Any]] # (name, value)
+    ):
+        # check that the processor name matches
+        if self.processor_name != processor_name:
+            raise ProcessorSpecValidationError(f"Processor name mismatch: {self.processor_name} != {processor_name}")
+
+        # check that the input files are consistent with the spec
+        for name, is_folder in input_files:
+            is_list_item = name.endswith(']')
+            base_name = name.split('[')[0] if is_list_item else name
+            if not is_folder:
+                xx = self.inputs.get(base_name, None)
+                if not xx:
+                    raise ProcessorSpecValidationError(f"Processor input not found: {base_name}")
+                if is_list_item and not xx.list:
+                    raise ProcessorSpecValidationError(f"Processor input is not a list: {base_name}")
+            else:
+                xx = self.input_folders.get(base_name, None)
+                if not xx:
+                    raise ProcessorSpecValidationError(f"Processor input folder not found: {base_name}")
+                if is_list_item and not xx.list:
+                    raise ProcessorSpecValidationError(f"Processor input folder is not a list: {base_name}")
+
+        # check that all the required inputs and input folders are present
+        input_names = set(name for name, is_folder in input_files if not is_folder)
+        input_folder_names = set(name for name, is_folder in input_files if is_folder)
+        for name in sorted(self.required_input_names - input_names):
+            raise ProcessorSpecValidationError(f"Required input not found: {name}")
+        for name in sorted(self.required_input_folder_names - input_folder_names):
+            raise ProcessorSpecValidationError(f"Required input folder not found: {name}")
+
+        # check that the output files are consistent with the spec
+        for name, is_folder in output_files:
+            if not is_folder:
+                if name not in self.output_names:
+                    raise ProcessorSpecValidationError(f"Processor output not found: {name}")
+            else:
+                if name not in self.output_folder_names:
+                    raise ProcessorSpecValidationError(f"Processor output folder not found: {name}")
+
+        # check that the required outputs and output folders are present
+        output_names = set(name for name, is_folder in output_files if not is_folder)
+        output_folder_names = set(name for name, is_folder in output_files if is_folder)
+        for name in sorted(self.output_names - output_names):
+            raise ProcessorSpecValidationError(f"Required output not found: {name}")
+        for name in sorted(self.output_folder_names - output_folder_names):
+            raise ProcessorSpecValidationError(f"Required output folder not found: {name}")
+
+        # check that the input parameters are consistent with the spec
+        for name, value in parameters:
+            pp = self.parameters.get(name, None)
+            if not pp:
+                raise ProcessorSpecValidationError(f"Processor parameter not found: {name}")
+            if not self._parameter_type_checkers[name](value):
+                raise ProcessorSpecValidationError(f"Parameter value is not consistent with type: {name} {value} {pp.type}")
+
+        # check that the parameters that do not have a default are present
+        parameter_names = set(name for name, _ in parameters)
+        for name in sorted(self.required_parameter_names - parameter_names):
+            raise ProcessorSpecValidationError(f"Required parameter not found: {name}")
+
+# Compiled validators, keyed by the hash of the spec
+MAX_NUM_CACHED_PROCESSOR_SPEC_VALIDATORS = 256
+_validators: 'OrderedDict[str, ProcessorSpecValidator]' = OrderedDict()
+_validators_lock = threading.Lock()
+
+def get_processor_spec_validator(processor_spec: ComputeResourceSpecProcessor) -> ProcessorSpecValidator:
+    key = _get_processor_spec_hash(processor_spec)
+    with _validators_lock:
+        validator = _validators.get(key, None)
+        if validator is not None:
+            _validators.move_to_end(key)
+            return validator
+    validator = ProcessorSpecValidator(processor_spec)
+    with _validators_lock:
+        _validators[key] = validator
+        while len(_validators) > MAX_NUM_CACHED_PROCESSOR_SPEC_VALIDATORS:
+            _validators.popitem(last=False)
+    return validator
+
+def _get_processor_spec_hash(processor_spec: ComputeResourceSpecProcessor) -> str:
+    # handle both pydantic v1 and v2
+    spec_dict = processor_spec.model_dump() if hasattr(processor_spec, 'model_dump') else processor_spec.dict()
+    return hashlib.sha1(json.dumps(spec_dict, sort_keys=True, default=str).encode()).hexdigest()
+
+def _get_parameter_type_checker(type: str) -> Callable[[Any], bool]:
+    if type == 'str':
+        return lambda value: isinstance(value, str)
+    elif type == 'int':
+        return lambda value: isinstance(value, int)
+    elif type == 'float':
+        return lambda value: isinstance(value, float) or isinstance(value, int)
+    elif type == 'bool':
+        return lambda value: isinstance(value, bool)
+    elif type == 'List[str]':
+        return lambda value: isinstance(value, list) and all(isinstance(x, str) for x in value)
+    elif type == 'List[int]':
+        return lambda value: isinstance(value, list) and all(isinstance(x, int) for x in value)
+    elif type == 'List[float]':
+        return lambda value: isinstance(value, list) and all(isinstance(x, float) or isinstance(x, int) for x in value)
+    elif type == 'List[bool]':
+        return lambda value: isinstance(value, list) and all(isinstance(x, bool) for x in value)
+    elif type == 'Optional[int]':
+        return lambda value: isinstance(value, int) or value is None
+    elif type == 'Optional[float]':
+        return lambda value: isinstance(value, float) or isinstance(value, int) or value is None
+    else:
+        # only an error if a value is actually given for a parameter of this type
+        return lambda value: _raise_unknown_type(type)
+
+def _raise_unknown_type(type: str) -> bool:
+    raise Exception(f"Unknown type in parameter type check: {type}")
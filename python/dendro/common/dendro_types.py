@@ -125,6 +125,16 @@ class DendroJob(BaseModel):
     dandiApiKey: Union[str, None] = None
     deleted: Union[bool, None] = None
     pendingApproval: Union[bool, None] = None
+    priority: Union[int, None] = None # higher runs first, among the jobs of the same user in the same project
+
+class DendroFileManifestFile(BaseModel):
+    name: str
+    size: Union[int, None] = None
+
+class DendroFileManifest(BaseModel):
+    numFiles: int
+    totalSize: int
+    files: Union[List[DendroFileManifestFile], None] = None # not stored for folders with a very large number of files
 
 class DendroFile(BaseModel):
     projectId: str
@@ -137,6 +147,12 @@ class DendroFile(BaseModel):
     metadata: dict
     isFolder: Union[bool, None] = None
     jobId: Union[str, None] = None # the job that produced this file
+    fileManifest: Union[DendroFileManifest, None] = None # for folder outputs, stored when the job completes so we don't need to download file_manifest.json again
+
+class DendroFolderSummary(BaseModel):
+    path: str
+    numFiles: int # all files in the folder, including subfolders
+    totalSize: int
 
 class DendroScript(BaseModel):
     projectId: str
@@ -192,6 +208,7 @@ class PubsubSubscription(BaseModel):
     pubnubSubscribeKey: str
     pubnubChannel: str
     pubnubUser: str
+    eventStream: Union[bool, None] = None # whether the compute resource should also listen on the event stream endpoint
 
 class ProcessorGetJobResponseInput(BaseModel):
     name: str
@@ -281,6 +298,7 @@ class CreateJobRequest(BaseModel):
     dandiApiKey: Union[str, None] = None
     requiredResources: DendroJobRequiredResources
     runMethod: Literal['local', 'aws_batch', 'slurm']
+    priority: Union[int, None] = None
 
 class CreateJobResponse(BaseModel):
     jobId: str
@@ -4,6 +4,7 @@ from typing import List, Union, Literal
 from ..sdk.App import App
 from ..common.dendro_types import DendroComputeResourceApp
 from ..common._api_request import _compute_resource_get_api_request, _compute_resource_put_api_request
+from ..mock import using_mock
 
 
 class AppManager:
@@ -108,6 +109,22 @@ class AppManager:
                 environment_variables=environment_variables
             )
 
+        if 'local' in self._available_job_run_methods and app._app_image is not None and os.environ.get('CONTAINER_METHOD', 'docker') == 'docker':
+            # pull the image in the background so that the first job doesn't have to wait for it
+            from .DockerImageManager import get_docker_image_manager
+            get_docker_image_manager().warm(app._app_image)
+        if 'local' in self._available_job_run_methods and app._app_image is None and app._app_executable is not None and not using_mock():
+            # opt-in: start the worker pool of the app so that jobs don't have to import the app (see AppWorkerPoolManager.py)
+            from .AppWorkerPoolManager import get_app_worker_pool_manager
+            app_worker_pool_manager = get_app_worker_pool_manager()
+            if app_worker_pool_manager is not None:
+                app_worker_pool_manager.start(app._app_executable)
+        container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+        if ('local' in self._available_job_run_methods or 'slurm' in self._available_job_run_methods) and app._app_image is not None and container_method in ['singularity', 'apptainer']:
+            # build the .sif in the background so that jobs can run it directly
+            from .SifImageCache import get_sif_image_cache
+            get_sif_image_cache(container_method).warm(app._app_image)
+
         processor_names_str = ', '.join([p._name for p in app._processors])
         print(f'  processors: {processor_names_str}')
         print('')
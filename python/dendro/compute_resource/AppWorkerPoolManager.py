@@ -0,0 +1,100 @@
+from typing import Dict, Union
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+
+
+class _AppZygote:
+    def __init__(self, *, process: subprocess.Popen, socket_path: str, executable_mtime: float):
+        self.process = process
+        self.socket_path = socket_path
+        self.executable_mtime = executable_mtime
+
+class AppWorkerPoolManager:
+    """Keeps a zygote process for each local (non-container) app, which forks workers that have already imported the app
+
+    Opt-in with LOCAL_APP_WORKER_POOL_SIZE (the number of idle workers per app). Both the job process and the
+    JOB_INTERNAL=1 child process of a job are run in workers instead of new interpreters (see sdk/_app_worker_pool.py).
+    Each worker runs a single job process and exits, so jobs are isolated from each other as before.
+    """
+    def __init__(self, *, pool_size: int):
+        self._pool_size = pool_size
+        self._zygotes: Dict[str, _AppZygote] = {} # app executable -> zygote
+        self._lock = threading.Lock() # jobs are launched from the launch workers (see JobManager.py)
+        # unix socket paths are limited to about 100 characters, so these are not in the compute resource directory
+        self._socket_dir = tempfile.mkdtemp(prefix='dendro-app-workers-')
+    def start(self, app_executable: str):
+        """Start the zygote of the app, if it is not already running"""
+        with self._lock:
+            self._get_zygote(app_executable)
+    def get_socket_path(self, app_executable: str) -> Union[str, None]:
+        """The socket of the worker pool of the app, or None if it is not available (in which case a new process should be spawned)"""
+        with self._lock:
+            zygote = self._get_zygote(app_executable)
+            if zygote is None:
+                return None
+            if not os.path.exists(zygote.socket_path):
+                return None # still starting
+            return zygote.socket_path
+    def close(self):
+        with self._lock:
+            for zygote in self._zygotes.values():
+                # the zygote stops its idle workers; the workers that are running jobs are not affected
+                zygote.process.terminate()
+            for zygote in self._zygotes.values():
+                try:
+                    zygote.process.wait(5)
+                except subprocess.TimeoutExpired:
+                    zygote.process.kill()
+            self._zygotes = {}
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+    def _get_zygote(self, app_executable: str) -> Union[_AppZygote, None]:
+        try:
+            executable_mtime = os.path.getmtime(app_executable)
+        except OSError:
+            return None
+        zygote = self._zygotes.get(app_executable, None)
+        if zygote is not None:
+            if zygote.process.poll() is None and zygote.executable_mtime == executable_mtime:
+                return zygote
+            # the zygote exited, or the app has changed since it was started
+            if zygote.process.poll() is None:
+                zygote.process.terminate()
+            del self._zygotes[app_executable]
+        socket_path = os.path.join(self._socket_dir, f'{os.urandom(8).hex()}.sock')
+        os.makedirs('app_worker_logs', exist_ok=True)
+        log_fname = os.path.join('app_worker_logs', os.path.basename(os.path.dirname(os.path.abspath(app_executable))) + '.log')
+        print(f'Starting app worker pool for {app_executable}')
+        with open(log_fname, 'a', encoding='utf8') as log_file:
+            process = subprocess.Popen(
+                [app_executable],
+                env={
+                    **os.environ,
+                    'PYTHONUNBUFFERED': '1',
+                    'DENDRO_APP_ZYGOTE_SOCKET': socket_path,
+                    'DENDRO_APP_WORKER_POOL_SIZE': str(self._pool_size)
+                },
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        zygote = _AppZygote(process=process, socket_path=socket_path, executable_mtime=executable_mtime)
+        self._zygotes[app_executable] = zygote
+        return zygote
+
+_globals: Dict[str, Union[AppWorkerPoolManager, None]] = {
+    'app_worker_pool_manager': None
+}
+
+def get_app_worker_pool_manager() -> Union[AppWorkerPoolManager, None]:
+    """The app worker pool manager, or None if LOCAL_APP_WORKER_POOL_SIZE is not set"""
+    manager = _globals['app_worker_pool_manager']
+    if manager is None:
+        pool_size = int(os.environ.get('LOCAL_APP_WORKER_POOL_SIZE', None) or 0)
+        if pool_size <= 0:
+            return None
+        manager = AppWorkerPoolManager(pool_size=pool_size)
+        _globals['app_worker_pool_manager'] = manager
+    return manager
@@ -0,0 +1,166 @@
+from typing import Dict, List, Tuple, Union
+import os
+import tempfile
+import threading
+import subprocess
+from ..sdk._container_worker import _submit_to_container_worker, container_worker_jobs_dir
+
+
+class _ContainerWorker:
+    def __init__(self, *, process: subprocess.Popen, socket_dir: str):
+        self.process = process
+        self.socket_dir = socket_dir
+        self.socket_path = os.path.join(socket_dir, 'worker.sock')
+
+class ContainerWorkerManager:
+    """Keeps long-lived containers for the app images, which run the jobs sent to them one after another
+
+    Opt-in with CONTAINER_WORKER_POOL_SIZE (the maximum number of containers per app image). The containers are started
+    in the background when jobs come in and stop after being idle for a while (DENDRO_CONTAINER_WORKER_IDLE_TIMEOUT_SEC).
+    When all the containers of an image are busy (or still starting), the job is run in a container of its own as before.
+    Inside the container, the job runs just as it would in a container of its own (see sdk/_container_worker.py),
+    with its working directory under /tmp/jobs, which is the jobs directory of that container only
+    (container_workers/<worker>/tmp/jobs in the compute resource directory).
+    """
+    def __init__(self, *, max_num_workers_per_image: int, idle_timeout_sec: float):
+        self._max_num_workers_per_image = max_num_workers_per_image
+        self._idle_timeout_sec = idle_timeout_sec
+        self._workers: Dict[Tuple, List[_ContainerWorker]] = {}
+        self._num_workers_starting: Dict[Tuple, int] = {}
+        self._lock = threading.Lock() # jobs are launched from the launch workers (see JobManager.py)
+        # unix socket paths are limited to about 100 characters, so these are not in the compute resource directory
+        self._socket_base_dir = tempfile.mkdtemp(prefix='dendro-container-workers-')
+    def submit_job(self, *,
+        app_image: str,
+        app_executable: str,
+        env_vars: Dict[str, str],
+        project_id: str,
+        job_dir: str,
+        num_cpus: Union[int, None],
+        use_gpu: bool
+    ) -> bool:
+        """Returns True if the job was started in one of the containers"""
+        key = (app_image, app_executable, num_cpus, use_gpu)
+        with self._lock:
+            workers = [w for w in self._workers.get(key, []) if w.process.poll() is None]
+            self._workers[key] = workers
+        job_id = os.path.basename(job_dir)
+        # the container creates the directory in its own jobs directory (see _start_worker)
+        container_job_dir = f'{container_worker_jobs_dir}/{job_id}'
+        env = {
+            **env_vars,
+            'DENDRO_JOB_CLEANUP_DIR': f'{container_job_dir}/tmp',
+            'DENDRO_FILE_CACHE_DIR': f'/file_cache_projects/{project_id}/files',
+            'DENDRO_JOB_WORKING_DIR': f'{container_job_dir}/tmp/working',
+            'KACHERY_CLOUD_DIR': f'{container_job_dir}/tmp/.kachery-cloud'
+        }
+        timeout_sec = float(env_vars['JOB_TIMEOUT_SEC']) if 'JOB_TIMEOUT_SEC' in env_vars else None
+        for worker in workers:
+            if not os.path.exists(worker.socket_path):
+                continue # still starting
+            try:
+                if _submit_to_container_worker(socket_path=worker.socket_path, env=env, cwd=f'{container_job_dir}/tmp/working', timeout_sec=timeout_sec):
+                    print(f'Job {job_id} started in container worker {worker.socket_dir}')
+                    return True
+            except Exception as e: # pylint: disable=broad-except
+                print(f'Warning: problem submitting job to container worker {worker.socket_dir}: {e}')
+        with self._lock:
+            num_workers = len(self._workers[key]) + self._num_workers_starting.get(key, 0)
+            if num_workers >= self._max_num_workers_per_image:
+                return False
+            self._num_workers_starting[key] = self._num_workers_starting.get(key, 0) + 1
+        # start a container that will be available for the next jobs, in the background because it may have to wait
+        # for the image (this job does not wait for it)
+        threading.Thread(target=self._start_worker_in_background, args=(key,), daemon=True).start()
+        return False
+    def close(self):
+        """Ask the containers to stop once their current job is done (running jobs are not interrupted)"""
+        with self._lock:
+            for workers in self._workers.values():
+                for worker in workers:
+                    with open(os.path.join(worker.socket_dir, 'stop'), 'w') as f:
+                        f.write('stop')
+            self._workers = {}
+    def _start_worker_in_background(self, key: Tuple):
+        app_image, app_executable, num_cpus, use_gpu = key
+        try:
+            worker = self._start_worker(app_image=app_image, app_executable=app_executable, num_cpus=num_cpus, use_gpu=use_gpu)
+            with self._lock:
+                self._workers.setdefault(key, []).append(worker)
+        except Exception as e: # pylint: disable=broad-except
+            print(f'Warning: problem starting container worker for {app_image}: {e}')
+        finally:
+            with self._lock:
+                self._num_workers_starting[key] -= 1
+    def _start_worker(self, *, app_image: str, app_executable: str, num_cpus: Union[int, None], use_gpu: bool) -> _ContainerWorker:
+        socket_dir = tempfile.mkdtemp(dir=self._socket_base_dir)
+        worker_tmp_dir = os.path.join(os.getcwd(), 'container_workers', os.path.basename(socket_dir), 'tmp')
+        # the jobs directory of this container only, mounted at /tmp/jobs along with /tmp (see container_worker_jobs_dir)
+        jobs_dir = os.path.join(worker_tmp_dir, 'jobs')
+        os.makedirs(jobs_dir, exist_ok=True)
+        file_cache_projects_dir = os.path.join(os.getcwd(), 'file_cache', 'projects')
+        os.makedirs(file_cache_projects_dir, exist_ok=True)
+        env_vars = {
+            'PYTHONUNBUFFERED': '1',
+            'APP_EXECUTABLE': app_executable,
+            'DENDRO_CONTAINER_WORKER_SOCKET': '/dendro_worker/worker.sock',
+            'DENDRO_CONTAINER_WORKER_IDLE_TIMEOUT_SEC': str(self._idle_timeout_sec)
+        }
+        container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+        if container_method == 'docker':
+            from .DockerImageManager import get_docker_image_manager
+            get_docker_image_manager().ensure_image(app_image)
+            cmd = ['docker', 'run', '--rm']
+            cmd.extend(['-v', f'{worker_tmp_dir}:/tmp'])
+            cmd.extend(['-v', f'{file_cache_projects_dir}:/file_cache_projects'])
+            cmd.extend(['-v', f'{socket_dir}:/dendro_worker'])
+            cmd.extend(['--workdir', '/tmp'])
+            for k, v in env_vars.items():
+                cmd.extend(['-e', f'{k}={v}'])
+            if num_cpus is not None:
+                cmd.extend(['--cpus', str(num_cpus)])
+            if use_gpu:
+                cmd.extend(['--gpus', 'all'])
+            cmd.extend([app_image, app_executable])
+        elif container_method == 'singularity' or container_method == 'apptainer':
+            cmd = [container_method, 'exec']
+            cmd.extend(['--bind', f'{worker_tmp_dir}:/tmp'])
+            cmd.extend(['--bind', f'{file_cache_projects_dir}:/file_cache_projects'])
+            cmd.extend(['--bind', f'{socket_dir}:/dendro_worker'])
+            cmd.extend(['--pwd', '/tmp'])
+            cmd.extend(['--cleanenv'])
+            cmd.extend(['--contain'])
+            if use_gpu:
+                cmd.extend(['--nv'])
+            for k, v in env_vars.items():
+                cmd.extend(['--env', f'{k}={v}'])
+            from .SifImageCache import get_sif_image_cache
+            sif_path = get_sif_image_cache(container_method).get_sif_path(app_image, wait=True)
+            cmd.extend([sif_path if sif_path is not None else f'docker://{app_image}', app_executable])
+        else:
+            raise ValueError(f'Unexpected container method: {container_method}')
+        print(f'Starting container worker: {" ".join(cmd)}')
+        with open(os.path.join(os.path.dirname(worker_tmp_dir), 'container_worker.log'), 'a', encoding='utf8') as log_file:
+            process = subprocess.Popen(
+                cmd,
+                start_new_session=True, # so that running jobs are not affected if the compute resource is stopped
+                stdout=log_file,
+                stderr=subprocess.STDOUT
+            )
+        return _ContainerWorker(process=process, socket_dir=socket_dir)
+
+_globals: Dict[str, Union[ContainerWorkerManager, None]] = {
+    'container_worker_manager': None
+}
+
+def get_container_worker_manager() -> Union[ContainerWorkerManager, None]:
+    """The container worker manager, or None if CONTAINER_WORKER_POOL_SIZE is not set"""
+    manager = _globals['container_worker_manager']
+    if manager is None:
+        max_num_workers_per_image = int(os.environ.get('CONTAINER_WORKER_POOL_SIZE', None) or 0)
+        if max_num_workers_per_image <= 0:
+            return None
+        idle_timeout_sec = float(os.environ.get('DENDRO_CONTAINER_WORKER_IDLE_TIMEOUT_SEC', None) or 60 * 10)
+        manager = ContainerWorkerManager(max_num_workers_per_image=max_num_workers_per_image, idle_timeout_sec=idle_timeout_sec)
+        _globals['container_worker_manager'] = manager
+    return manager
@@ -0,0 +1,104 @@
+from typing import Dict, List, Union
+import time
+import sqlite3
+import threading
+
+
+class JobLaunchRecord:
+    def __init__(self, *,
+        job_id: str,
+        run_method: str,
+        state: str, # 'launching' | 'launched' | 'failed'
+        pid: Union[int, None],
+        aws_batch_job_id: Union[str, None],
+        slurm_group_id: Union[str, None],
+        timestamp: float
+    ):
+        self.job_id = job_id
+        self.run_method = run_method
+        self.state = state
+        self.pid = pid
+        self.aws_batch_job_id = aws_batch_job_id
+        self.slurm_group_id = slurm_group_id
+        self.timestamp = timestamp
+
+class DaemonStateJournal:
+    """Records the jobs that the daemon launched (or failed) in a SQLite database in the compute resource directory
+
+    A launch is recorded as 'launching' before the job status is set to starting, and as 'launched' once the process
+    was spawned (with its pid), the job was submitted to AWS Batch (with the batch job ID), or the job was added to a
+    slurm group. After a restart, this tells the daemon which jobs it actually launched (see JobManager._reconcile_jobs).
+    A path of None means an in-memory journal (nothing survives a restart).
+    """
+    def __init__(self, path: Union[str, None]):
+        self._path = path
+        # the journal is written from the job launch workers as well as the daemon thread
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path if path is not None else ':memory:', check_same_thread=False, isolation_level=None)
+        if path is not None:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS job_launches (
+                job_id TEXT PRIMARY KEY,
+                run_method TEXT NOT NULL,
+                state TEXT NOT NULL,
+                pid INTEGER,
+                aws_batch_job_id TEXT,
+                slurm_group_id TEXT,
+                timestamp REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS job_launches_slurm_group_id ON job_launches (slurm_group_id)')
+    def record_job_launching(self, job_id: str, *, run_method: str):
+        self._execute(
+            'INSERT OR REPLACE INTO job_launches (job_id, run_method, state, timestamp) VALUES (?, ?, ?, ?)',
+            (job_id, run_method, 'launching', time.time())
+        )
+    def record_job_launched(self, job_id: str, *, pid: Union[int, None] = None, aws_batch_job_id: Union[str, None] = None, slurm_group_id: Union[str, None] = None):
+        self._execute(
+            'UPDATE job_launches SET state = ?, pid = ?, aws_batch_job_id = ?, slurm_group_id = ?, timestamp = ? WHERE job_id = ?',
+            ('launched', pid, aws_batch_job_id, slurm_group_id, time.time(), job_id)
+        )
+    def record_job_failed(self, job_id: str, *, run_method: str):
+        self._execute(
+            'INSERT INTO job_launches (job_id, run_method, state, timestamp) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (job_id) DO UPDATE SET state = excluded.state, timestamp = excluded.timestamp',
+            (job_id, run_method, 'failed', time.time())
+        )
+    def remove_jobs(self, job_ids: List[str]):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany('DELETE FROM job_launches WHERE job_id = ?', [(job_id,) for job_id in job_ids])
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+    def get_job_launches(self) -> Dict[str, JobLaunchRecord]:
+        with self._lock:
+            rows = self._conn.execute('SELECT job_id, run_method, state, pid, aws_batch_job_id, slurm_group_id, timestamp FROM job_launches').fetchall()
+        return {
+            row[0]: JobLaunchRecord(job_id=row[0], run_method=row[1], state=row[2], pid=row[3], aws_batch_job_id=row[4], slurm_group_id=row[5], timestamp=row[6])
+            for row in rows
+        }
+    def get_slurm_group_ids(self, job_ids: List[str]) -> Dict[str, str]:
+        """The slurm group of each of the jobs that was added to one"""
+        ret: Dict[str, str] = {}
+        with self._lock:
+            # stay well below the maximum number of parameters of a sqlite query
+            for i in range(0, len(job_ids), 500):
+                chunk = job_ids[i:i + 500]
+                rows = self._conn.execute(
+                    f'SELECT job_id, slurm_group_id FROM job_launches WHERE slurm_group_id IS NOT NULL AND job_id IN ({",".join("?" * len(chunk))})',
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    ret[row[0]] = row[1]
+        return ret
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    def _execute(self, sql: str, params: tuple):
+        with self._lock:
+            self._conn.execute(sql, params)
@@ -0,0 +1,42 @@
+from typing import Callable, Dict, List, Tuple
+import time
+import heapq
+
+
+class DaemonTimers:
+    """Periodic timers for the compute resource daemon (full sync of jobs, slurm work, cleanup).
+
+    The daemon blocks on its message queue for at most time_until_next() seconds and then calls run_due_timers().
+    """
+    def __init__(self):
+        self._intervals: Dict[str, float] = {}
+        self._callbacks: Dict[str, Callable[[], None]] = {}
+        self._due_times: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = [] # (due time, name); entries that no longer match _due_times are stale
+    def add(self, name: str, *, interval_sec: float, callback: Callable[[], None], run_immediately: bool = False):
+        self._intervals[name] = interval_sec
+        self._callbacks[name] = callback
+        self._schedule(name, time.time() if run_immediately else time.time() + interval_sec)
+    def reset(self, name: str):
+        """Postpone the timer by a full interval (e.g., because the work was just done for another reason)"""
+        self._schedule(name, time.time() + self._intervals[name])
+    def time_until_next(self) -> float:
+        self._discard_stale_entries()
+        if len(self._heap) == 0:
+            return float('inf')
+        return max(0, self._heap[0][0] - time.time())
+    def run_due_timers(self):
+        while True:
+            self._discard_stale_entries()
+            if len(self._heap) == 0 or self._heap[0][0] > time.time():
+                return
+            _, name = heapq.heappop(self._heap)
+            # schedule the next run before calling back, so that the callback can reset the timer
+            self._schedule(name, time.time() + self._intervals[name])
+            self._callbacks[name]()
+    def _schedule(self, name: str, due_time: float):
+        self._due_times[name] = due_time
+        heapq.heappush(self._heap, (due_time, name))
+    def _discard_stale_entries(self):
+        while len(self._heap) > 0 and self._due_times.get(self._heap[0][1], None) != self._heap[0][0]:
+            heapq.heappop(self._heap)
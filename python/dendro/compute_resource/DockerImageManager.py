@@ -0,0 +1,106 @@
+from typing import Dict, Union
+import time
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class DockerImageState:
+    def __init__(self):
+        self.image_id: Union[str, None] = None # local image ID after the last successful pull
+        self.repo_digest: Union[str, None] = None # registry digest after the last successful pull
+        self.timestamp_pulled: Union[float, None] = None
+        self.pull_duration_sec: Union[float, None] = None
+        self.pull_future: Union[Future, None] = None # set while a pull is in progress
+
+class DockerImageManager:
+    """Pulls the images of the apps in the background so that jobs don't have to wait for docker pull
+
+    Images are pulled when an app is loaded (warm) and refreshed periodically (refresh).
+    When a job starts (ensure_image), the image is not pulled again if the local image is the one from the last pull,
+    and that pull is recent enough.
+    """
+    def __init__(self, *, max_concurrent_pulls: int = 2, max_age_sec: float = 60 * 60):
+        self._max_age_sec = max_age_sec
+        self._images: Dict[str, DockerImageState] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_pulls, thread_name_prefix='dendro-docker-pull')
+    def warm(self, image: str):
+        """Start pulling the image in the background, unless it is already pulled or being pulled"""
+        with self._lock:
+            state = self._images.setdefault(image, DockerImageState())
+            if state.pull_future is not None or state.timestamp_pulled is not None:
+                return
+            self._start_pull(image, state)
+    def refresh(self):
+        """Pull all the known images again in the background (a pull of an unchanged image only checks the registry)"""
+        with self._lock:
+            for image, state in self._images.items():
+                if state.pull_future is None:
+                    self._start_pull(image, state)
+    def ensure_image(self, image: str):
+        """Called before running a job. Waits for a pull that is in progress, or pulls now if the local image is not current."""
+        with self._lock:
+            state = self._images.setdefault(image, DockerImageState())
+            future = state.pull_future
+            image_id = self._get_recently_pulled_image_id(state)
+        if future is None:
+            # docker image inspect is run without holding the lock, so that job launches don't wait on each other
+            # the local image may have been removed or replaced since the last pull
+            if image_id is not None and self._inspect_image(image, '{{.Id}}') == image_id:
+                return
+            with self._lock:
+                future = state.pull_future # another job may have started a pull in the meantime
+                if future is None:
+                    future = self._start_pull(image, state)
+        future.result()
+    def get_image_state(self, image: str) -> Union[DockerImageState, None]:
+        return self._images.get(image, None)
+    def _get_recently_pulled_image_id(self, state: DockerImageState) -> Union[str, None]:
+        if state.image_id is None or state.timestamp_pulled is None:
+            return None
+        if time.time() - state.timestamp_pulled > self._max_age_sec:
+            return None
+        return state.image_id
+    def _start_pull(self, image: str, state: DockerImageState) -> Future:
+        future = self._executor.submit(self._pull_and_record, image, state)
+        state.pull_future = future
+        return future
+    def _pull_and_record(self, image: str, state: DockerImageState):
+        try:
+            print(f'Pulling image {image}')
+            timer = time.time()
+            self._pull(image)
+            elapsed = time.time() - timer
+            image_id = self._inspect_image(image, '{{.Id}}')
+            repo_digest = self._inspect_image(image, '{{index .RepoDigests 0}}')
+            with self._lock:
+                state.image_id = image_id
+                state.repo_digest = repo_digest
+                state.timestamp_pulled = time.time()
+                state.pull_duration_sec = elapsed
+            print(f'Pulled image {image} in {elapsed:.1f} sec ({repo_digest or image_id})')
+        except Exception as e: # pylint: disable=broad-except
+            # docker run will pull the image if it is missing, so this is not fatal
+            print(f'Error pulling image {image}: {e}')
+        finally:
+            with self._lock:
+                state.pull_future = None
+    def _pull(self, image: str):
+        subprocess.run(['docker', 'pull', image], check=True, stdout=subprocess.DEVNULL)
+    def _inspect_image(self, image: str, format: str) -> Union[str, None]:
+        result = subprocess.run(['docker', 'image', 'inspect', '--format', format, image], capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+
+_globals: Dict[str, Union[DockerImageManager, None]] = {
+    'docker_image_manager': None
+}
+
+def get_docker_image_manager() -> DockerImageManager:
+    manager = _globals['docker_image_manager']
+    if manager is None:
+        manager = DockerImageManager()
+        _globals['docker_image_manager'] = manager
+    return manager
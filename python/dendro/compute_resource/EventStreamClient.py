@@ -0,0 +1,70 @@
+from typing import Any, Dict, List, Optional, Union
+import queue
+import threading
+from ..common._api_request import _compute_resource_get_api_request
+
+
+class EventStreamClient:
+    """Receives job events for a compute resource by long-polling the event stream endpoint of the dendro API.
+
+    This is a low-latency alternative to pubnub that does not require an outside service.
+    It has the same interface as PubsubClient.
+    """
+    def __init__(self, *,
+        compute_resource_id: str,
+        compute_resource_private_key: str,
+        poll_timeout_sec: float = 20,
+        message_queue: Optional[queue.Queue] = None # the daemon passes its own queue so that it can block on it
+    ):
+        self._compute_resource_id = compute_resource_id
+        self._compute_resource_private_key = compute_resource_private_key
+        self._poll_timeout_sec = poll_timeout_sec
+        self._message_queue = message_queue if message_queue is not None else queue.Queue()
+        self._has_messages = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    def take_messages(self) -> List[dict]:
+        self._has_messages.clear()
+        ret = []
+        while True:
+            try:
+                msg = self._message_queue.get(block=False)
+                ret.append(msg)
+            except queue.Empty:
+                break
+        return ret
+    def wait_for_messages(self, timeout: float) -> bool:
+        """Wait until there are messages to take, or until timeout seconds have elapsed"""
+        return self._has_messages.wait(timeout)
+    def close(self):
+        self._closed.set()
+        self._thread.join(timeout=self._poll_timeout_sec + 5)
+    def _run(self):
+        url_path = f'/api/compute_resource/compute_resources/{self._compute_resource_id}/events'
+        since: Union[int, None] = None
+        epoch: Union[str, None] = None
+        while not self._closed.is_set():
+            params: Dict[str, Any] = {'timeout': self._poll_timeout_sec}
+            if since is not None:
+                params['since'] = since
+            if epoch is not None:
+                params['epoch'] = epoch
+            try:
+                resp = _compute_resource_get_api_request(
+                    url_path=url_path,
+                    compute_resource_id=self._compute_resource_id,
+                    compute_resource_private_key=self._compute_resource_private_key,
+                    params=params,
+                    timeout=self._poll_timeout_sec + 30
+                )
+            except Exception as e:
+                print(f'Error getting events from event stream: {e}')
+                self._closed.wait(10)
+                continue
+            for msg in resp['events']:
+                self._message_queue.put(msg)
+            if len(resp['events']) > 0:
+                self._has_messages.set()
+            since = resp['seq']
+            epoch = resp.get('epoch', None)
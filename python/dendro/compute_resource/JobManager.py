@@ -1,20 +1,34 @@
-from typing import List, TYPE_CHECKING
+from typing import Dict, List, Set, Union, TYPE_CHECKING
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .SlurmJobHandler import SlurmJobHandler
+from .ResourceScheduler import get_run_method_capacity, get_max_backfill_wait_sec, choose_pending_jobs_to_start
+from .JobQueuePolicy import get_job_queue_policy
+from .DaemonStateJournal import DaemonStateJournal, JobLaunchRecord
 from ..common.dendro_types import DendroJob
+from ..common._api_request import _compute_resource_get_api_request
 from ..sdk._run_job_parent_process import _set_job_status
+from ..mock import using_mock
 if TYPE_CHECKING:
     from .AppManager import AppManager
 
 
-# TODO: make these configurable
-max_simultaneous_local_jobs = 2
-max_simultaneous_aws_batch_jobs = 20
+# must match MAX_NUM_JOB_IDS_PER_REQUEST in the compute resource router of the API
+max_num_job_ids_per_request = 100
+
+finished_job_statuses = ['completed', 'failed']
+
+# Starting a job involves a status update over HTTP, possibly a docker pull, and spawning a process (or submitting to AWS Batch),
+# so local and AWS Batch jobs are started on a pool of worker threads so that the daemon loop is not blocked
+default_max_concurrent_job_launches = 8
 
 class JobManager:
     def __init__(self, *,
                  compute_resource_id: str,
                  compute_resource_private_key: str,
-                 app_manager: 'AppManager'
+                 app_manager: 'AppManager',
+                 state_journal_path: Union[str, None] = None
                 ):
         self._compute_resource_id = compute_resource_id
         self._compute_resource_private_key = compute_resource_private_key
@@ -24,9 +38,133 @@ class JobManager:
         # so that we don't attempt multiple times in the case where starting failed
         self._attempted_to_start_job_ids = set()
         self._attempted_to_fail_job_ids = set()
+        self._attempted_to_fail_job_ids_lock = threading.Lock() # jobs may be failed from the launch workers
+
+        # these are also recorded in the journal, so that they survive a restart of the daemon
+        self._journal = DaemonStateJournal(state_journal_path)
+        self._launch_records_to_reconcile: Union[Dict[str, JobLaunchRecord], None] = self._journal.get_job_launches()
+        for record in self._launch_records_to_reconcile.values():
+            if record.state == 'failed':
+                self._attempted_to_fail_job_ids.add(record.job_id)
+            else:
+                self._attempted_to_start_job_ids.add(record.job_id)
+
+        max_concurrent_job_launches = int(os.environ.get('MAX_CONCURRENT_JOB_LAUNCHES', None) or default_max_concurrent_job_launches)
+        self._launch_executor = ThreadPoolExecutor(max_workers=max_concurrent_job_launches, thread_name_prefix='dendro-job-launch')
 
         self._slurm_job_handler = SlurmJobHandler(job_manager=self)
-    def handle_jobs(self, jobs: List[DendroJob]):
+
+        # see ResourceScheduler.py for how these are configured
+        self._local_capacity = get_run_method_capacity('local')
+        self._aws_batch_capacity = get_run_method_capacity('aws_batch')
+        self._max_backfill_wait_sec = get_max_backfill_wait_sec()
+        # the order in which pending jobs are started (see JobQueuePolicy.py)
+        self._queue_policy = get_job_queue_policy()
+
+        # The local job table: the unfinished jobs that are ready to run (not waiting for input files)
+        # It is replaced by a full sync (handle_jobs) and updated in between by job events (handle_job_events)
+        self._jobs: Dict[str, DendroJob] = {}
+        # unfinished jobs that are waiting for input files to be produced by other jobs
+        self._waiting_job_ids: Set[str] = set()
+    def handle_jobs(self, jobs: List[DendroJob], waiting_job_ids: Union[List[str], None] = None):
+        """Full sync: jobs is the complete list of unfinished jobs that are ready to run"""
+        self._jobs = {job.jobId: job for job in jobs}
+        self._waiting_job_ids = set(waiting_job_ids or [])
+        if self._launch_records_to_reconcile is not None:
+            self._reconcile_jobs(self._launch_records_to_reconcile)
+            self._launch_records_to_reconcile = None
+        # the journal only needs to know about unfinished jobs
+        finished_job_ids = [job_id for job_id in self._journal.get_job_launches().keys() if job_id not in self._jobs and job_id not in self._waiting_job_ids]
+        self._journal.remove_jobs(finished_job_ids)
+        self._schedule_jobs()
+    def handle_job_events(self, messages: List[dict]):
+        """Apply newPendingJob, jobStatusChanged, and jobDeleted messages to the local job table, fetching individual jobs as needed"""
+        job_ids_to_fetch: List[str] = []
+
+        def fetch_later(job_id: str):
+            if job_id not in job_ids_to_fetch:
+                job_ids_to_fetch.append(job_id)
+        for msg in messages:
+            # coalesced messages list all the jobs involved in jobIds (see pubsub.py in the API)
+            job_ids = msg.get('jobIds', None) or ([msg['jobId']] if msg.get('jobId', None) else [])
+            if msg['type'] == 'newPendingJob':
+                for job_id in job_ids:
+                    fetch_later(job_id)
+            elif msg['type'] == 'jobDeleted':
+                # a deleted pending job must not be started
+                for job_id in job_ids:
+                    self._jobs.pop(job_id, None)
+                    self._waiting_job_ids.discard(job_id)
+                    if job_id in job_ids_to_fetch:
+                        job_ids_to_fetch.remove(job_id)
+            elif msg['type'] == 'jobStatusChanged':
+                status = msg.get('status', None)
+                if len(job_ids) == 1 and status is not None:
+                    job_id = job_ids[0]
+                    job = self._jobs.get(job_id, None)
+                    if status in finished_job_statuses:
+                        self._jobs.pop(job_id, None)
+                        self._waiting_job_ids.discard(job_id)
+                        self._journal.remove_jobs([job_id])
+                        if status == 'completed':
+                            # jobs that were waiting for the outputs of this job may be ready now
+                            for waiting_job_id in self._waiting_job_ids:
+                                fetch_later(waiting_job_id)
+                    elif job is not None and job.status != status:
+                        job.status = status
+                    else:
+                        # unknown job, or not a real status change (e.g., the job was approved)
+                        fetch_later(job_id)
+                else:
+                    # the status of a coalesced message only applies to the most recent job
+                    for job_id in job_ids:
+                        fetch_later(job_id)
+                    for waiting_job_id in self._waiting_job_ids:
+                        fetch_later(waiting_job_id)
+        for i in range(0, len(job_ids_to_fetch), max_num_job_ids_per_request):
+            self._fetch_jobs(job_ids_to_fetch[i:i + max_num_job_ids_per_request])
+        self._schedule_jobs()
+    def get_jobs(self) -> List[DendroJob]:
+        return list(self._jobs.values())
+    def _reconcile_jobs(self, launch_records: Dict[str, JobLaunchRecord]):
+        """After a restart, use the journal to sort out the jobs that were being launched when the daemon stopped"""
+        for job_id, record in launch_records.items():
+            job = self._jobs.get(job_id, None)
+            if job is None:
+                continue
+            if record.state == 'launching':
+                if job.status == 'pending':
+                    # the job status was never set to starting, so it is safe to launch the job again
+                    print(f'Job {job_id} was not launched before the restart, it will be launched again')
+                    self._attempted_to_start_job_ids.discard(job_id)
+                    self._slurm_job_handler._job_ids_attempted_to_start_or_fail.discard(job_id)
+                    self._journal.remove_jobs([job_id])
+                elif job.status == 'starting':
+                    # we don't know whether the process was spawned
+                    self._fail_job(job, 'The compute resource was restarted while the job was being launched')
+            elif record.state == 'launched' and record.pid is not None and job.status == 'starting':
+                if not _process_exists(record.pid):
+                    self._fail_job(job, 'The job process exited before the job started running')
+    def _fetch_jobs(self, job_ids: List[str]):
+        url_path = f'/api/compute_resource/compute_resources/{self._compute_resource_id}/jobs'
+        resp = _compute_resource_get_api_request(
+            url_path=url_path,
+            compute_resource_id=self._compute_resource_id,
+            compute_resource_private_key=self._compute_resource_private_key,
+            params={'job_ids': ','.join(job_ids)}
+        )
+        jobs = [DendroJob(**job) for job in resp['jobs']]
+        waiting_job_ids = set(resp.get('waitingJobIds', None) or [])
+        for job_id in job_ids:
+            # jobs that are not returned are finished, deleted, or pending approval
+            self._jobs.pop(job_id, None)
+            self._waiting_job_ids.discard(job_id)
+            if job_id in waiting_job_ids:
+                self._waiting_job_ids.add(job_id)
+        for job in jobs:
+            self._jobs[job.jobId] = job
+    def _schedule_jobs(self):
+        jobs = list(self._jobs.values())
         local_jobs = [job for job in jobs if job.runMethod == 'local']
         aws_batch_jobs = [job for job in jobs if job.runMethod == 'aws_batch']
         slurm_jobs = [job for job in jobs if job.runMethod == 'slurm']
@@ -37,15 +175,15 @@ class JobManager:
 
         # Local jobs
         if 'local' in self._app_manager._available_job_run_methods:
-            local_jobs_to_start = _choose_pending_jobs_to_start(local_jobs, max_simultaneous_local_jobs)
+            local_jobs_to_start = choose_pending_jobs_to_start(local_jobs, self._local_capacity, started_job_ids=self._attempted_to_start_job_ids, queue_policy=self._queue_policy, max_backfill_wait_sec=self._max_backfill_wait_sec)
             for job in local_jobs_to_start:
-                self._start_job(job)
+                self._start_job_in_background(job)
 
         # AWS Batch jobs
         if 'aws_batch' in self._app_manager._available_job_run_methods:
-            aws_jobs_to_start = _choose_pending_jobs_to_start(aws_batch_jobs, max_simultaneous_aws_batch_jobs)
+            aws_jobs_to_start = choose_pending_jobs_to_start(aws_batch_jobs, self._aws_batch_capacity, started_job_ids=self._attempted_to_start_job_ids, queue_policy=self._queue_policy, max_backfill_wait_sec=self._max_backfill_wait_sec)
             for job in aws_jobs_to_start:
-                self._start_job(job)
+                self._start_job_in_background(job)
 
         # SLURM jobs
         # this is more tricky... let's send the to slurm job handler
@@ -53,13 +191,44 @@ class JobManager:
             self._slurm_job_handler.handle_jobs(slurm_jobs)
     def do_work(self):
         self._slurm_job_handler.do_work()
+    def close(self):
+        # let the launches that are in progress finish, so that jobs don't get stuck in the starting state
+        self._launch_executor.shutdown(wait=True)
+        self._journal.close()
     def _job_is_pending(self, job: DendroJob) -> bool:
         return job.status == 'pending'
+    def _start_job_in_background(self, job: DendroJob):
+        # the bookkeeping is done right away (on the daemon thread) so that the job is not started twice
+        # and so that it counts as running when choosing the next jobs to start
+        if not self._mark_job_as_started(job):
+            return
+        if using_mock():
+            # in mock mode the job runs in this process (see _start_job.py), which is not thread safe
+            self._launch_job(job)
+            return
+        self._launch_executor.submit(self._launch_job_in_worker, job)
+    def _launch_job_in_worker(self, job: DendroJob):
+        # an error launching one job must not affect the others
+        try:
+            self._launch_job(job)
+        except Exception: # pylint: disable=broad-except
+            import traceback
+            traceback.print_exc()
+            print(f'Unexpected error launching job {job.jobId}')
     def _start_job(self, job: DendroJob, run_process: bool = True, return_shell_command: bool = False):
+        if not self._mark_job_as_started(job):
+            return ''
+        return self._launch_job(job, run_process=run_process, return_shell_command=return_shell_command)
+    def _mark_job_as_started(self, job: DendroJob) -> bool:
         job_id = job.jobId
         if job_id in self._attempted_to_start_job_ids or job_id in self._attempted_to_fail_job_ids:
-            return '' # see above comment about why this is necessary
+            return False # see above comment about why this is necessary
         self._attempted_to_start_job_ids.add(job_id)
+        self._journal.record_job_launching(job_id, run_method=job.runMethod or '')
+        self._queue_policy.record_job_started(job)
+        return True
+    def _launch_job(self, job: DendroJob, run_process: bool = True, return_shell_command: bool = False):
+        job_id = job.jobId
         job_private_key = job.jobPrivateKey
         processor_name = job.processorName
         app = self._app_manager.find_app_with_processor(processor_name)
@@ -83,7 +252,8 @@ class JobManager:
                 app=app,
                 run_process=run_process,
                 return_shell_command=return_shell_command,
-                required_resources=job.requiredResources
+                required_resources=job.requiredResources,
+                on_launched=lambda **kwargs: self._journal.record_job_launched(job_id, **kwargs)
             )
         except Exception as e: # pylint: disable=broad-except
             # do a traceback
@@ -95,24 +265,20 @@ class JobManager:
             return ''
     def _fail_job(self, job: DendroJob, error: str):
         job_id = job.jobId
-        if job_id in self._attempted_to_fail_job_ids:
-            return '' # see above comment about why this is necessary
-        self._attempted_to_fail_job_ids.add(job_id)
-        job_id = job.jobId
+        with self._attempted_to_fail_job_ids_lock:
+            if job_id in self._attempted_to_fail_job_ids:
+                return '' # see above comment about why this is necessary
+            self._attempted_to_fail_job_ids.add(job_id)
+        self._journal.record_job_failed(job_id, run_method=job.runMethod or '')
         job_private_key = job.jobPrivateKey
         print(f'Failing job {job_id}: {error}')
         _set_job_status(job_id=job_id, job_private_key=job_private_key, status='failed', error=error)
 
-def _sort_jobs_by_timestamp_created(jobs: List[DendroJob]) -> List[DendroJob]:
-    return sorted(jobs, key=lambda job: job.timestampCreated)
-
-def _choose_pending_jobs_to_start(jobs: List[DendroJob], max_num_simultaneous_jobs: int) -> List[DendroJob]:
-    num_non_pending_jobs = len([job for job in jobs if job.status != 'pending'])
-    if num_non_pending_jobs < max_num_simultaneous_jobs:
-        pending_jobs = [job for job in jobs if job.status == 'pending']
-        pending_jobs = _sort_jobs_by_timestamp_created(pending_jobs)
-        num_to_start = min(max_num_simultaneous_jobs - num_non_pending_jobs, len(pending_jobs))
-        jobs_to_start = pending_jobs[:num_to_start]
-    else:
-        jobs_to_start = []
-    return jobs_to_start
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # exists, but owned by another user
+    return True
@@ -0,0 +1,95 @@
+from typing import Dict, List, Tuple
+import os
+import math
+import time
+import heapq
+from ..common.dendro_types import DendroJob
+
+
+class JobQueuePolicy:
+    """Determines the order in which pending jobs are started. Set with the JOB_QUEUE_POLICY config (fair_share or fifo)."""
+    def order_pending_jobs(self, jobs: List[DendroJob]) -> List[DendroJob]:
+        raise NotImplementedError()
+    def record_job_started(self, job: DendroJob):
+        pass
+
+class FifoJobQueuePolicy(JobQueuePolicy):
+    """Oldest first"""
+    def order_pending_jobs(self, jobs: List[DendroJob]) -> List[DendroJob]:
+        return sorted(jobs, key=lambda job: job.timestampCreated)
+
+class FairShareJobQueuePolicy(JobQueuePolicy):
+    """Jobs of users (and projects) that have used less of the compute resource recently go first
+
+    Usage is the resources of the started jobs (numCpus + numGpus), decaying exponentially with the given half-life.
+    Within the jobs of a user in a project, those with higher priority go first, and then the oldest.
+    The ordering accounts for the jobs that come before, so the jobs of different users are interleaved.
+    """
+    def __init__(self, *, half_life_sec: float = 60 * 60, project_weight: float = 0.5):
+        self._half_life_sec = half_life_sec
+        self._project_weight = project_weight
+        self._user_usage: Dict[str, Tuple[float, float]] = {} # user ID -> (usage, timestamp)
+        self._project_usage: Dict[str, Tuple[float, float]] = {} # project ID -> (usage, timestamp)
+    def record_job_started(self, job: DendroJob):
+        cost = _get_job_cost(job)
+        _add_usage(self._user_usage, job.userId, cost, self._half_life_sec)
+        _add_usage(self._project_usage, job.projectId, cost, self._half_life_sec)
+    def get_user_usage(self, user_id: str) -> float:
+        return _get_usage(self._user_usage, user_id, self._half_life_sec)
+    def order_pending_jobs(self, jobs: List[DendroJob]) -> List[DendroJob]:
+        queues: Dict[Tuple[str, str], List[DendroJob]] = {}
+        for job in jobs:
+            queues.setdefault((job.userId, job.projectId), []).append(job)
+        for queue in queues.values():
+            # reversed, so that we can pop the next job from the end
+            queue.sort(key=lambda job: (-(job.priority or 0), job.timestampCreated), reverse=True)
+
+        # simulated usage, charged as the jobs are ordered
+        user_usage = {user_id: self.get_user_usage(user_id) for user_id, _ in queues.keys()}
+        project_usage = {project_id: _get_usage(self._project_usage, project_id, self._half_life_sec) for _, project_id in queues.keys()}
+
+        def share(queue_key: Tuple[str, str]) -> float:
+            return user_usage[queue_key[0]] + self._project_weight * project_usage[queue_key[1]]
+
+        heap = [(share(k), q[-1].timestampCreated, k) for k, q in queues.items()]
+        heapq.heapify(heap)
+        ret: List[DendroJob] = []
+        while len(heap) > 0:
+            s, _, queue_key = heapq.heappop(heap)
+            current_share = share(queue_key)
+            if current_share > s:
+                # usage increased because of another queue of the same user or project
+                heapq.heappush(heap, (current_share, queues[queue_key][-1].timestampCreated, queue_key))
+                continue
+            queue = queues[queue_key]
+            job = queue.pop()
+            ret.append(job)
+            cost = _get_job_cost(job)
+            user_usage[queue_key[0]] += cost
+            project_usage[queue_key[1]] += cost
+            if len(queue) > 0:
+                heapq.heappush(heap, (share(queue_key), queue[-1].timestampCreated, queue_key))
+        return ret
+
+def get_job_queue_policy() -> JobQueuePolicy:
+    policy = os.environ.get('JOB_QUEUE_POLICY', None) or 'fair_share'
+    if policy == 'fair_share':
+        return FairShareJobQueuePolicy()
+    elif policy == 'fifo':
+        return FifoJobQueuePolicy()
+    else:
+        raise ValueError(f'Invalid job queue policy: {policy}')
+
+def _get_job_cost(job: DendroJob) -> float:
+    if job.requiredResources is None:
+        return 1
+    return job.requiredResources.numCpus + job.requiredResources.numGpus
+
+def _get_usage(usage: Dict[str, Tuple[float, float]], key: str, half_life_sec: float) -> float:
+    value, timestamp = usage.get(key, (0, 0))
+    if value == 0:
+        return 0
+    return value * math.pow(0.5, (time.time() - timestamp) / half_life_sec)
+
+def _add_usage(usage: Dict[str, Tuple[float, float]], key: str, amount: float, half_life_sec: float):
+    usage[key] = (_get_usage(usage, key, half_life_sec) + amount, time.time())
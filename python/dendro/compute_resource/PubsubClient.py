@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 import queue
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.callbacks import SubscribeCallback
@@ -18,9 +18,10 @@ class PubsubClient:
         pubnub_subscribe_key: str,
         pubnub_channel: str,
         pubnub_user: str,
-        compute_resource_id: str
+        compute_resource_id: str,
+        message_queue: Optional[queue.Queue] = None # the daemon passes its own queue so that it can block on it
     ):
-        self._message_queue = queue.Queue()
+        self._message_queue = message_queue if message_queue is not None else queue.Queue()
         pnconfig = PNConfiguration()
         pnconfig.subscribe_key = pubnub_subscribe_key # type: ignore (not sure why we need to type ignore this)
         pnconfig.user_id = pubnub_user
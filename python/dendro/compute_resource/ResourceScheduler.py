@@ -0,0 +1,133 @@
+from typing import List, Literal, Set, Union, TYPE_CHECKING
+import os
+import time
+import subprocess
+from ..common.dendro_types import DendroJob, DendroJobRequiredResources
+if TYPE_CHECKING:
+    from .JobQueuePolicy import JobQueuePolicy
+
+
+class RunMethodCapacity:
+    """The resources that the jobs of a run method may reserve at the same time. None means unlimited."""
+    def __init__(self, *,
+        num_cpus: Union[int, None] = None,
+        num_gpus: Union[int, None] = None,
+        memory_gb: Union[float, None] = None,
+        max_num_jobs: Union[int, None] = None
+    ):
+        self.num_cpus = num_cpus
+        self.num_gpus = num_gpus
+        self.memory_gb = memory_gb
+        self.max_num_jobs = max_num_jobs
+    def __repr__(self):
+        return f'RunMethodCapacity(num_cpus={self.num_cpus}, num_gpus={self.num_gpus}, memory_gb={self.memory_gb}, max_num_jobs={self.max_num_jobs})'
+
+def get_run_method_capacity(run_method: Literal['local', 'aws_batch']) -> RunMethodCapacity:
+    """Capacity configured by the environment (or the compute resource config file), e.g., LOCAL_MAX_NUM_CPUS or AWS_BATCH_MAX_NUM_JOBS
+
+    For local jobs, the defaults come from the host (CPUs and memory via psutil, GPUs via nvidia-smi).
+    For AWS Batch jobs, by default only the number of jobs is limited (20).
+    """
+    prefix = run_method.upper()
+    if run_method == 'local':
+        import psutil
+        default_num_cpus = psutil.cpu_count() or 1
+        default_memory_gb = psutil.virtual_memory().total / 1024 ** 3
+        default_num_gpus = _get_num_nvidia_gpus()
+        default_max_num_jobs = None
+    elif run_method == 'aws_batch':
+        default_num_cpus = None
+        default_memory_gb = None
+        default_num_gpus = None
+        default_max_num_jobs = 20
+    else:
+        raise ValueError(f'Unexpected run method: {run_method}')
+    return RunMethodCapacity(
+        num_cpus=_get_env_number(f'{prefix}_MAX_NUM_CPUS', int, default_num_cpus),
+        num_gpus=_get_env_number(f'{prefix}_MAX_NUM_GPUS', int, default_num_gpus),
+        memory_gb=_get_env_number(f'{prefix}_MAX_MEMORY_GB', float, default_memory_gb),
+        max_num_jobs=_get_env_number(f'{prefix}_MAX_NUM_JOBS', int, default_max_num_jobs)
+    )
+
+# By default, a pending job that does not fit holds back the jobs after it in the queue once it has waited this long
+DEFAULT_MAX_BACKFILL_WAIT_SEC = 60 * 15
+
+def get_max_backfill_wait_sec() -> Union[float, None]:
+    """Configured by JOB_MAX_BACKFILL_WAIT_SEC (a negative value means that jobs are always backfilled)"""
+    value = _get_env_number('JOB_MAX_BACKFILL_WAIT_SEC', float, DEFAULT_MAX_BACKFILL_WAIT_SEC)
+    return value if value >= 0 else None
+
+def choose_pending_jobs_to_start(jobs: List[DendroJob], capacity: RunMethodCapacity, *, started_job_ids: Set[str], queue_policy: Union['JobQueuePolicy', None] = None, max_backfill_wait_sec: Union[float, None] = None) -> List[DendroJob]:
+    """Bin-pack the pending jobs (in the order of the queue policy, by default oldest first) into the capacity that is not reserved by the jobs that are already running
+
+    Jobs in started_job_ids count as running even if their status is still pending.
+    A job that requires more than the total capacity is only started when nothing else is running.
+    Jobs later in the queue are started in place of a job that does not fit (backfilling), but once that job has waited
+    longer than max_backfill_wait_sec, nothing after it is started, so that the running jobs drain and it gets its turn.
+    """
+    running_jobs = [job for job in jobs if job.status != 'pending' or job.jobId in started_job_ids]
+    pending_jobs = [job for job in jobs if job.status == 'pending' and job.jobId not in started_job_ids]
+    if queue_policy is not None:
+        pending_jobs = queue_policy.order_pending_jobs(pending_jobs)
+    else:
+        pending_jobs = sorted(pending_jobs, key=lambda job: job.timestampCreated)
+
+    reserved = _Reservation()
+    for job in running_jobs:
+        reserved.add(_get_required_resources(job))
+
+    now = time.time()
+    jobs_to_start: List[DendroJob] = []
+    for job in pending_jobs:
+        if capacity.max_num_jobs is not None and reserved.num_jobs >= capacity.max_num_jobs:
+            break
+        rr = _get_required_resources(job)
+        if reserved.fits(rr, capacity):
+            reserved.add(rr)
+            jobs_to_start.append(job)
+        elif reserved.num_jobs == 0 and not _Reservation().fits(rr, capacity):
+            print(f'Warning: job {job.jobId} requires more resources than the capacity ({capacity}), so it will run alone')
+            reserved.add(rr)
+            jobs_to_start.append(job)
+        elif max_backfill_wait_sec is not None and now - job.timestampCreated > max_backfill_wait_sec:
+            break
+    return jobs_to_start
+
+class _Reservation:
+    def __init__(self):
+        self.num_cpus = 0
+        self.num_gpus = 0
+        self.memory_gb = 0.0
+        self.num_jobs = 0
+    def add(self, rr: DendroJobRequiredResources):
+        self.num_cpus += rr.numCpus
+        self.num_gpus += rr.numGpus
+        self.memory_gb += rr.memoryGb
+        self.num_jobs += 1
+    def fits(self, rr: DendroJobRequiredResources, capacity: RunMethodCapacity) -> bool:
+        if capacity.num_cpus is not None and self.num_cpus + rr.numCpus > capacity.num_cpus:
+            return False
+        if capacity.num_gpus is not None and self.num_gpus + rr.numGpus > capacity.num_gpus:
+            return False
+        if capacity.memory_gb is not None and self.memory_gb + rr.memoryGb > capacity.memory_gb:
+            return False
+        return True
+
+def _get_required_resources(job: DendroJob) -> DendroJobRequiredResources:
+    if job.requiredResources is None:
+        # such a job will fail to start, so it doesn't matter much
+        return DendroJobRequiredResources(numCpus=1, numGpus=0, memoryGb=0, timeSec=0)
+    return job.requiredResources
+
+def _get_env_number(name: str, type: type, default):
+    value = os.environ.get(name, None)
+    if not value:
+        return default
+    return type(value)
+
+def _get_num_nvidia_gpus() -> int:
+    try:
+        output = subprocess.run(['nvidia-smi', '-L'], capture_output=True, text=True, timeout=10).stdout
+    except Exception: # pylint: disable=broad-except
+        return 0
+    return len([line for line in output.splitlines() if line.startswith('GPU ')])
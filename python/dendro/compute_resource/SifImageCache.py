@@ -0,0 +1,179 @@
+from typing import Dict, Tuple, Union
+import os
+import re
+import time
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class SifImageCache:
+    """Converts the docker images of the apps to .sif files once per image digest, for singularity/apptainer jobs
+
+    The cache directory (SIF_CACHE_DIR, by default sif_cache in the compute resource directory) may be shared
+    between processes and machines (e.g., on a cluster file system, where flock is not reliable), so builds are done
+    under an O_EXCL lock file and moved into place atomically.
+    When the digest of an image can't be resolved (requires skopeo), the .sif is keyed by the image name and rebuilt after max_age_sec.
+    The .sif files of previous digests are removed max_age_sec after they were replaced (queued jobs may still use them).
+    """
+    def __init__(self, *, container_executable: str, cache_dir: str, max_age_sec: float = 60 * 60 * 24, resolve_max_age_sec: float = 60 * 30, stale_lock_sec: float = 60 * 60 * 3):
+        self._container_executable = container_executable
+        self._cache_dir = cache_dir
+        self._max_age_sec = max_age_sec
+        self._resolve_max_age_sec = resolve_max_age_sec
+        self._stale_lock_sec = stale_lock_sec # a build that takes longer than this is assumed to have been interrupted
+        self._resolved: Dict[str, Tuple[str, float]] = {} # image -> (sif path, timestamp resolved)
+        self._futures: Dict[str, Future] = {} # image -> resolve/build in progress
+        self._lock = threading.Lock()
+        # several workers, so that a long build does not hold up the resolution of the other images
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='dendro-sif-build')
+    def warm(self, image: str):
+        """Resolve the image and build the .sif in the background if needed"""
+        self._get_future(image)
+    def refresh(self):
+        """Resolve all the known images again, in the background (builds a new .sif if the image has changed), and remove old files"""
+        with self._lock:
+            images = list(self._resolved.keys())
+        for image in images:
+            self._get_future(image)
+        try:
+            self._remove_old_files()
+        except Exception as e: # pylint: disable=broad-except
+            print(f'Warning: problem removing old files from {self._cache_dir}: {e}')
+    def get_sif_path(self, image: str, *, wait: bool) -> Union[str, None]:
+        """The path of the .sif for the image, or None if it is not available (in which case the image should be run from docker://)
+
+        The last .sif that was resolved for the image is used while the image is resolved again in the background.
+        If wait is False and there is no .sif yet, the build is started in the background and None is returned.
+        """
+        with self._lock:
+            resolved = self._resolved.get(image, None)
+        if resolved is not None:
+            sif_path, timestamp_resolved = resolved
+            if os.path.exists(sif_path):
+                if time.time() - timestamp_resolved >= self._resolve_max_age_sec:
+                    self._get_future(image)
+                return sif_path
+        future = self._get_future(image)
+        if not wait:
+            return None
+        return future.result()
+    def _get_future(self, image: str) -> Future:
+        with self._lock:
+            future = self._futures.get(image, None)
+            if future is None:
+                future = self._executor.submit(self._resolve_and_build, image)
+                self._futures[image] = future
+            return future
+    def _resolve_and_build(self, image: str) -> Union[str, None]:
+        try:
+            digest = self._resolve_digest(image)
+            sif_path = os.path.join(self._cache_dir, _get_sif_file_name(image, digest))
+            self._build_if_needed(image, sif_path, keyed_by_digest=digest is not None)
+            with self._lock:
+                self._resolved[image] = (sif_path, time.time())
+            return sif_path
+        except Exception as e: # pylint: disable=broad-except
+            print(f'Error building .sif for image {image}: {e}')
+            return None
+        finally:
+            with self._lock:
+                self._futures.pop(image, None)
+    def _build_if_needed(self, image: str, sif_path: str, *, keyed_by_digest: bool):
+        def is_current():
+            if not os.path.exists(sif_path):
+                return False
+            return keyed_by_digest or time.time() - os.path.getmtime(sif_path) < self._max_age_sec
+        os.makedirs(self._cache_dir, exist_ok=True)
+        lock_path = sif_path + '.lock'
+        while not is_current():
+            try:
+                # O_EXCL is atomic on NFS (v3 and later), unlike flock
+                lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # another process is building it
+                if _get_age_sec(lock_path) > self._stale_lock_sec:
+                    print(f'Removing stale lock file {lock_path}')
+                    _remove_file(lock_path)
+                else:
+                    time.sleep(2)
+                continue
+            try:
+                os.close(lock_fd)
+                if is_current():
+                    return # built by another process before we took the lock
+                tmp_path = f'{sif_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                print(f'Building {sif_path} from docker://{image}')
+                timer = time.time()
+                try:
+                    self._build(image, tmp_path)
+                    os.rename(tmp_path, sif_path) # atomic, and jobs that are using the old file are not affected
+                finally:
+                    _remove_file(tmp_path)
+                print(f'Built {sif_path} in {time.time() - timer:.1f} sec')
+            finally:
+                _remove_file(lock_path)
+    def _remove_old_files(self):
+        if not os.path.isdir(self._cache_dir):
+            return
+        with self._lock:
+            current_sif_paths = [sif_path for sif_path, _ in self._resolved.values()]
+        file_names = os.listdir(self._cache_dir)
+        for sif_path in current_sif_paths:
+            # the .sif files of the previous digests of the image, once the current one has been there for a while
+            if not os.path.exists(sif_path) or _get_age_sec(sif_path) < self._max_age_sec:
+                continue
+            current_file_name = os.path.basename(sif_path)
+            name = re.sub(r'-[0-9a-f]{16}\.sif$', '', current_file_name)
+            for file_name in file_names:
+                if file_name != current_file_name and re.fullmatch(re.escape(name) + r'-[0-9a-f]{16}\.sif', file_name):
+                    print(f'Removing old .sif file {file_name}')
+                    _remove_file(os.path.join(self._cache_dir, file_name))
+        # lock files and partial builds of interrupted builds
+        for file_name in file_names:
+            if file_name.endswith('.lock') or file_name.endswith('.tmp'):
+                path = os.path.join(self._cache_dir, file_name)
+                if _get_age_sec(path) > self._stale_lock_sec:
+                    _remove_file(path)
+    def _build(self, image: str, output_path: str):
+        subprocess.run([self._container_executable, 'build', '--force', output_path, f'docker://{image}'], check=True, stdout=subprocess.DEVNULL)
+    def _resolve_digest(self, image: str) -> Union[str, None]:
+        if '@sha256:' in image:
+            return image.split('@')[1]
+        try:
+            result = subprocess.run(['skopeo', 'inspect', '--format', '{{.Digest}}', f'docker://{image}'], capture_output=True, text=True, timeout=120)
+        except Exception: # pylint: disable=broad-except
+            return None # skopeo is not installed
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+
+def _get_age_sec(path: str) -> float:
+    try:
+        return time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _get_sif_file_name(image: str, digest: Union[str, None]) -> str:
+    name = re.sub(r'[^a-zA-Z0-9._-]', '_', image.split('@')[0])
+    if digest is not None:
+        return f'{name}-{digest.replace("sha256:", "")[:16]}.sif'
+    return f'{name}.sif'
+
+_sif_image_caches: Dict[str, SifImageCache] = {}
+_sif_image_caches_lock = threading.Lock()
+
+def get_sif_image_cache(container_executable: str) -> SifImageCache:
+    with _sif_image_caches_lock:
+        cache = _sif_image_caches.get(container_executable, None)
+        if cache is None:
+            cache_dir = os.environ.get('SIF_CACHE_DIR', None) or os.path.join(os.getcwd(), 'sif_cache')
+            cache = SifImageCache(container_executable=container_executable, cache_dir=cache_dir)
+            _sif_image_caches[container_executable] = cache
+        return cache
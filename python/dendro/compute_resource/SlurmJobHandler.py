@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Dict, List
 import os
 import time
 import subprocess
@@ -20,11 +20,14 @@ class SlurmJobHandler:
         self._job_manager = job_manager
         self._last_time_we_got_a_new_job = 0
         self._jobs: List[DendroJob] = []
-        self._job_ids_attempted_to_start_or_fail = set() # we don't want to attempt to start the same job multiple times
+        # we don't want to attempt to start the same job multiple times, even after a restart (see DaemonStateJournal.py)
+        self._job_ids_attempted_to_start_or_fail = set(
+            job_id for job_id, record in job_manager._journal.get_job_launches().items() if record.run_method == 'slurm'
+        )
         self._last_disk_cleanup_time = 0
         # We don't want to store any state in memory!
         # so if we restart the compute resource, we don't want that to interrupt the process of knowing when
-        # to start new job groups.
+        # to start new job groups. The slurm group of each job is recorded in the journal.
     def handle_jobs(self, jobs: List[DendroJob]):
         current_job_ids = set([job.jobId for job in self._jobs])
         for job in jobs:
@@ -46,6 +49,7 @@ class SlurmJobHandler:
             # we have no jobs
             return
         pending_jobs = [job for job in self._jobs if job.status == 'pending' and job.jobId not in self._job_ids_attempted_to_start_or_fail]
+        pending_jobs = self._job_manager._queue_policy.order_pending_jobs(pending_jobs)
         pending_job_groups = _split_jobs_into_groups(pending_jobs)
 
         num_running_groups = self._determine_num_running_groups()
@@ -64,8 +68,6 @@ class SlurmJobHandler:
 
         if not os.path.exists('slurm_scripts'):
             os.mkdir('slurm_scripts')
-        if not os.path.exists('slurm_group_assignments'):
-            os.mkdir('slurm_group_assignments')
 
         num_cpus_per_job = required_resources.numCpus
         num_gpus_per_job = required_resources.numGpus
@@ -102,8 +104,7 @@ class SlurmJobHandler:
 
                 # we need to record which slurm group this job went to so we can
                 # later know how many running groups there are
-                with open(f'slurm_group_assignments/{job.jobId}', 'w', encoding='utf8') as f2:
-                    f2.write(slurm_group_id)
+                self._job_manager._journal.record_job_launched(job.jobId, slurm_group_id=slurm_group_id)
         if script_has_at_least_one_job:
             # run the slurm script with sbatch
             # slurm_cpus_per_task = self._slurm_opts.cpusPerTask
@@ -172,14 +173,9 @@ class SlurmJobHandler:
     def _determine_num_running_groups(self) -> int:
         # we need to know how many slurm groups are currently running
         # so we can limit the number of groups we start at once
-        all_group_ids = []
-        for job in self._jobs:
-            if job.status == 'starting' or job.status == 'running':
-                if os.path.exists(f'slurm_group_assignments/{job.jobId}'):
-                    with open(f'slurm_group_assignments/{job.jobId}', 'r', encoding='utf8') as f:
-                        group_id = f.read().strip()
-                        all_group_ids.append(group_id)
-        return len(set(all_group_ids))
+        job_ids = [job.jobId for job in self._jobs if job.status == 'starting' or job.status == 'running']
+        group_ids = self._job_manager._journal.get_slurm_group_ids(job_ids)
+        return len(set(group_ids.values()))
 
 class PendingJobGroup:
     def __init__(self, jobs: List[DendroJob], required_resources: DendroJobRequiredResources):
@@ -187,12 +183,24 @@ class PendingJobGroup:
         self._required_resources = required_resources
 
 def _split_jobs_into_groups(jobs: List[DendroJob]) -> List[PendingJobGroup]:
+    # The groups are in the order of the jobs (the order of the queue policy).
+    # All the jobs of a batch are grouped together, at the position of the first job of the batch.
     jobs = [job for job in jobs if job.requiredResources is not None]
     ret: List[PendingJobGroup] = []
-    all_batch_ids = set([job.batchId for job in jobs if job.batchId is not None])
-    for batch_id in all_batch_ids:
-        jobs_in_batch = [job for job in jobs if job.batchId == batch_id]
-        assert len(jobs_in_batch) > 0
+    jobs_by_batch_id: Dict[str, List[DendroJob]] = {}
+    for job in jobs:
+        if job.batchId is not None:
+            jobs_by_batch_id.setdefault(job.batchId, []).append(job)
+    handled_batch_ids = set()
+    for job in jobs:
+        if job.batchId is None:
+            assert job.requiredResources is not None
+            ret.append(PendingJobGroup([job], job.requiredResources))
+            continue
+        if job.batchId in handled_batch_ids:
+            continue
+        handled_batch_ids.add(job.batchId)
+        jobs_in_batch = jobs_by_batch_id[job.batchId]
         job0 = jobs_in_batch[0]
         # we assume that all jobs here have the same required resources
         required_resources = job0.requiredResources
@@ -209,10 +217,6 @@ def _split_jobs_into_groups(jobs: List[DendroJob]) -> List[PendingJobGroup]:
                 num_tasks_per_node = 1
             for i in range(0, len(jobs_in_batch), num_tasks_per_node):
                 ret.append(PendingJobGroup(jobs_in_batch[i:i + num_tasks_per_node], required_resources))
-    for job in jobs:
-        if job.batchId is None:
-            assert job.requiredResources is not None
-            ret.append(PendingJobGroup([job], job.requiredResources))
     return ret
 
 def _format_time_for_slurm(timeout_sec: float):
@@ -245,7 +249,7 @@ def _clean_up_old_files():
                     elapsed_since_modified = time.time() - os.path.getmtime(full_fname)
                     if elapsed_since_modified > 60 * 60 * 48:
                         os.remove(full_fname)
-    # delete old slurm group assignments
+    # delete old slurm group assignments (these are now recorded in the journal, see DaemonStateJournal.py)
     if os.path.exists('slurm_group_assignments'):
         for fname in os.listdir('slurm_group_assignments'):
             full_fname = os.path.join('slurm_group_assignments', fname)
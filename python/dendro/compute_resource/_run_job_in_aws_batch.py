@@ -112,6 +112,7 @@ def _run_job_in_aws_batch(
 
     batch_job_id = response['jobId']
     print(f'AWS Batch job submitted: {job_id} {batch_job_id}')
+    return batch_job_id
 
 def _command_matches(cmd1: List[str], cmd2: str) -> bool:
     return ' '.join(cmd1) == cmd2
@@ -1,7 +1,7 @@
 import os
 import sys
 import subprocess
-from typing import Union, Dict, Any, Literal
+from typing import Callable, Union, Dict, Any, Literal
 
 from ..sdk.App import App
 from ..common._api_request import _processor_put_api_request
@@ -43,7 +43,8 @@ def _start_job(*,
     app: App,
     run_process: bool = True,
     return_shell_command: bool = False,
-    required_resources: DendroJobRequiredResources
+    required_resources: DendroJobRequiredResources,
+    on_launched: Union[Callable[..., None], None] = None # called with the pid of the process or the AWS Batch job ID (see DaemonStateJournal.py)
 ):
     assert not (return_shell_command and run_process), 'Cannot set both run_process and return_shell_command to True'
     assert return_shell_command or run_process, 'Cannot set both run_process and return_shell_command to False'
@@ -69,7 +70,7 @@ def _start_job(*,
         assert app_image, 'aws_batch_job_queue is set but app_image is not set'
         print(f'Running job in AWS Batch: {job_id} {processor_name}')
         try:
-            _run_job_in_aws_batch(
+            batch_job_id = _run_job_in_aws_batch(
                 job_id=job_id,
                 job_private_key=job_private_key,
                 app_name=app._name,
@@ -79,6 +80,8 @@ def _start_job(*,
             )
         except Exception as e:
             raise JobException(f'Error running job in AWS Batch: {e}') from e
+        if on_launched is not None:
+            on_launched(aws_batch_job_id=batch_job_id)
         return ''
 
     # WARNING!!! The job_dir is going to get cleaned up after the job is finished
@@ -118,7 +121,8 @@ def _start_job(*,
             env_vars=env_vars,
             job_dir=job_dir,
             run_process=run_process,
-            return_shell_command=return_shell_command
+            return_shell_command=return_shell_command,
+            on_launched=on_launched
         )
 
     return _run_container_job(
@@ -130,7 +134,8 @@ def _start_job(*,
         run_process=run_process,
         return_shell_command=return_shell_command,
         num_cpus=required_resources.numCpus,
-        use_gpu=required_resources.numGpus > 0
+        use_gpu=required_resources.numGpus > 0,
+        on_launched=on_launched
         # don't actually limit the memory, because we don't want the process being harshly terminated - it needs to be able to clean up
     )
 
@@ -161,6 +166,7 @@ def _run_local_job(*,
     job_dir: str,
     run_process: bool,
     return_shell_command: bool,
+    on_launched: Union[Callable[..., None], None] = None
 ):
     os.makedirs(job_dir + '/tmp/working', exist_ok=True)
     if using_mock():
@@ -193,7 +199,30 @@ def _run_local_job(*,
         if using_mock():
             return
         print(f'Running: {app_executable}')
-        subprocess.Popen(
+        # opt-in: run the job process in a worker that has already imported the app (see AppWorkerPoolManager.py)
+        from .AppWorkerPoolManager import get_app_worker_pool_manager
+        app_worker_pool_manager = get_app_worker_pool_manager()
+        app_worker_socket = app_worker_pool_manager.get_socket_path(app_executable) if app_worker_pool_manager is not None else None
+        if app_worker_socket is not None:
+            from ..sdk._app_worker_pool import _request_app_worker
+            try:
+                worker_process = _request_app_worker(
+                    socket_path=app_worker_socket,
+                    env={
+                        **os.environ,
+                        **env_vars,
+                        'DENDRO_APP_WORKER_SOCKET': app_worker_socket # so that the child process also runs in a worker
+                    },
+                    cwd=job_dir + '/tmp/working',
+                    out_fd=None,
+                    new_session=True
+                )
+                if on_launched is not None:
+                    on_launched(pid=worker_process.pid)
+                return ''
+            except Exception as e: # pylint: disable=broad-except
+                print(f'Warning: app worker pool is not available, running a new process: {e}')
+        process = subprocess.Popen(
             [app_executable],
             cwd=job_dir + '/tmp/working',
             start_new_session=True, # This is important so it keeps running even if the compute resource is stopped
@@ -205,6 +234,8 @@ def _run_local_job(*,
                 **env_vars
             }
         )
+        if on_launched is not None:
+            on_launched(pid=process.pid)
         return ''
     elif return_shell_command:
         env_vars_str = ' '.join([f'{k}={v}' for k, v in env_vars.items()])
@@ -221,12 +252,31 @@ def _run_container_job(*,
     run_process: bool,
     return_shell_command: bool,
     num_cpus: Union[int, None],
-    use_gpu: bool
+    use_gpu: bool,
+    on_launched: Union[Callable[..., None], None] = None
 ):
     project_file_cache_dir = os.path.join(os.getcwd(), 'file_cache', 'projects', project_id, 'files')
     os.makedirs(project_file_cache_dir, exist_ok=True)
 
     container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+    if run_process:
+        # opt-in: run the job in a long-lived container of the app image (see ContainerWorkerManager.py)
+        from .ContainerWorkerManager import get_container_worker_manager
+        container_worker_manager = get_container_worker_manager()
+        if container_worker_manager is not None:
+            started = container_worker_manager.submit_job(
+                app_image=app_image,
+                app_executable=app_executable,
+                env_vars=env_vars,
+                project_id=project_id,
+                job_dir=job_dir,
+                num_cpus=num_cpus,
+                use_gpu=use_gpu
+            )
+            if started:
+                if on_launched is not None:
+                    on_launched() # the pid in the container is not useful to the compute resource
+                return ''
     if container_method == 'docker':
         tmpdir = job_dir + '/tmp'
         os.makedirs(tmpdir, exist_ok=True)
@@ -251,10 +301,11 @@ def _run_container_job(*,
         cmd2.extend([app_image])
         cmd2.extend([app_executable])
         if run_process:
-            print(f'Pulling image {app_image}')
-            subprocess.run(['docker', 'pull', app_image])
+            # usually the image was already pulled in the background (see DockerImageManager.py)
+            from .DockerImageManager import get_docker_image_manager
+            get_docker_image_manager().ensure_image(app_image)
             print(f'Running: {" ".join(cmd2)}')
-            subprocess.Popen(
+            process = subprocess.Popen(
                 cmd2,
                 cwd=job_dir,
                 start_new_session=True, # This is important so it keeps running even if the compute resource is stopped
@@ -262,6 +313,8 @@ def _run_container_job(*,
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
             )
+            if on_launched is not None:
+                on_launched(pid=process.pid)
             return ''
         elif return_shell_command:
             return f'cd {job_dir} && {" ".join(cmd2)}'
@@ -301,11 +354,18 @@ def _run_container_job(*,
         # if num_cpus is not None:
         #     cmd2.extend(['--cpus', str(num_cpus)])
 
-        cmd2.extend([f'docker://{app_image}']) # todo: what if it's not a dockerhub image?
+        # Use the .sif from the compute resource cache (see SifImageCache.py) so that the image is not converted for every job.
+        # For slurm jobs we don't wait for the .sif to be built, since that would block the daemon.
+        from .SifImageCache import get_sif_image_cache
+        sif_path = get_sif_image_cache(executable).get_sif_path(app_image, wait=run_process)
+        if sif_path is not None:
+            cmd2.extend([sif_path])
+        else:
+            cmd2.extend([f'docker://{app_image}']) # todo: what if it's not a dockerhub image?
         cmd2.extend([app_executable])
         if run_process:
             print(f'Running: {" ".join(cmd2)}')
-            subprocess.Popen(
+            process = subprocess.Popen(
                 cmd2,
                 cwd=job_dir,
                 start_new_session=True, # This is important so it keeps running even if the compute resource is stopped
@@ -313,6 +373,8 @@ def _run_container_job(*,
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
             )
+            if on_launched is not None:
+                on_launched(pid=process.pid)
             return ''
         elif return_shell_command:
             return f'cd {job_dir} && {" ".join(cmd2)}'
@@ -13,7 +13,22 @@ env_var_keys = [
     'AVAILABLE_JOB_RUN_METHODS',
     'AWS_ACCESS_KEY_ID',
     'AWS_DEFAULT_REGION',
-    'AWS_SECRET_ACCESS_KEY'
+    'AWS_SECRET_ACCESS_KEY',
+    'COMPUTE_RESOURCE_USE_SESSION_TOKENS',
+    'LOCAL_MAX_NUM_CPUS',
+    'LOCAL_MAX_NUM_GPUS',
+    'LOCAL_MAX_MEMORY_GB',
+    'LOCAL_MAX_NUM_JOBS',
+    'AWS_BATCH_MAX_NUM_CPUS',
+    'AWS_BATCH_MAX_NUM_GPUS',
+    'AWS_BATCH_MAX_MEMORY_GB',
+    'AWS_BATCH_MAX_NUM_JOBS',
+    'JOB_QUEUE_POLICY',
+    'JOB_MAX_BACKFILL_WAIT_SEC',
+    'MAX_CONCURRENT_JOB_LAUNCHES',
+    'SIF_CACHE_DIR',
+    'LOCAL_APP_WORKER_POOL_SIZE',
+    'CONTAINER_WORKER_POOL_SIZE'
 ]
 
 def register_compute_resource(*, dir: str, compute_resource_id: Optional[str] = None, compute_resource_private_key: Optional[str] = None) -> Tuple[str, str]:
@@ -1,7 +1,8 @@
-from typing import Optional
+from typing import List, Optional
 import os
 import yaml
 import time
+import queue
 from pathlib import Path
 import shutil
 import multiprocessing
@@ -11,10 +12,22 @@ from ..common.dendro_types import DendroJob
 from ..mock import using_mock
 from .AppManager import AppManager
 from .JobManager import JobManager
+from .DaemonTimers import DaemonTimers
+
+
+# Intervals of the periodic work of the daemon. Job events (pubsub messages) are handled as soon as they arrive.
+FULL_SYNC_INTERVAL_SEC = 60 * 10
+SLURM_WORK_INTERVAL_SEC = 2
+CLEANUP_INTERVAL_SEC = 60 * 10
+DOCKER_IMAGE_REFRESH_INTERVAL_SEC = 60 * 30
+SIF_IMAGE_REFRESH_INTERVAL_SEC = 60 * 30
+
+# see DaemonStateJournal.py
+STATE_JOURNAL_FILE_NAME = '.dendro-compute-resource-state.db'
 
 
 class Daemon:
-    def __init__(self):
+    def __init__(self, *, state_journal_path: Optional[str] = None):
         self._compute_resource_id = os.getenv('COMPUTE_RESOURCE_ID', None)
         self._compute_resource_private_key = os.getenv('COMPUTE_RESOURCE_PRIVATE_KEY', None)
         if self._compute_resource_id is None:
@@ -38,12 +51,18 @@ class Daemon:
         self._job_manager = JobManager(
             compute_resource_id=self._compute_resource_id,
             compute_resource_private_key=self._compute_resource_private_key,
-            app_manager=self._app_manager
+            app_manager=self._app_manager,
+            state_journal_path=state_journal_path
         )
+        if 'local' in available_job_run_methods:
+            print(f'Capacity for local jobs: {self._job_manager._local_capacity}')
 
-    def start(self, *, timeout: Optional[float] = None, cleanup_old_jobs=True): # timeout is used for testing
-        timer_handle_jobs = 0
+        # messages from the pubsub client and the event stream client are put on this queue
+        self._message_queue: queue.Queue = queue.Queue()
+        self._cleanup_old_jobs_process: Optional[multiprocessing.Process] = None
+        self._stop_requested = False
 
+    def start(self, *, timeout: Optional[float] = None, cleanup_old_jobs=True): # timeout is used for testing
         time_scale_factor = 1 if not using_mock() else 10000
 
         assert self._compute_resource_id is not None
@@ -61,69 +80,142 @@ class Daemon:
                 pubnub_subscribe_key=pubnub_subscribe_key,
                 pubnub_channel=pubsub_subscription['pubnubChannel'],
                 pubnub_user=pubsub_subscription['pubnubUser'],
-                compute_resource_id=self._compute_resource_id
+                compute_resource_id=self._compute_resource_id,
+                message_queue=self._message_queue
             )
         else:
             pubsub_client = None
+        if pubsub_subscription.get('eventStream', None):
+            # low-latency job events from the dendro API itself
+            from .EventStreamClient import EventStreamClient
+            print('Using event stream')
+            event_stream_client = EventStreamClient(
+                compute_resource_id=self._compute_resource_id,
+                compute_resource_private_key=self._compute_resource_private_key,
+                poll_timeout_sec=20 if not using_mock() else 0.5,
+                message_queue=self._message_queue
+            )
+        else:
+            event_stream_client = None
 
         # Create file cache directory if needed
         file_cache_dir = os.path.join(os.getcwd(), 'file_cache')
         if not os.path.exists(file_cache_dir):
             os.makedirs(file_cache_dir)
 
-        # Start cleaning up old job directories
-        # It's important to do this in a separate process
-        # because it can take a long time to delete all the files in the tmp directories (remfile is the culprit)
-        # and we don't want to block the main process from handling jobs
+        timers = DaemonTimers()
+        # normally we will get pubsub messages for updates, but if we don't, we should check every 10 minutes
+        timers.add('handle_jobs', interval_sec=FULL_SYNC_INTERVAL_SEC / time_scale_factor, callback=self._handle_jobs, run_immediately=True)
+        if 'slurm' in self._app_manager._available_job_run_methods:
+            timers.add('slurm_work', interval_sec=SLURM_WORK_INTERVAL_SEC / time_scale_factor, callback=self._job_manager.do_work)
+        if 'local' in self._app_manager._available_job_run_methods and os.environ.get('CONTAINER_METHOD', 'docker') == 'docker' and not using_mock():
+            # keep the images of the apps current in the background (see DockerImageManager.py)
+            from .DockerImageManager import get_docker_image_manager
+            timers.add('refresh_docker_images', interval_sec=DOCKER_IMAGE_REFRESH_INTERVAL_SEC, callback=get_docker_image_manager().refresh)
+        container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+        if container_method in ['singularity', 'apptainer'] and not using_mock():
+            # rebuild the .sif files of images that have changed (see SifImageCache.py)
+            from .SifImageCache import get_sif_image_cache
+            timers.add('refresh_sif_images', interval_sec=SIF_IMAGE_REFRESH_INTERVAL_SEC, callback=get_sif_image_cache(container_method).refresh)
         if cleanup_old_jobs:
-            cleanup_old_jobs_process = multiprocessing.Process(target=_cleanup_old_job_working_directories, args=(os.getcwd() + '/jobs',))
-            cleanup_old_jobs_process.start()
-        else:
-            cleanup_old_jobs_process = None
+            # It's important to clean up in a separate process
+            # because it can take a long time to delete all the files in the tmp directories (remfile is the culprit)
+            # and we don't want to block the main process from handling jobs
+            timers.add('cleanup_old_jobs', interval_sec=CLEANUP_INTERVAL_SEC, callback=self._start_cleanup_old_jobs_process, run_immediately=True)
 
         try:
             print('Starting compute resource')
-            reported_that_compute_resource_is_running = False
-            overall_timer = time.time()
-            while True:
-                elapsed_handle_jobs = time.time() - timer_handle_jobs
-                # normally we will get pubsub messages for updates, but if we don't, we should check every 10 minutes
-                time_to_handle_jobs = elapsed_handle_jobs > 60 * 10 / time_scale_factor
-                messages = pubsub_client.take_messages() if pubsub_client is not None else []
-                jobs_have_changed = False
-                for msg in messages:
-                    if msg['type'] == 'newPendingJob':
-                        jobs_have_changed = True
-                    if msg['type'] == 'jobStatusChanged':
-                        jobs_have_changed = True
-                    if msg['type'] == 'computeResourceAppsChanaged':
-                        self._app_manager.update_apps()
-
-                if time_to_handle_jobs or jobs_have_changed:
-                    # if time_to_handle_jobs:
-                    #     print('Checking for new jobs') # this pollutes the logs too much
-                    timer_handle_jobs = time.time()
-                    self._handle_jobs()
-
-                self._job_manager.do_work()
-
-                if not reported_that_compute_resource_is_running:
-                    print(f'Compute resource is running: {self._compute_resource_id}')
-                    reported_that_compute_resource_is_running = True
-
-                overall_elapsed = time.time() - overall_timer
-                if timeout is not None and overall_elapsed > timeout:
-                    print(f'Compute resource timed out after {timeout} seconds')
-                    return
-                if overall_elapsed < 5 / time_scale_factor:
-                    time.sleep(0.01 / time_scale_factor) # for the first few seconds we can sleep for a short time (useful for testing)
-                else:
-                    time.sleep(2 / time_scale_factor)
+            self._run_loop(timers=timers, timeout=timeout)
         finally:
-            if cleanup_old_jobs_process is not None:
-                cleanup_old_jobs_process.terminate()
+            self._job_manager.close()
+            from .AppWorkerPoolManager import get_app_worker_pool_manager
+            app_worker_pool_manager = get_app_worker_pool_manager()
+            if app_worker_pool_manager is not None:
+                app_worker_pool_manager.close()
+            from .ContainerWorkerManager import get_container_worker_manager
+            container_worker_manager = get_container_worker_manager()
+            if container_worker_manager is not None:
+                container_worker_manager.close()
+            if self._cleanup_old_jobs_process is not None:
+                self._cleanup_old_jobs_process.terminate()
+                self._cleanup_old_jobs_process = None
             if pubsub_client is not None:
                 pubsub_client.close() # unfortunately this doesn't actually stop the thread - it's a pubnub/python issue
+            if event_stream_client is not None:
+                event_stream_client.close()
+    def _run_loop(self, *, timers: DaemonTimers, timeout: Optional[float]):
+        reported_that_compute_resource_is_running = False
+        overall_timer = time.time()
+        while True:
+            timers.run_due_timers()
+
+            if not reported_that_compute_resource_is_running:
+                print(f'Compute resource is running: {self._compute_resource_id}')
+                reported_that_compute_resource_is_running = True
+
+            # block until a message arrives or the next timer is due
+            wait_sec = timers.time_until_next()
+            if timeout is not None:
+                time_remaining = timeout - (time.time() - overall_timer)
+                if time_remaining <= 0:
+                    print(f'Compute resource timed out after {timeout} seconds')
+                    return
+                wait_sec = min(wait_sec, time_remaining)
+            messages = self._wait_for_messages(wait_sec)
+            if self._stop_requested:
+                print('Compute resource stopped')
+                return
+
+            job_messages: List[dict] = []
+            full_sync_needed = False
+            for msg in messages:
+                if msg['type'] == 'newPendingJob':
+                    job_messages.append(msg)
+                if msg['type'] == 'jobStatusChanged':
+                    job_messages.append(msg)
+                if msg['type'] == 'jobDeleted':
+                    job_messages.append(msg)
+                if msg['type'] == 'computeResourceAppsChanaged':
+                    self._app_manager.update_apps()
+                if msg['type'] == 'eventsMissed':
+                    # the event stream could not deliver all events (a gap in the sequence), so we do a full update
+                    full_sync_needed = True
+                    self._app_manager.update_apps()
+
+            if not full_sync_needed and len(job_messages) > 0:
+                # update the local job table incrementally
+                try:
+                    self._handle_job_events(job_messages)
+                except Exception as e: # pylint: disable=broad-except
+                    print(f'Error handling job events, doing a full update: {e}')
+                    full_sync_needed = True
+            if full_sync_needed:
+                self._handle_jobs()
+                timers.reset('handle_jobs')
+    def stop(self):
+        """Stop the daemon from another thread"""
+        self._stop_requested = True
+        self._message_queue.put({'type': 'daemonStopRequested'}) # wake up the loop
+    def _wait_for_messages(self, timeout: float) -> List[dict]:
+        """Wait for up to timeout seconds for the first message, then take all the messages that are in the queue"""
+        ret = []
+        try:
+            ret.append(self._message_queue.get(block=True, timeout=timeout if timeout != float('inf') else None))
+        except queue.Empty:
+            return ret
+        while True:
+            try:
+                ret.append(self._message_queue.get(block=False))
+            except queue.Empty:
+                break
+        return ret
+    def _start_cleanup_old_jobs_process(self):
+        if self._cleanup_old_jobs_process is not None and self._cleanup_old_jobs_process.is_alive():
+            return
+        self._cleanup_old_jobs_process = multiprocessing.Process(target=_cleanup_old_jobs, args=(os.getcwd(),))
+        self._cleanup_old_jobs_process.start()
+    def _handle_job_events(self, messages: List[dict]):
+        self._job_manager.handle_job_events(messages)
     def _handle_jobs(self):
         url_path = f'/api/compute_resource/compute_resources/{self._compute_resource_id}/unfinished_jobs'
         if not self._compute_resource_id:
@@ -152,7 +244,7 @@ class Daemon:
             return
         jobs = resp['jobs']
         jobs = [DendroJob(**job) for job in jobs]
-        self._job_manager.handle_jobs(jobs)
+        self._job_manager.handle_jobs(jobs, waiting_job_ids=resp.get('waitingJobIds', None))
 
 def start_compute_resource(dir: str, *, timeout: Optional[float] = None, cleanup_old_jobs=True): # timeout is used for testing
     # Let's make sure pubnub is installed, because it's required for the daemon
@@ -177,7 +269,7 @@ def start_compute_resource(dir: str, *, timeout: Optional[float] = None, cleanup
             print('WARNING: Unknown key in config file: ' + k)
     with open(config_fname, 'w', encoding='utf8') as f:
         yaml.dump(the_config, f)
-    daemon = Daemon()
+    daemon = Daemon(state_journal_path=os.path.join(dir, STATE_JOURNAL_FILE_NAME))
     daemon.start(timeout=timeout, cleanup_old_jobs=cleanup_old_jobs)
 
 def get_pubsub_subscription(*, compute_resource_id: str, compute_resource_private_key: str):
@@ -189,16 +281,22 @@ def get_pubsub_subscription(*, compute_resource_id: str, compute_resource_privat
     )
     return resp['subscription']
 
+def _cleanup_old_jobs(compute_resource_dir: str):
+    _cleanup_old_job_working_directories(compute_resource_dir + '/jobs')
+    # the jobs directories of the long-lived containers (see ContainerWorkerManager.py)
+    container_workers_dir = Path(compute_resource_dir) / 'container_workers'
+    if container_workers_dir.exists():
+        for worker_dir in container_workers_dir.iterdir():
+            _cleanup_old_job_working_directories(str(worker_dir / 'tmp' / 'jobs'))
+
 def _cleanup_old_job_working_directories(dir: str):
     """Delete working dirs that are more than 24 hours old"""
     jobs_dir = Path(dir)
-    while True:
-        if not jobs_dir.exists():
-            continue
-        for job_dir in jobs_dir.iterdir():
-            if job_dir.is_dir():
-                elapsed = time.time() - job_dir.stat().st_mtime
-                if elapsed > 24 * 60 * 60:
-                    print(f'Removing old working dir {job_dir}')
-                    shutil.rmtree(job_dir)
-        time.sleep(60)
+    if not jobs_dir.exists():
+        return
+    for job_dir in jobs_dir.iterdir():
+        if job_dir.is_dir():
+            elapsed = time.time() - job_dir.stat().st_mtime
+            if elapsed > 24 * 60 * 60:
+                print(f'Removing old working dir {job_dir}')
+                shutil.rmtree(job_dir)
@@ -68,6 +68,22 @@ class App:
             with open(SPEC_OUTPUT_FILE, 'w') as f:
                 json.dump(self.get_spec(), f, indent=4)
             return
+        DENDRO_APP_ZYGOTE_SOCKET = os.environ.get('DENDRO_APP_ZYGOTE_SOCKET', None)
+        if DENDRO_APP_ZYGOTE_SOCKET is not None:
+            # Serve job runs from a pool of forked workers that have already imported the app (see _app_worker_pool.py)
+            from ._app_worker_pool import _run_app_zygote
+            pool_size = int(os.environ.get('DENDRO_APP_WORKER_POOL_SIZE', '2'))
+            del os.environ['DENDRO_APP_ZYGOTE_SOCKET']
+            return _run_app_zygote(app=self, socket_path=DENDRO_APP_ZYGOTE_SOCKET, pool_size=pool_size)
+        DENDRO_CONTAINER_WORKER_SOCKET = os.environ.get('DENDRO_CONTAINER_WORKER_SOCKET', None)
+        if DENDRO_CONTAINER_WORKER_SOCKET is not None:
+            # Run the jobs sent by the compute resource in this long-lived container (see _container_worker.py)
+            from ._container_worker import _run_container_worker
+            APP_EXECUTABLE = os.environ.get('APP_EXECUTABLE', None)
+            if APP_EXECUTABLE is None:
+                raise KeyError('APP_EXECUTABLE is not set')
+            idle_timeout_sec = float(os.environ.get('DENDRO_CONTAINER_WORKER_IDLE_TIMEOUT_SEC', '600'))
+            return _run_container_worker(app_executable=APP_EXECUTABLE, socket_path=DENDRO_CONTAINER_WORKER_SOCKET, idle_timeout_sec=idle_timeout_sec)
         JOB_ID = os.environ.get('JOB_ID', None)
         if JOB_ID is not None:
             JOB_PRIVATE_KEY = os.environ.get('JOB_PRIVATE_KEY', None)
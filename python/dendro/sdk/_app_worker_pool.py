@@ -0,0 +1,195 @@
+from typing import Any, Dict, List, Set, Union, TYPE_CHECKING
+import os
+import sys
+import json
+import time
+import select
+import signal
+import socket
+import tempfile
+import subprocess
+if TYPE_CHECKING:
+    from .App import App
+
+
+# The worker pool of an app (opt-in, see AppWorkerPoolManager.py in compute_resource)
+#
+# The zygote is the app executable started with DENDRO_APP_ZYGOTE_SOCKET set, so it has imported the app
+# (and everything that main.py imports). It keeps pool_size forked workers waiting on a unix socket.
+# Each worker runs exactly one job run (the parent process or the JOB_INTERNAL=1 child process, depending on the
+# environment of the request) and then exits, just like a newly spawned process would, so jobs remain isolated.
+#
+# Protocol: the client sends one line of JSON ({"env": ..., "cwd": ..., "newSession": ...}), optionally with a file
+# descriptor for stdout/stderr. The worker replies {"pid": ...} and, when the run is done, {"returncode": ...}.
+
+def _run_app_zygote(*, app: 'App', socket_path: str, pool_size: int):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(64)
+    # workers write their pid here when they take a request, so that we know to fork a replacement
+    busy_read_fd, busy_write_fd = os.pipe()
+    idle_worker_pids: Set[int] = set()
+    daemon_pid = os.getppid()
+
+    def handle_sigterm(signum, frame):
+        for pid in idle_worker_pids:
+            _kill_process(pid)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        os._exit(0)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    print(f'App worker pool started ({pool_size} workers): {socket_path}')
+    sys.stdout.flush()
+
+    busy_buf = b''
+    while True:
+        while len(idle_worker_pids) < pool_size:
+            pid = os.fork()
+            if pid == 0:
+                os.close(busy_read_fd)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                _run_app_worker(app=app, listener=listener, busy_write_fd=busy_write_fd) # does not return
+            idle_worker_pids.add(pid)
+        readable, _, _ = select.select([busy_read_fd], [], [], 1)
+        if readable:
+            busy_buf += os.read(busy_read_fd, 4096)
+            lines = busy_buf.split(b'\n')
+            busy_buf = lines[-1]
+            for line in lines[:-1]:
+                idle_worker_pids.discard(int(line))
+        # reap the workers that have finished their job run
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            idle_worker_pids.discard(pid)
+        if os.getppid() != daemon_pid:
+            # the compute resource daemon has exited
+            handle_sigterm(signal.SIGTERM, None)
+
+def _run_app_worker(*, app: 'App', listener: socket.socket, busy_write_fd: int):
+    conn, _ = listener.accept()
+    os.write(busy_write_fd, f'{os.getpid()}\n'.encode())
+    listener.close()
+    os.close(busy_write_fd)
+    returncode = 1
+    try:
+        request, fds = _receive_request(conn)
+        if request.get('newSession', False):
+            os.setsid() # like start_new_session=True
+        devnull_fd = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull_fd, 0)
+        out_fd = fds[0] if len(fds) > 0 else devnull_fd
+        os.dup2(out_fd, 1)
+        os.dup2(out_fd, 2)
+        sys.stdout.reconfigure(line_buffering=True) # type: ignore
+        sys.stderr.reconfigure(line_buffering=True) # type: ignore
+        os.environ.clear()
+        os.environ.update(request['env'])
+        tempfile.tempdir = None # TMPDIR may be different for this job
+        if request.get('cwd', None):
+            os.chdir(request['cwd'])
+        conn.sendall((json.dumps({'pid': os.getpid()}) + '\n').encode())
+        if request.get('newSession', False):
+            # the client does not wait for a detached run
+            conn.close()
+            conn = None
+        try:
+            app.run()
+            returncode = 0
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException: # pylint: disable=broad-except
+            import traceback
+            traceback.print_exc()
+            returncode = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if conn is not None:
+            conn.sendall((json.dumps({'returncode': returncode}) + '\n').encode())
+    finally:
+        # never return to the zygote loop
+        os._exit(returncode)
+
+def _receive_request(conn: socket.socket):
+    data, fds, _, _ = socket.recv_fds(conn, 1024 * 1024, 1)
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(1024 * 1024)
+        if not chunk:
+            raise Exception('Connection closed before the request was received')
+        data += chunk
+    return json.loads(data.decode()), fds
+
+class AppWorkerProcess:
+    """A job run in a worker of an app worker pool, with the parts of the subprocess.Popen interface that are used for job processes"""
+    def __init__(self, *, conn: Union[socket.socket, None], pid: int, buf: bytes = b''):
+        self._conn = conn
+        self.pid = pid
+        self.returncode: Union[int, None] = None
+        self.stdout = None
+        self.stderr = None
+        self._buf = buf # what was received after the pid
+    def poll(self) -> Union[int, None]:
+        try:
+            return self.wait(0)
+        except subprocess.TimeoutExpired:
+            return None
+    def wait(self, timeout: Union[float, None] = None) -> int:
+        if self.returncode is not None:
+            return self.returncode
+        assert self._conn is not None, 'Cannot wait for a detached run'
+        deadline = time.time() + timeout if timeout is not None else None
+        while not self._buf.endswith(b'\n'):
+            remaining = max(0, deadline - time.time()) if deadline is not None else None
+            readable, _, _ = select.select([self._conn], [], [], remaining)
+            if not readable:
+                raise subprocess.TimeoutExpired(f'app worker {self.pid}', timeout or 0)
+            chunk = self._conn.recv(4096)
+            if not chunk:
+                # the worker exited without reporting (e.g., it was killed)
+                self.returncode = 1
+                self._conn.close()
+                return self.returncode
+            self._buf += chunk
+        self.returncode = int(json.loads(self._buf.decode())['returncode'])
+        self._conn.close()
+        return self.returncode
+    def terminate(self):
+        _kill_process(self.pid)
+
+def _request_app_worker(*, socket_path: str, env: Dict[str, str], cwd: Union[str, None], out_fd: Union[int, None], new_session: bool) -> AppWorkerProcess:
+    """Run the app in a worker of the pool (raises an exception if the pool is not available)"""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.settimeout(10)
+        conn.connect(socket_path)
+        request: Dict[str, Any] = {'env': env, 'cwd': cwd, 'newSession': new_session}
+        fds: List[int] = [out_fd] if out_fd is not None else []
+        socket.send_fds(conn, [(json.dumps(request) + '\n').encode()], fds)
+        reply = b''
+        while b'\n' not in reply:
+            chunk = conn.recv(4096)
+            if not chunk:
+                raise Exception('App worker closed the connection')
+            reply += chunk
+        pid_line, rest = reply.split(b'\n', 1)
+        pid = int(json.loads(pid_line.decode())['pid'])
+        conn.settimeout(None)
+    except Exception:
+        conn.close()
+        raise
+    if new_session:
+        conn.close()
+        return AppWorkerProcess(conn=None, pid=pid)
+    return AppWorkerProcess(conn=conn, pid=pid, buf=rest)
+
+def _kill_process(pid: int):
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
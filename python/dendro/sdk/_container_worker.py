@@ -0,0 +1,142 @@
+from typing import Any, Dict, Union
+import os
+import json
+import time
+import signal
+import shutil
+import socket
+import subprocess
+
+
+# The worker loop of a long-lived container (opt-in, see ContainerWorkerManager.py in compute_resource)
+#
+# The container runs the app executable with DENDRO_CONTAINER_WORKER_SOCKET set. The loop listens on that unix socket
+# (in a directory that is mounted from the host) and runs the jobs it receives one after another. Each job is run
+# just like in a container of its own: the app executable is started as the job process, with the environment of
+# the job and its working directory under container_worker_jobs_dir, and that process enforces the timeout and cleans up.
+# Each container has its own jobs directory (see ContainerWorkerManager.py), so a job can only see its own directory
+# (what is left over from the previous job of the container is removed before the next one starts).
+#
+# Protocol: the client sends one line of JSON ({"env": ..., "cwd": ..., "timeoutSec": ...}).
+# The worker replies {"accepted": true} once the job process is started, or {"busy": true} if a job is running.
+
+# the job process is killed if it runs this much longer than the job timeout (the job process itself should have stopped by then)
+job_timeout_buffer_sec = 60 * 10
+
+# the directory of the jobs inside the container (mounted from the jobs directory of the container on the host)
+container_worker_jobs_dir = '/tmp/jobs'
+
+def _run_container_worker(*, app_executable: str, socket_path: str, idle_timeout_sec: float):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    # the container may run as a different user than the compute resource (the directory of the socket is private to the compute resource)
+    os.chmod(socket_path, 0o777)
+    listener.listen(16)
+    listener.settimeout(1)
+    # the daemon creates this file when it stops, so that we exit once the current job is done
+    stop_fname = os.path.join(os.path.dirname(socket_path), 'stop')
+    base_env = {k: v for k, v in os.environ.items() if k != 'DENDRO_CONTAINER_WORKER_SOCKET'}
+    print(f'Container worker started: {socket_path}')
+
+    job_process: Union[subprocess.Popen, None] = None
+    job_deadline: Union[float, None] = None
+    last_active = time.time()
+    try:
+        while True:
+            _reap_orphaned_processes(job_process)
+            if job_process is not None:
+                if job_process.poll() is not None:
+                    print(f'Job process exited with code {job_process.returncode}')
+                    job_process = None
+                elif job_deadline is not None and time.time() > job_deadline:
+                    print('Job process is past its timeout, killing it')
+                    try:
+                        os.killpg(job_process.pid, signal.SIGKILL) # the job process and its child process
+                    except ProcessLookupError:
+                        pass
+                    job_process.wait()
+                    job_process = None
+                last_active = time.time()
+            if job_process is None:
+                if os.path.exists(stop_fname):
+                    print('Stopping container worker')
+                    return
+                if time.time() - last_active > idle_timeout_sec:
+                    print('Stopping idle container worker')
+                    return
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                try:
+                    conn.settimeout(10)
+                    request = _receive_json_line(conn)
+                    if job_process is not None:
+                        _send_json_line(conn, {'busy': True})
+                        continue
+                    _remove_previous_job_dirs(request['env'].get('JOB_ID', ''))
+                    cwd = request['cwd']
+                    os.makedirs(cwd, exist_ok=True)
+                    job_process = subprocess.Popen(
+                        [app_executable],
+                        env={**base_env, **request['env']},
+                        cwd=cwd,
+                        start_new_session=True,
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL
+                    )
+                    timeout_sec = request.get('timeoutSec', None)
+                    job_deadline = time.time() + timeout_sec + job_timeout_buffer_sec if timeout_sec is not None else None
+                    print(f'Started job {request["env"].get("JOB_ID", "")}')
+                    _send_json_line(conn, {'accepted': True})
+                except Exception as e: # pylint: disable=broad-except
+                    print(f'Error handling request: {e}')
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def _remove_previous_job_dirs(job_id: str):
+    # no job is running at this point
+    if not os.path.isdir(container_worker_jobs_dir):
+        return
+    for name in os.listdir(container_worker_jobs_dir):
+        if name != job_id:
+            shutil.rmtree(os.path.join(container_worker_jobs_dir, name), ignore_errors=True)
+
+def _reap_orphaned_processes(job_process: Union[subprocess.Popen, None]):
+    # This process is usually PID 1 of the container, so the child processes of jobs are reparented to it when the job process exits
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        if job_process is not None and pid == job_process.pid:
+            job_process.returncode = os.waitstatus_to_exitcode(status)
+
+def _submit_to_container_worker(*, socket_path: str, env: Dict[str, str], cwd: str, timeout_sec: Union[float, None]) -> bool:
+    """Returns True if the worker started the job, False if it is busy (raises an exception if the worker is not available)"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(10)
+        conn.connect(socket_path)
+        request: Dict[str, Any] = {'env': env, 'cwd': cwd, 'timeoutSec': timeout_sec}
+        _send_json_line(conn, request)
+        reply = _receive_json_line(conn)
+    return reply.get('accepted', False)
+
+def _send_json_line(conn: socket.socket, x: dict):
+    conn.sendall((json.dumps(x) + '\n').encode())
+
+def _receive_json_line(conn: socket.socket) -> dict:
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            raise Exception('Connection closed before the message was received')
+        data += chunk
+    return json.loads(data.decode())
@@ -211,6 +211,22 @@ def _launch_job_child_process(*, job_id: str, job_private_key: str, app_executab
             env['DENDRO_JOB_WORKING_DIR'] = working_dir
             env['TMPDIR'] = working_dir + '/tmp'
             _debug_log(f'Using working directory {working_dir}')
+        app_worker_socket = os.environ.get('DENDRO_APP_WORKER_SOCKET', None)
+        if app_worker_socket is not None:
+            # run the job in a worker that has already imported the app (see _app_worker_pool.py)
+            from ._app_worker_pool import _request_app_worker
+            try:
+                proc = _request_app_worker(
+                    socket_path=app_worker_socket,
+                    env=env,
+                    cwd=working_dir if working_dir is not None else os.getcwd(),
+                    out_fd=console_out_file.fileno(),
+                    new_session=False
+                )
+                _debug_log(f'Running in app worker {proc.pid}')
+                return proc
+            except Exception as e: # pylint: disable=broad-except
+                _debug_log(f'WARNING: app worker pool is not available, running a new process: {str(e)}')
         _debug_log('Opening subprocess')
         proc = subprocess.Popen(
             cmd,
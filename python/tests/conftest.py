@@ -0,0 +1,49 @@
+import pytest
+
+
+def _create_job(
+    job_id: str,
+    *,
+    status: str = 'pending',
+    user_id: str = 'u1',
+    project_id: str = 'p1',
+    timestamp_created: float = 0,
+    num_cpus: int = 1,
+    num_gpus: int = 0,
+    memory_gb: float = 1,
+    priority=None,
+    batch_id=None
+):
+    from dendro.common.dendro_types import DendroJob, DendroJobRequiredResources, ComputeResourceSpecProcessor
+    return DendroJob(
+        projectId=project_id,
+        jobId=job_id,
+        jobPrivateKey='k1',
+        userId=user_id,
+        processorName='proc',
+        inputFiles=[],
+        inputFileIds=[],
+        inputParameters=[],
+        outputFiles=[],
+        timestampCreated=timestamp_created,
+        computeResourceId='cr1',
+        status=status,
+        processorSpec=ComputeResourceSpecProcessor(name='proc', inputs=[], outputs=[], parameters=[], attributes=[], tags=[]),
+        requiredResources=DendroJobRequiredResources(numCpus=num_cpus, numGpus=num_gpus, memoryGb=memory_gb, timeSec=60),
+        runMethod='local',
+        priority=priority,
+        batchId=batch_id
+    )
+
+class _MockAppManager:
+    _available_job_run_methods = ['local']
+
+@pytest.fixture
+def create_job():
+    """A factory for the local jobs of compute resource cr1 used by the job manager and scheduler tests"""
+    return _create_job
+
+@pytest.fixture
+def mock_app_manager():
+    """Stands in for the AppManager of a JobManager that only runs local jobs"""
+    return _MockAppManager()
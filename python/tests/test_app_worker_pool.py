@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import subprocess
+
+
+_zygote_script = '''
+import os
+import sys
+import time
+from dendro.sdk._app_worker_pool import _run_app_zygote
+
+num_runs = 0 # to check that every run is in a fresh worker
+
+class _App:
+    def run(self):
+        global num_runs
+        num_runs += 1
+        print(f'run {num_runs} in {os.getcwd()} with TEST_VALUE={os.environ.get("TEST_VALUE")} sid={os.getsid(0) == os.getpid()}')
+        with open('output.txt', 'w') as f:
+            f.write(os.environ['TEST_VALUE'])
+        if os.environ.get('TEST_SLEEP'):
+            time.sleep(float(os.environ['TEST_SLEEP']))
+        if os.environ.get('TEST_FAIL'):
+            raise Exception('Test failure')
+
+_run_app_zygote(app=_App(), socket_path=sys.argv[1], pool_size=2)
+'''
+
+def test_app_worker_pool(tmp_path):
+    from dendro.sdk._app_worker_pool import _request_app_worker
+
+    socket_path = str(tmp_path / 'app.sock')
+    zygote = subprocess.Popen([sys.executable, '-c', _zygote_script, socket_path])
+    try:
+        timer = time.time()
+        while not os.path.exists(socket_path):
+            assert time.time() - timer < 20, 'Zygote did not start'
+            time.sleep(0.05)
+        time.sleep(0.2)
+
+        def run(name: str, env: dict):
+            working_dir = tmp_path / name
+            working_dir.mkdir()
+            with open(working_dir / 'console.txt', 'w') as console_out_file:
+                proc = _request_app_worker(socket_path=socket_path, env={'TEST_VALUE': name, **env}, cwd=str(working_dir), out_fd=console_out_file.fileno(), new_session=False)
+                return proc, working_dir
+
+        proc1, dir1 = run('job1', {})
+        assert proc1.wait(10) == 0
+        proc2, dir2 = run('job2', {})
+        assert proc2.wait(10) == 0
+        assert proc1.pid != proc2.pid
+        for proc, working_dir, name in [(proc1, dir1, 'job1'), (proc2, dir2, 'job2')]:
+            # the environment, working directory and output of the run are those of the request
+            assert (working_dir / 'output.txt').read_text() == name
+            assert (working_dir / 'console.txt').read_text().startswith(f'run 1 in {working_dir} with TEST_VALUE={name} sid=False')
+
+        # an exception in the app is a non-zero return code, with the traceback in the output
+        proc3, dir3 = run('job3', {'TEST_FAIL': '1'})
+        assert proc3.wait(10) == 1
+        assert 'Test failure' in (dir3 / 'console.txt').read_text()
+
+        # a run can be terminated (e.g., when the job times out)
+        proc4, _ = run('job4', {'TEST_SLEEP': '60'})
+        assert proc4.poll() is None
+        proc4.terminate()
+        assert proc4.wait(10) != 0
+
+        # a detached run in a new session
+        dir5 = tmp_path / 'job5'
+        dir5.mkdir()
+        proc5 = _request_app_worker(socket_path=socket_path, env={'TEST_VALUE': 'job5'}, cwd=str(dir5), out_fd=None, new_session=True)
+        timer = time.time()
+        while not (dir5 / 'output.txt').exists():
+            assert time.time() - timer < 10
+            time.sleep(0.05)
+        assert proc5.pid not in [proc1.pid, proc2.pid, proc3.pid, proc4.pid]
+    finally:
+        zygote.terminate()
+        zygote.wait(10)
+    assert not os.path.exists(socket_path)
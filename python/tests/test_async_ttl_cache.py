@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_async_ttl_cache():
+    from dendro.api_helpers.core._async_ttl_cache import AsyncTTLCache
+
+    class NotFound(Exception):
+        pass
+
+    num_fetches = {'a': 0, 'b': 0, 'missing': 0, 'other': 0}
+
+    async def fetch(key: str):
+        num_fetches[key] += 1
+        await asyncio.sleep(0.01)
+        if key == 'missing':
+            raise NotFound(key)
+        if key == 'other':
+            raise ValueError(key)
+        return key.upper()
+
+    cache = AsyncTTLCache(max_size=2, ttl_sec=60, negative_ttl_sec=60, negative_exceptions=(NotFound,))
+
+    # concurrent lookups of the same key are coalesced
+    results = await asyncio.gather(*[cache.get('a', lambda: fetch('a')) for _ in range(5)])
+    assert results == ['A'] * 5
+    assert num_fetches['a'] == 1
+    assert await cache.get('a', lambda: fetch('a')) == 'A'
+    assert num_fetches['a'] == 1
+
+    # negative results are cached, other errors are not
+    for _ in range(2):
+        with pytest.raises(NotFound):
+            await cache.get('missing', lambda: fetch('missing'))
+    assert num_fetches['missing'] == 1
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await cache.get('other', lambda: fetch('other'))
+    assert num_fetches['other'] == 2
+
+    # the cache is bounded: 'a' is the least recently used entry and gets evicted
+    await cache.get('b', lambda: fetch('b'))
+    await cache.get('a', lambda: fetch('a'))
+    assert num_fetches['a'] == 2
+
+    metrics = cache.get_metrics()
+    assert metrics['size'] == 2
+    assert metrics['coalesced'] == 4
+    assert metrics['negativeHits'] == 1
+    assert 0 < metrics['hitRate'] < 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_resolve_dandi_url_cache(monkeypatch):
+    import time
+    from dendro.api_helpers.routers.processor import router as processor_router
+
+    num_resolutions = {'count': 0}
+    signed_at = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+
+    async def mock_resolve_dandi_url_uncached(url: str, *, dandi_api_key):
+        num_resolutions['count'] += 1
+        await asyncio.sleep(0.01)
+        return f'https://dandiarchive.s3.amazonaws.com/blobs/abc?X-Amz-Date={signed_at}&X-Amz-Expires=3600&user={dandi_api_key}'
+
+    monkeypatch.setattr(processor_router, '_resolve_dandi_url_uncached', mock_resolve_dandi_url_uncached)
+    processor_router._resolved_dandi_urls.clear()
+    try:
+        url = 'https://api.dandiarchive.org/api/assets/abc/download/'
+        resolved = await asyncio.gather(*[processor_router._resolve_dandi_url(url, dandi_api_key='key1') for _ in range(10)])
+        assert len(set(resolved)) == 1
+        assert num_resolutions['count'] == 1
+        await processor_router._resolve_dandi_url(url, dandi_api_key='key2')
+        assert num_resolutions['count'] == 2
+        assert await processor_router._resolve_dandi_url('https://example.com/file.nwb', dandi_api_key='key1') == 'https://example.com/file.nwb'
+        assert num_resolutions['count'] == 2
+
+        # the resolved url is cached for at most half of its remaining lifetime
+        ttl = processor_router._get_ttl_sec_for_resolved_dandi_url(resolved[0])
+        assert 1700 < ttl <= 1800
+        assert processor_router._get_ttl_sec_for_resolved_dandi_url('https://example.com/file.nwb') == processor_router.DANDI_URL_CACHE_DEFAULT_TTL_SEC
+    finally:
+        processor_router._resolved_dandi_urls.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_github_auth_transient_errors_are_not_cached(monkeypatch):
+    from dendro.api_helpers.routers.common import AuthException
+    from dendro.api_helpers.routers.gui import _authenticate_gui_request as auth
+
+    statuses = []
+
+    class MockResponse:
+        def __init__(self, status: int):
+            self.status = status
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+        async def json(self):
+            return {'login': 'user1'}
+
+    class MockSession:
+        def get(self, url, headers):
+            return MockResponse(statuses.pop(0))
+
+    monkeypatch.setattr(auth, '_get_http_session', lambda: MockSession())
+    auth._user_ids_for_github_access_tokens.clear()
+    try:
+        # server errors and rate limits are raised but not cached
+        for status in [502, 403, 429]:
+            statuses.append(status)
+            with pytest.raises(auth.GithubUnavailableException):
+                await auth._authenticate_gui_request(github_access_token='token1', raise_on_not_authenticated=True)
+        # ... and when authentication is optional, the caller is treated as anonymous
+        statuses.append(503)
+        assert await auth._authenticate_gui_request(github_access_token='token1', raise_on_not_authenticated=False) is None
+        statuses.append(200)
+        assert await auth._authenticate_gui_request(github_access_token='token1', raise_on_not_authenticated=True) == 'github|user1'
+
+        # an invalid token is cached as such
+        statuses.append(401)
+        with pytest.raises(AuthException):
+            await auth._authenticate_gui_request(github_access_token='token2', raise_on_not_authenticated=True)
+        with pytest.raises(AuthException):
+            await auth._authenticate_gui_request(github_access_token='token2', raise_on_not_authenticated=True)
+        assert len(statuses) == 0
+    finally:
+        auth._user_ids_for_github_access_tokens.clear()
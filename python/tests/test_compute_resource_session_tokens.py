@@ -0,0 +1,98 @@
+import os
+import pytest
+
+
+@pytest.mark.api
+def test_compute_resource_session_tokens(monkeypatch):
+    from dendro.common._api_request import _use_api_test_client, _compute_resource_sessions, _globals
+    from dendro.mock import set_use_mock
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.routers.gui._authenticate_gui_request import _create_mock_github_access_token
+    import asyncio
+    import time
+    from dendro.api_helpers.services._session_tokens import create_session_token, sign_session_request, verify_session_request, check_session_nonce, SessionTokenException
+    from dendro.common._crypto_keys import generate_keypair
+    from test_integration import _get_fastapi_app, _register_compute_resource, _compute_resource_get_unfinished_jobs
+
+    from fastapi.testclient import TestClient
+    app = _get_fastapi_app()
+    test_client = TestClient(app)
+    _use_api_test_client(test_client)
+    set_use_mock(True)
+    old_env = os.environ.copy()
+    os.environ['COMPUTE_RESOURCE_USE_SESSION_TOKENS'] = '1'
+
+    try:
+        github_access_token = _create_mock_github_access_token()
+        compute_resource_id, compute_resource_private_key = generate_keypair()
+        _register_compute_resource(compute_resource_id=compute_resource_id, compute_resource_private_key=compute_resource_private_key, github_access_token=github_access_token, name='test-cr')
+
+        # the first request performs the handshake and subsequent requests reuse the session
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert len(jobs) == 0
+        session = _compute_resource_sessions[compute_resource_id]
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert _compute_resource_sessions[compute_resource_id] is session
+
+        # the session signature is bound to the payload and the compute resource
+        payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/unfinished_jobs'
+        signature = sign_session_request(payload=payload, session_key=session['sessionKey'])
+        assert verify_session_request(compute_resource_id=compute_resource_id, session_token=session['sessionToken'], payload=payload, signature=signature)
+        assert not verify_session_request(compute_resource_id=compute_resource_id, session_token=session['sessionToken'], payload=payload + '/x', signature=signature)
+        assert not verify_session_request(compute_resource_id=compute_resource_id, session_token=session['sessionToken'], payload=payload, signature=signature[:-1] + ('0' if signature[-1] != '0' else '1'))
+        other_session_token, other_session_key, _ = create_session_token('other-id')
+        assert not verify_session_request(compute_resource_id=compute_resource_id, session_token=other_session_token, payload=payload, signature=sign_session_request(payload=payload, session_key=other_session_key))
+
+        # a rejected session falls back to a signed request
+        _compute_resource_sessions[compute_resource_id] = {**session, 'sessionKey': 'wrong'}
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert compute_resource_id not in _compute_resource_sessions
+        # ... and only that request: the next one creates a new session
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert _compute_resource_sessions[compute_resource_id]['sessionToken'] != session['sessionToken']
+
+        # a failing handshake is not attempted again before each request, but after a backoff that grows
+        from dendro.api_helpers.routers.compute_resource import router as compute_resource_router
+
+        def create_session_token_failing(compute_resource_id):
+            raise SessionTokenException('unexpected')
+        monkeypatch.setattr(compute_resource_router, 'create_session_token', create_session_token_failing)
+        _compute_resource_sessions.clear()
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert compute_resource_id not in _compute_resource_sessions
+        backoff_1 = _globals['session_tokens_disabled_until'] - time.time()
+        assert 0 < backoff_1 <= 10
+        _globals['session_tokens_disabled_until'] = 0
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert _globals['session_tokens_disabled_until'] - time.time() > backoff_1
+        monkeypatch.undo()
+        _globals['session_tokens_disabled_until'] = 0
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert compute_resource_id in _compute_resource_sessions
+        assert _globals['num_session_handshake_failures'] == 0
+
+        # a server without a session secret rejects the handshake with 501 before the nonce is stored
+        monkeypatch.setattr(compute_resource_router, 'session_tokens_are_enabled', lambda: False)
+        resp = test_client.post(f'/api/compute_resource/compute_resources/{compute_resource_id}/session', json={'nonce': 'nonce-0', 'timestamp': time.time()}, headers={'compute-resource-payload': '', 'compute-resource-signature': ''})
+        assert resp.status_code == 501
+        asyncio.run(check_session_nonce(nonce='nonce-0', timestamp=time.time()))
+        _compute_resource_sessions.clear()
+        jobs = _compute_resource_get_unfinished_jobs(compute_resource_id, compute_resource_private_key)
+        assert compute_resource_id not in _compute_resource_sessions
+        assert _globals['session_tokens_disabled_until'] - time.time() > 60 * 5
+        monkeypatch.undo()
+
+        # a handshake cannot be replayed
+        timestamp = time.time()
+        asyncio.run(check_session_nonce(nonce='nonce-1', timestamp=timestamp))
+        with pytest.raises(SessionTokenException):
+            asyncio.run(check_session_nonce(nonce='nonce-1', timestamp=timestamp))
+    finally:
+        os.environ.clear()
+        os.environ.update(old_env)
+        _compute_resource_sessions.clear()
+        _globals['session_tokens_disabled_until'] = 0
+        _globals['num_session_handshake_failures'] = 0
+        _use_api_test_client(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import subprocess
+
+
+_worker_script = '''
+import sys
+import dendro.sdk._container_worker as container_worker
+
+container_worker.job_timeout_buffer_sec = 0
+container_worker.container_worker_jobs_dir = sys.argv[3]
+container_worker._run_container_worker(app_executable=sys.argv[1], socket_path=sys.argv[2], idle_timeout_sec=60)
+'''
+
+_job_script = '''#!{python}
+import os
+import time
+with open('job.txt', 'w') as f:
+    f.write(os.environ['JOB_ID'] + ' ' + os.getcwd())
+time.sleep(float(os.environ.get('TEST_SLEEP', '0')))
+with open('done.txt', 'w') as f:
+    f.write('done')
+'''
+
+def _wait_for(condition, timeout: float = 10):
+    timer = time.time()
+    while not condition():
+        assert time.time() - timer < timeout
+        time.sleep(0.05)
+
+def test_container_worker(tmp_path):
+    from dendro.sdk._container_worker import _submit_to_container_worker
+
+    app_executable = str(tmp_path / 'main.py')
+    with open(app_executable, 'w') as f:
+        f.write(_job_script.format(python=sys.executable))
+    os.chmod(app_executable, 0o755)
+    socket_dir = tmp_path / 'worker'
+    socket_dir.mkdir()
+    socket_path = str(socket_dir / 'worker.sock')
+    worker = subprocess.Popen([sys.executable, '-c', _worker_script, app_executable, socket_path, str(tmp_path / 'jobs')])
+    try:
+        _wait_for(lambda: os.path.exists(socket_path), timeout=20)
+
+        # the jobs run one after another, each in its own working directory
+        dir1 = tmp_path / 'jobs' / 'j1' / 'working'
+        assert _submit_to_container_worker(socket_path=socket_path, env={'JOB_ID': 'j1', 'TEST_SLEEP': '1'}, cwd=str(dir1), timeout_sec=None)
+        dir2 = tmp_path / 'jobs' / 'j2' / 'working'
+        assert not _submit_to_container_worker(socket_path=socket_path, env={'JOB_ID': 'j2'}, cwd=str(dir2), timeout_sec=None)
+        _wait_for(lambda: (dir1 / 'done.txt').exists())
+        assert (dir1 / 'job.txt').read_text() == f'j1 {dir1}'
+        _wait_for(lambda: _submit_to_container_worker(socket_path=socket_path, env={'JOB_ID': 'j2'}, cwd=str(dir2), timeout_sec=None))
+        _wait_for(lambda: (dir2 / 'done.txt').exists())
+        assert (dir2 / 'job.txt').read_text() == f'j2 {dir2}'
+        # the directory of the previous job is removed when the next job starts
+        assert not (tmp_path / 'jobs' / 'j1').exists()
+
+        # a job process that runs past its timeout is killed, and the worker is available again
+        dir3 = tmp_path / 'jobs' / 'j3' / 'working'
+        _wait_for(lambda: _submit_to_container_worker(socket_path=socket_path, env={'JOB_ID': 'j3', 'TEST_SLEEP': '60'}, cwd=str(dir3), timeout_sec=0.5))
+        dir4 = tmp_path / 'jobs' / 'j4' / 'working'
+        _wait_for(lambda: _submit_to_container_worker(socket_path=socket_path, env={'JOB_ID': 'j4'}, cwd=str(dir4), timeout_sec=None))
+        assert not (dir3 / 'done.txt').exists()
+        _wait_for(lambda: (dir4 / 'done.txt').exists())
+
+        # the worker stops when asked to
+        (socket_dir / 'stop').write_text('stop')
+        worker.wait(10)
+    finally:
+        if worker.poll() is None:
+            worker.kill()
+    assert worker.returncode == 0
+    assert not os.path.exists(socket_path)
+
+def test_container_workers_are_started_in_the_background():
+    import threading
+    from dendro.compute_resource.ContainerWorkerManager import ContainerWorkerManager
+
+    manager = ContainerWorkerManager(max_num_workers_per_image=1, idle_timeout_sec=60)
+    release = threading.Event()
+    started = []
+
+    class _MockProcess:
+        def poll(self):
+            return None
+
+    def mock_start_worker(**kwargs):
+        release.wait(10) # e.g., waiting for the image
+        started.append(kwargs)
+        from dendro.compute_resource.ContainerWorkerManager import _ContainerWorker
+        return _ContainerWorker(process=_MockProcess(), socket_dir='/nonexistent') # type: ignore
+
+    manager._start_worker = mock_start_worker # type: ignore
+    kwargs = dict(app_image='image1', app_executable='/app/main.py', env_vars={}, project_id='p1', num_cpus=None, use_gpu=False)
+    # the job does not wait for the container to start
+    timer = time.time()
+    assert not manager.submit_job(job_dir='/cr/jobs/j1', **kwargs) # type: ignore
+    assert time.time() - timer < 5
+    # no other container is started for the image while this one is starting
+    assert not manager.submit_job(job_dir='/cr/jobs/j2', **kwargs) # type: ignore
+    release.set()
+    _wait_for(lambda: len(manager._workers.get(('image1', '/app/main.py', None, False), [])) == 1)
+    assert len(started) == 1
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import threading
+import statistics
+import pytest
+
+
+def test_daemon_timers():
+    from dendro.compute_resource.DaemonTimers import DaemonTimers
+
+    calls = []
+    timers = DaemonTimers()
+    timers.add('a', interval_sec=0.05, callback=lambda: calls.append('a'), run_immediately=True)
+    timers.add('b', interval_sec=1000, callback=lambda: calls.append('b'))
+    assert timers.time_until_next() == 0
+    timers.run_due_timers()
+    assert calls == ['a']
+    assert 0 < timers.time_until_next() <= 0.05
+    time.sleep(0.06)
+    timers.run_due_timers()
+    assert calls == ['a', 'a']
+
+    # resetting postpones the timer by a full interval
+    time.sleep(0.03)
+    timers.reset('a')
+    assert timers.time_until_next() > 0.04
+    time.sleep(0.03)
+    timers.run_due_timers()
+    assert calls == ['a', 'a']
+
+
+# Latency benchmark (mock mode): time from publishing a newPendingJob message
+# until the daemon handles the jobs, with the periodic full sync effectively disabled.
+@pytest.mark.api
+def test_daemon_job_event_latency(tmp_path, monkeypatch):
+    from dendro.common._api_request import _use_api_test_client
+    from dendro.mock import set_use_mock
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.clients.pubsub import publish_pubsub_message
+    from dendro.api_helpers.routers.gui._authenticate_gui_request import _create_mock_github_access_token
+    from dendro.common._crypto_keys import generate_keypair
+    from dendro.compute_resource import start_compute_resource as scr
+    from test_integration import _get_fastapi_app, _register_compute_resource
+
+    from fastapi.testclient import TestClient
+    app = _get_fastapi_app()
+    test_client = TestClient(app)
+    _use_api_test_client(test_client)
+    set_use_mock(True)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ENABLE_COMPUTE_RESOURCE_EVENT_STREAM', '1')
+    monkeypatch.setenv('AVAILABLE_JOB_RUN_METHODS', 'local')
+    monkeypatch.setattr(scr, 'FULL_SYNC_INTERVAL_SEC', 1e9)
+
+    daemon = None
+    thread = None
+    try:
+        github_access_token = _create_mock_github_access_token()
+        compute_resource_id, compute_resource_private_key = generate_keypair()
+        _register_compute_resource(compute_resource_id=compute_resource_id, compute_resource_private_key=compute_resource_private_key, github_access_token=github_access_token, name='test-cr')
+        monkeypatch.setenv('COMPUTE_RESOURCE_ID', compute_resource_id)
+        monkeypatch.setenv('COMPUTE_RESOURCE_PRIVATE_KEY', compute_resource_private_key)
+
+        daemon = scr.Daemon()
+        handle_jobs_times = []
+        daemon._handle_jobs = lambda: handle_jobs_times.append(time.time()) # type: ignore
+        daemon._handle_job_events = lambda messages: handle_jobs_times.append(time.time()) # type: ignore
+        thread = threading.Thread(target=daemon.start, kwargs={'timeout': 60, 'cleanup_old_jobs': False})
+        thread.start()
+
+        _wait_until(lambda: len(handle_jobs_times) == 1) # the initial full sync
+        time.sleep(0.5) # let the event stream client establish its position in the stream
+
+        # an idle daemon should use close to no CPU
+        cpu_timer = time.process_time()
+        time.sleep(1)
+        idle_cpu_sec = time.process_time() - cpu_timer
+
+        latencies = []
+        for _ in range(10):
+            num_handled = len(handle_jobs_times)
+            timer = time.time()
+            asyncio.run(publish_pubsub_message(channel=compute_resource_id, message={'type': 'newPendingJob', 'computeResourceId': compute_resource_id}))
+            _wait_until(lambda: len(handle_jobs_times) > num_handled)
+            latencies.append(handle_jobs_times[-1] - timer)
+
+        print(f'Job event latency: median {statistics.median(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms')
+        print(f'CPU time used by the idle daemon (and the test API) in 1 second: {idle_cpu_sec * 1000:.1f} ms')
+        # the old polling loop slept for 2 seconds between iterations
+        assert statistics.median(latencies) < 0.5
+        assert idle_cpu_sec < 0.5
+    finally:
+        if daemon is not None:
+            daemon.stop()
+        if thread is not None:
+            thread.join()
+        _use_api_test_client(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
+
+def _wait_until(condition, timeout_sec: float = 10):
+    timer = time.time()
+    while not condition():
+        if time.time() - timer > timeout_sec:
+            raise Exception('Timed out waiting for condition')
+        time.sleep(0.001)
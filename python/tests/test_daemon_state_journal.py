@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+
+
+def test_daemon_state_journal(tmp_path):
+    from dendro.compute_resource.DaemonStateJournal import DaemonStateJournal
+
+    path = str(tmp_path / 'state.db')
+    journal = DaemonStateJournal(path)
+    journal.record_job_launching('j1', run_method='local')
+    journal.record_job_launched('j1', pid=123)
+    journal.record_job_launching('j2', run_method='slurm')
+    journal.record_job_launched('j2', slurm_group_id='g1')
+    journal.record_job_launching('j3', run_method='aws_batch')
+    journal.record_job_failed('j3', run_method='aws_batch')
+    journal.record_job_failed('j4', run_method='local')
+    journal.close()
+
+    # the records survive a restart
+    journal = DaemonStateJournal(path)
+    records = journal.get_job_launches()
+    assert sorted(records.keys()) == ['j1', 'j2', 'j3', 'j4']
+    assert (records['j1'].state, records['j1'].pid) == ('launched', 123)
+    assert records['j3'].state == 'failed'
+    assert journal.get_slurm_group_ids(['j1', 'j2', 'j5']) == {'j2': 'g1'}
+    journal.remove_jobs(['j1', 'j2'])
+    assert sorted(journal.get_job_launches().keys()) == ['j3', 'j4']
+    journal.close()
+
+def test_job_manager_reconciles_after_restart(tmp_path, monkeypatch, create_job, mock_app_manager):
+    from dendro.compute_resource.DaemonStateJournal import DaemonStateJournal
+    from dendro.compute_resource.JobManager import JobManager
+    import dendro.compute_resource.JobManager as job_manager_module
+
+    monkeypatch.setenv('LOCAL_MAX_NUM_CPUS', '10')
+    monkeypatch.setenv('LOCAL_MAX_MEMORY_GB', '100')
+    failed = {}
+    monkeypatch.setattr(job_manager_module, '_set_job_status', lambda *, job_id, job_private_key, status, error: failed.update({job_id: error}))
+
+    # a process that has exited
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+
+    # the state when the daemon stopped
+    path = str(tmp_path / 'state.db')
+    journal = DaemonStateJournal(path)
+    journal.record_job_launching('not_launched', run_method='local') # status was never set to starting
+    journal.record_job_launching('interrupted', run_method='local') # status was set to starting, but no process was recorded
+    journal.record_job_launching('exited', run_method='local')
+    journal.record_job_launched('exited', pid=process.pid)
+    journal.record_job_launching('running', run_method='local')
+    journal.record_job_launched('running', pid=os.getpid())
+    journal.record_job_launching('finished', run_method='local')
+    journal.record_job_launched('finished', pid=process.pid)
+    journal.close()
+
+    job_manager = JobManager(compute_resource_id='cr1', compute_resource_private_key='', app_manager=mock_app_manager, state_journal_path=path) # type: ignore
+    launched = []
+    job_manager._launch_job = lambda job, run_process=True, return_shell_command=False: launched.append(job.jobId) # type: ignore
+    try:
+        job_manager.handle_jobs([
+            create_job('not_launched', status='pending'),
+            create_job('interrupted', status='starting'),
+            create_job('exited', status='starting'),
+            create_job('running', status='starting')
+        ])
+    finally:
+        job_manager.close()
+
+    assert launched == ['not_launched']
+    assert sorted(failed.keys()) == ['exited', 'interrupted']
+
+    journal = DaemonStateJournal(path)
+    records = journal.get_job_launches()
+    # the finished job is no longer in the journal
+    assert sorted(records.keys()) == ['exited', 'interrupted', 'not_launched', 'running']
+    assert records['exited'].state == 'failed'
+    assert records['running'].state == 'launched'
+    journal.close()
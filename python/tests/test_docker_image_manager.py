@@ -0,0 +1,88 @@
+import time
+import threading
+
+
+def test_docker_image_manager():
+    from dendro.compute_resource.DockerImageManager import DockerImageManager
+
+    manager = DockerImageManager()
+    pulls = []
+    local_image_ids = {}
+    pull_started = threading.Event()
+    release_pull = threading.Event()
+
+    def pull(image):
+        pulls.append(image)
+        pull_started.set()
+        release_pull.wait(10)
+        local_image_ids[image] = 'sha256:aaa'
+    manager._pull = pull # type: ignore
+
+    def inspect_image(image, format):
+        if format == '{{.Id}}':
+            return local_image_ids.get(image, None)
+        return f'{image}@sha256:digest' if image in local_image_ids else None
+    manager._inspect_image = inspect_image # type: ignore
+
+    # warming pulls in the background
+    manager.warm('app:1')
+    assert pull_started.wait(5)
+    manager.warm('app:1') # already being pulled
+
+    # a job that starts during the pull waits for it rather than pulling again
+    thread = threading.Thread(target=manager.ensure_image, args=('app:1',))
+    thread.start()
+    time.sleep(0.05)
+    assert thread.is_alive()
+    release_pull.set()
+    thread.join(5)
+    assert pulls == ['app:1']
+    state = manager.get_image_state('app:1')
+    assert state is not None
+    assert state.image_id == 'sha256:aaa'
+    assert state.repo_digest == 'app:1@sha256:digest'
+    assert state.pull_duration_sec is not None
+
+    # the local image is current, so there is no pull when a job starts
+    manager.ensure_image('app:1')
+    assert pulls == ['app:1']
+
+    # the local image was replaced, so it is pulled again
+    local_image_ids['app:1'] = 'sha256:bbb'
+    manager.ensure_image('app:1')
+    assert pulls == ['app:1', 'app:1']
+    assert state.image_id == 'sha256:aaa'
+
+
+def test_docker_image_manager_inspect_does_not_block():
+    from dendro.compute_resource.DockerImageManager import DockerImageManager
+
+    manager = DockerImageManager()
+    manager._pull = lambda image: None # type: ignore
+    manager._inspect_image = lambda image, format: 'sha256:aaa' # type: ignore
+    manager.ensure_image('app:1')
+    manager.ensure_image('app:2')
+
+    # a slow docker image inspect for one job does not hold up the others, or warm/refresh
+    inspect_started = threading.Event()
+    release_inspect = threading.Event()
+
+    def slow_inspect_image(image, format):
+        if image == 'app:1':
+            inspect_started.set()
+            release_inspect.wait(10)
+        return 'sha256:aaa'
+    manager._inspect_image = slow_inspect_image # type: ignore
+
+    thread = threading.Thread(target=manager.ensure_image, args=('app:1',))
+    thread.start()
+    try:
+        assert inspect_started.wait(5)
+        timer = time.time()
+        manager.ensure_image('app:2')
+        manager.warm('app:3')
+        assert time.time() - timer < 5
+        assert thread.is_alive()
+    finally:
+        release_inspect.set()
+        thread.join(5)
@@ -0,0 +1,203 @@
+import asyncio
+import time
+import pytest
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_in_process_event_broker():
+    from dendro.api_helpers.clients.event_broker import InProcessEventBroker
+
+    broker = InProcessEventBroker(max_buffered_events_per_channel=3)
+
+    # initial call returns the current sequence number and epoch without waiting
+    events, seq, epoch = await broker.wait_for_events(channel='cr1', since=None, epoch=None, timeout_sec=10)
+    assert events == [] and seq == 0
+
+    # a waiting subscriber is woken up by a publish
+    async def publish_later():
+        await asyncio.sleep(0.05)
+        await broker.publish(channel='cr1', message={'type': 'newPendingJob'})
+    timer = time.time()
+    _, (events, seq, _) = await asyncio.gather(publish_later(), broker.wait_for_events(channel='cr1', since=0, epoch=epoch, timeout_sec=10))
+    assert time.time() - timer < 5
+    assert events == [{'type': 'newPendingJob'}] and seq == 1
+
+    # other channels are not affected and time out
+    events, seq, _ = await broker.wait_for_events(channel='cr2', since=0, epoch=epoch, timeout_sec=0.05)
+    assert events == [] and seq == 0
+
+    # a subscriber that fell behind the buffer is told to resync
+    for i in range(5):
+        await broker.publish(channel='cr1', message={'type': 'jobStatusChanged', 'i': i})
+    events, seq, _ = await broker.wait_for_events(channel='cr1', since=1, epoch=epoch, timeout_sec=0)
+    assert events == [{'type': 'eventsMissed'}] and seq == 6
+    events, seq, _ = await broker.wait_for_events(channel='cr1', since=4, epoch=epoch, timeout_sec=0)
+    assert [e['i'] for e in events] == [3, 4]
+
+    # after a restart the sequence numbers start over, so a cursor from the old broker is not trusted
+    # even when the new broker has since passed it
+    broker2 = InProcessEventBroker(max_buffered_events_per_channel=3)
+    for i in range(7):
+        await broker2.publish(channel='cr1', message={'type': 'jobStatusChanged', 'i': i})
+    events, seq, epoch2 = await broker2.wait_for_events(channel='cr1', since=6, epoch=epoch, timeout_sec=0)
+    assert events == [{'type': 'eventsMissed'}] and seq == 7 and epoch2 != epoch
+    events, seq, _ = await broker2.wait_for_events(channel='cr1', since=6, epoch=epoch2, timeout_sec=0)
+    assert [e['i'] for e in events] == [6]
+
+
+@pytest.mark.api
+def test_event_stream_client():
+    from dendro.common._api_request import _use_api_test_client
+    from dendro.mock import set_use_mock
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.clients.pubsub import publish_pubsub_message
+    from dendro.api_helpers.routers.gui._authenticate_gui_request import _create_mock_github_access_token
+    from dendro.common._crypto_keys import generate_keypair
+    from dendro.api_helpers.clients.event_broker import InProcessEventBroker, set_event_broker
+    from dendro.compute_resource.EventStreamClient import EventStreamClient
+    from test_integration import _get_fastapi_app, _register_compute_resource
+
+    from fastapi.testclient import TestClient
+    app = _get_fastapi_app()
+    test_client = TestClient(app)
+    _use_api_test_client(test_client)
+    set_use_mock(True)
+
+    event_stream_client = None
+    try:
+        github_access_token = _create_mock_github_access_token()
+        compute_resource_id, compute_resource_private_key = generate_keypair()
+        _register_compute_resource(compute_resource_id=compute_resource_id, compute_resource_private_key=compute_resource_private_key, github_access_token=github_access_token, name='test-cr')
+
+        event_stream_client = EventStreamClient(
+            compute_resource_id=compute_resource_id,
+            compute_resource_private_key=compute_resource_private_key,
+            poll_timeout_sec=1
+        )
+        time.sleep(0.5) # let the client establish its position in the stream
+        asyncio.run(publish_pubsub_message(channel=compute_resource_id, message={'type': 'newPendingJob', 'computeResourceId': compute_resource_id}))
+        assert event_stream_client.wait_for_messages(5)
+        messages = event_stream_client.take_messages()
+        assert [m['type'] for m in messages] == ['newPendingJob']
+
+        # simulate a restart of the broker whose sequence number then passes the client's position
+        set_event_broker(InProcessEventBroker())
+        for _ in range(3):
+            asyncio.run(publish_pubsub_message(channel=compute_resource_id, message={'type': 'jobStatusChanged', 'computeResourceId': compute_resource_id}))
+        assert event_stream_client.wait_for_messages(5)
+        messages = event_stream_client.take_messages()
+        assert [m['type'] for m in messages] == ['eventsMissed']
+    finally:
+        if event_stream_client is not None:
+            event_stream_client.close()
+        set_event_broker(None)
+        _use_api_test_client(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_pubsub_messages_are_coalesced_after_response(monkeypatch):
+    from dendro.api_helpers.clients.pubsub import publish_pubsub_message, set_pubsub_backends, PubsubBackend, PubsubFlushMiddleware
+
+    published = []
+
+    class RecordingPubsubBackend(PubsubBackend):
+        async def publish(self, *, channel: str, message: dict):
+            published.append((channel, message))
+
+    events = []
+
+    async def app(scope, receive, send):
+        for job_id in ['j1', 'j2', 'j3']:
+            await publish_pubsub_message(channel='cr1', message={'type': 'newPendingJob', 'projectId': 'p1', 'jobId': job_id})
+        await publish_pubsub_message(channel='cr1', message={'type': 'newPendingJob', 'projectId': 'p2', 'jobId': 'j4'})
+        events.append('response sent')
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    async def send(message):
+        pass
+
+    set_pubsub_backends([RecordingPubsubBackend()])
+    try:
+        # deferred publishing is off by default, so each message is published right away
+        await PubsubFlushMiddleware(app)({'type': 'http'}, receive, send)
+        assert len(published) == 4
+        published.clear()
+        events.clear()
+
+        monkeypatch.setenv('ENABLE_DEFERRED_PUBSUB_PUBLISHING', '1')
+        await PubsubFlushMiddleware(app)({'type': 'http'}, receive, send)
+        assert events == ['response sent']
+        assert len(published) == 2
+        assert published[0] == ('cr1', {'type': 'newPendingJob', 'projectId': 'p1', 'jobId': 'j3', 'jobIds': ['j1', 'j2', 'j3']})
+        assert published[1] == ('cr1', {'type': 'newPendingJob', 'projectId': 'p2', 'jobId': 'j4'})
+
+        # outside of a request, messages are published right away
+        await publish_pubsub_message(channel='cr1', message={'type': 'computeResourceAppsChanaged'})
+        assert len(published) == 3
+    finally:
+        set_pubsub_backends(None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_pubsub_flush_latency_and_failures(monkeypatch):
+    import time
+    import asyncio
+    from dendro.api_helpers.clients.pubsub import publish_pubsub_message, set_pubsub_backends, get_pubsub_metrics, PubsubBackend, PubsubFlushMiddleware, PubsubError, PUBSUB_COALESCE_WINDOW_SEC
+
+    published = []
+
+    class RecordingPubsubBackend(PubsubBackend):
+        async def publish(self, *, channel: str, message: dict):
+            published.append((channel, message))
+
+    class FailingPubsubBackend(PubsubBackend):
+        async def publish(self, *, channel: str, message: dict):
+            raise Exception('unable to publish')
+
+    async def app(scope, receive, send):
+        await publish_pubsub_message(channel='cr1', message={'type': 'newPendingJob', 'projectId': 'p1', 'jobId': 'j1'})
+
+    async def slow_app(scope, receive, send):
+        await publish_pubsub_message(channel='cr1', message={'type': 'newPendingJob', 'projectId': 'p1', 'jobId': 'j2'})
+        await asyncio.sleep(0.02)
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    async def send(message):
+        pass
+
+    monkeypatch.setenv('ENABLE_DEFERRED_PUBSUB_PUBLISHING', '1')
+    set_pubsub_backends([RecordingPubsubBackend()])
+    try:
+        # a request that is handled on its own does not wait for the coalescing window
+        timer = time.time()
+        await PubsubFlushMiddleware(app)({'type': 'http'}, receive, send)
+        assert time.time() - timer < PUBSUB_COALESCE_WINDOW_SEC
+        assert len(published) == 1
+
+        # concurrent requests are coalesced
+        await asyncio.gather(
+            PubsubFlushMiddleware(app)({'type': 'http'}, receive, send),
+            PubsubFlushMiddleware(slow_app)({'type': 'http'}, receive, send)
+        )
+        assert len(published) == 2
+        assert published[1][1]['jobIds'] == ['j1', 'j2']
+
+        # failures are counted, and raised outside of a request
+        set_pubsub_backends([FailingPubsubBackend()])
+        num_failed = get_pubsub_metrics()['numFailed']
+        await PubsubFlushMiddleware(app)({'type': 'http'}, receive, send)
+        assert get_pubsub_metrics()['numFailed'] == num_failed + 1
+        with pytest.raises(PubsubError):
+            await publish_pubsub_message(channel='cr1', message={'type': 'computeResourceAppsChanaged'})
+        assert get_pubsub_metrics()['numFailed'] == num_failed + 2
+    finally:
+        set_pubsub_backends(None)
@@ -0,0 +1,79 @@
+import pytest
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_file_manifest(monkeypatch):
+    from dendro.mock import set_use_mock
+    from dendro.common.dendro_types import DendroFileManifest
+    from dendro.api_helpers.clients.db import fetch_file, fetch_project_files, fetch_project_folder, fetch_multi_project_files
+    from dendro.api_helpers.clients._get_mongo_client import _get_mongo_client, _clear_mock_mongo_databases
+    from dendro.api_helpers.services import _create_output_file as create_output_file_module
+
+    class MockResponse:
+        def __init__(self, obj: dict):
+            self.status = 200
+            self._obj = obj
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+        async def json(self):
+            return self._obj
+
+    manifests = {
+        'https://example.com/folder1/file_manifest.json': {'files': [{'name': 'a.txt', 'size': 10}, {'name': 'b/c.txt', 'size': 5}]},
+        'https://example.com/folder2/file_manifest.json': {'files': [{'name': f'{i}.txt', 'size': 1} for i in range(create_output_file_module.MAX_NUM_FILES_IN_STORED_FILE_MANIFEST + 1)]}
+    }
+
+    class MockSession:
+        def get(self, url):
+            return MockResponse(manifests[url])
+
+    monkeypatch.setattr(create_output_file_module, '_get_http_session', lambda: MockSession())
+
+    # the manifest is created from file_manifest.json of the folder
+    size, file_manifest = await create_output_file_module._get_size_and_file_manifest(url='https://example.com/folder1', is_folder=True)
+    assert size == 15
+    assert file_manifest is not None and file_manifest.numFiles == 2
+    assert [(f.name, f.size) for f in file_manifest.files or []] == [('a.txt', 10), ('b/c.txt', 5)]
+    # only the counts are stored for very large folders
+    size, file_manifest = await create_output_file_module._get_size_and_file_manifest(url='https://example.com/folder2', is_folder=True)
+    assert file_manifest is not None and file_manifest.numFiles == create_output_file_module.MAX_NUM_FILES_IN_STORED_FILE_MANIFEST + 1
+    assert file_manifest.files is None
+
+    get_size_and_file_manifest = create_output_file_module._get_size_and_file_manifest
+
+    async def mock_get_size_and_file_manifest(*, url: str, is_folder, known_size=None):
+        # the size and manifest are not looked up in mock mode
+        set_use_mock(False)
+        try:
+            return await get_size_and_file_manifest(url=url, is_folder=is_folder, known_size=known_size)
+        finally:
+            set_use_mock(True)
+
+    set_use_mock(True)
+    try:
+        await _get_mongo_client()['dendro']['projects'].insert_one({'projectId': 'p1'})
+        # the manifest is stored with the folder output of a job
+        monkeypatch.setattr(create_output_file_module, '_get_size_and_file_manifest', mock_get_size_and_file_manifest)
+        await create_output_file_module._create_output_file(file_name='out/folder1', url='https://example.com/folder1', project_id='p1', user_id='u1', job_id='j1', is_folder=True)
+
+        # ... and returned when the file is fetched on its own
+        file = await fetch_file('p1', 'out/folder1')
+        assert file is not None and file.size == 15
+        assert isinstance(file.fileManifest, DendroFileManifest) and file.fileManifest.numFiles == 2
+
+        # ... but not in the listings
+        files = await fetch_project_files('p1')
+        assert [f.fileName for f in files] == ['out/folder1'] and files[0].fileManifest is None
+        files, _ = await fetch_project_folder('p1', 'out')
+        assert [f.fileName for f in files] == ['out/folder1'] and files[0].fileManifest is None
+        files = await fetch_multi_project_files(['p1'])
+        assert [f.fileName for f in files] == ['out/folder1'] and files[0].fileManifest is None
+    finally:
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
@@ -0,0 +1,69 @@
+import os
+import sys
+import subprocess
+import pytest
+
+
+# Modules that are slow to import and are only needed by some of the API routes.
+# They must be imported inside the functions that use them so that they don't add to the cold start of the API.
+HEAVY_MODULES_NOT_TO_IMPORT = ['boto3', 'botocore', 'aiohttp', 'pymongo', 'motor', 'cryptography', 'pubnub', 'requests']
+
+# Generous, because the machines that run the tests vary. Override with DENDRO_API_IMPORT_TIME_BUDGET_MS.
+DEFAULT_API_IMPORT_TIME_BUDGET_MS = 3000
+
+# Same imports as api/index.py
+_API_IMPORT_CODE = '''
+import sys
+from dendro.api_helpers.routers.processor.router import router as processor_router
+from dendro.api_helpers.routers.compute_resource.router import router as compute_resource_router
+from dendro.api_helpers.routers.client.router import router as client_router
+from dendro.api_helpers.routers.gui.router import router as gui_router
+from dendro.api_helpers.clients._get_http_session import _close_http_session
+from dendro.api_helpers.clients.pubsub import PubsubFlushMiddleware
+print(' '.join(sorted(set(k.split('.')[0] for k in sys.modules))))
+'''
+
+@pytest.mark.api
+def test_api_import_time():
+    python_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = python_dir + os.pathsep + env.get('PYTHONPATH', '')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _API_IMPORT_CODE],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True
+    )
+    imported_top_level_modules = set(result.stdout.split())
+    import_times = _parse_import_times(result.stderr)
+
+    # report the per-module import cost (self time), like python -X importtime
+    print('Slowest modules to import (self time):')
+    for module_name, self_us, _ in sorted(import_times, key=lambda x: -x[1])[:15]:
+        print(f'  {self_us / 1000:8.1f} ms  {module_name}')
+    total_ms = sum(x[1] for x in import_times) / 1000
+    print(f'Total import time of the API: {total_ms:.1f} ms')
+
+    for module_name in HEAVY_MODULES_NOT_TO_IMPORT:
+        assert module_name not in imported_top_level_modules, f'{module_name} is imported at module import time of the API'
+
+    budget_ms = float(os.environ.get('DENDRO_API_IMPORT_TIME_BUDGET_MS', DEFAULT_API_IMPORT_TIME_BUDGET_MS))
+    assert total_ms < budget_ms, f'Import time of the API ({total_ms:.1f} ms) exceeds the budget ({budget_ms} ms)'
+
+def _parse_import_times(importtime_output: str):
+    # lines look like: "import time:       157 |      38210 |       dendro.api_helpers.services._remove_detached_files_and_jobs"
+    ret = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue # the header line
+        ret.append((parts[2].strip(), self_us, cumulative_us))
+    return ret
@@ -19,7 +19,7 @@ async def test_integration(tmp_path):
     from dendro.common._api_request import _use_api_test_client
     from dendro.mock import set_use_mock
     from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
-    from dendro.common._api_request import _gui_post_api_request, _client_get_api_request
+    from dendro.common._api_request import _gui_post_api_request, _client_get_api_request, _compute_resource_get_api_request
     from dendro.common.dendro_types import DendroJobRequiredResources
     from dendro.api_helpers.routers.gui.job_routes import ApproveJobResponse
 
@@ -369,6 +369,16 @@ async def test_integration(tmp_path):
         job = jobs[0]
         assert job.jobPrivateKey
 
+        # compute resource: get unfinished jobs by ID (unknown jobs are not returned)
+        resp = _compute_resource_get_api_request(
+            url_path=f'/api/compute_resource/compute_resources/{compute_resource_id}/jobs',
+            compute_resource_id=compute_resource_id,
+            compute_resource_private_key=compute_resource_private_key,
+            params={'job_ids': f'{job.jobId},unknown-job-id'}
+        )
+        assert [j['jobId'] for j in resp['jobs']] == [job.jobId]
+        assert resp['waitingJobIds'] == []
+
         # compute resource: fail getting unfinished jobs
         with pytest.raises(Exception):
             _compute_resource_get_unfinished_jobs(compute_resource_id=compute_resource_id, compute_resource_private_key=compute_resource_private_key, wrong_payload=True)
@@ -454,9 +464,12 @@ def _get_fastapi_app():
     from dendro.api_helpers.routers.compute_resource.router import router as compute_resource_router
     from dendro.api_helpers.routers.client.router import router as client_router
     from dendro.api_helpers.routers.gui.router import router as gui_router
+    from dendro.api_helpers.clients.pubsub import PubsubFlushMiddleware
 
     app = FastAPI()
 
+    app.add_middleware(PubsubFlushMiddleware)
+
     # requests from a processing job
     app.include_router(processor_router, prefix="/api/processor", tags=["Processor"])
 
@@ -0,0 +1,220 @@
+import pytest
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_archive_old_jobs():
+    from dendro.mock import set_use_mock
+    from dendro.common.dendro_types import DendroJob, ComputeResourceSpecProcessor
+    from dendro.api_helpers.clients.db import insert_job, fetch_job, fetch_compute_resource_jobs, fetch_project_jobs, fetch_jobs_including_deleted, archive_old_jobs, delete_job
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+
+    set_use_mock(True)
+    try:
+        for job_id, status, timestamp_finished in [('j1', 'completed', 100), ('j2', 'failed', None), ('j3', 'pending', None)]:
+            await insert_job(DendroJob(
+                projectId='p1',
+                jobId=job_id,
+                jobPrivateKey='k1',
+                userId='u1',
+                processorName='proc',
+                inputFiles=[],
+                inputFileIds=[],
+                inputParameters=[],
+                outputFiles=[],
+                timestampCreated=0,
+                timestampFinished=timestamp_finished,
+                computeResourceId='cr1',
+                status=status,
+                processorSpec=ComputeResourceSpecProcessor(name='proc', inputs=[], outputs=[], parameters=[], attributes=[], tags=[])
+            ))
+        assert await archive_old_jobs(min_age_sec=60) == 1
+        assert await archive_old_jobs(min_age_sec=60) == 0
+
+        # the hot path only sees the live set
+        jobs = await fetch_compute_resource_jobs('cr1', statuses=None)
+        assert sorted([j.jobId for j in jobs]) == ['j2', 'j3']
+
+        # the archived job is still found
+        job = await fetch_job('j1')
+        assert job is not None and job.status == 'completed'
+        jobs = await fetch_project_jobs('p1', include_archived=True)
+        assert sorted([j.jobId for j in jobs]) == ['j1', 'j2', 'j3']
+        jobs = await fetch_jobs_including_deleted(compute_resource_id='cr1', user_id='u1')
+        assert sorted([j.jobId for j in jobs]) == ['j1', 'j2', 'j3']
+
+        await delete_job('j1')
+        assert await fetch_job('j1') is None
+    finally:
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_fetch_jobs_producing_files():
+    from dendro.mock import set_use_mock
+    from dendro.common.dendro_types import DendroJob, DendroJobOutputFile, ComputeResourceSpecProcessor
+    from dendro.api_helpers.clients.db import insert_job, fetch_job, archive_old_jobs, fetch_jobs_producing_files, delete_jobs
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+
+    set_use_mock(True)
+    try:
+        for job_id, output_file_names, status in [('j1', ['a.txt', 'b.txt'], 'completed'), ('j2', ['c.txt'], 'pending'), ('j3', ['b.txt'], 'pending')]:
+            await insert_job(DendroJob(
+                projectId='p1',
+                jobId=job_id,
+                jobPrivateKey='k1',
+                userId='u1',
+                processorName='proc',
+                inputFiles=[],
+                inputFileIds=[],
+                inputParameters=[],
+                outputFiles=[DendroJobOutputFile(name=f'out{i}', fileName=fname) for i, fname in enumerate(output_file_names)],
+                timestampCreated=0,
+                timestampFinished=100 if status == 'completed' else None,
+                computeResourceId='cr1',
+                status=status,
+                processorSpec=ComputeResourceSpecProcessor(name='proc', inputs=[], outputs=[], parameters=[], attributes=[], tags=[])
+            ))
+        assert await archive_old_jobs(min_age_sec=60) == 1
+
+        # archived producers are found too
+        jobs = await fetch_jobs_producing_files('p1', ['b.txt', 'x.txt'])
+        assert sorted([j.jobId for j in jobs]) == ['j1', 'j3']
+        assert await fetch_jobs_producing_files('p2', ['b.txt']) == []
+
+        await delete_jobs(['j1', 'j3'])
+        assert await fetch_job('j1') is None and await fetch_job('j3') is None
+        assert await fetch_job('j2') is not None
+    finally:
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_remove_detached_files_and_jobs():
+    from dendro.mock import set_use_mock
+    from dendro.common.dendro_types import DendroJob, DendroFile, ComputeResourceSpecProcessor
+    from dendro.api_helpers.clients.db import insert_job, insert_file, fetch_job, fetch_project_files, delete_file
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.services._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
+    from dendro.api_helpers.clients.event_broker import InProcessEventBroker, set_event_broker
+
+    set_use_mock(True)
+    broker = InProcessEventBroker()
+    set_event_broker(broker)
+    try:
+        # in.txt -> j1 -> f1.txt -> j2 -> f2.txt (j2 is still pending), and an unrelated chain other.txt -> j3 -> f3.txt
+        for job_id, input_file_id, output_file_id in [('j1', 'in', 'f1'), ('j2', 'f1', 'f2'), ('j3', 'other', 'f3')]:
+            await insert_job(DendroJob(
+                projectId='p1',
+                jobId=job_id,
+                jobPrivateKey='k1',
+                userId='u1',
+                processorName='proc',
+                inputFiles=[],
+                inputFileIds=[input_file_id],
+                inputParameters=[],
+                outputFiles=[],
+                outputFileIds=[output_file_id],
+                timestampCreated=0,
+                computeResourceId='cr1',
+                status='pending' if job_id == 'j2' else 'completed',
+                processorSpec=ComputeResourceSpecProcessor(name='proc', inputs=[], outputs=[], parameters=[], attributes=[], tags=[])
+            ))
+        # orphan.txt refers to a job that does not exist, but is not affected by this deletion
+        for file_id, job_id in [('in', None), ('f1', 'j1'), ('f2', 'j2'), ('other', None), ('f3', 'j3'), ('orphan', 'j-missing')]:
+            await insert_file(DendroFile(
+                projectId='p1',
+                fileId=file_id,
+                userId='u1',
+                fileName=f'{file_id}.txt',
+                size=1,
+                timestampCreated=0,
+                content='url:https://fake-url',
+                metadata={},
+                jobId=job_id
+            ))
+
+        _, seq, epoch = await broker.wait_for_events(channel='cr1', since=None, epoch=None, timeout_sec=0)
+        await delete_file('p1', 'in.txt')
+        await _remove_detached_files_and_jobs('p1', deleted_file_ids=['in'], deleted_job_ids=[])
+
+        # the compute resource is told about the deleted pending job, so that it is not started
+        events, _, _ = await broker.wait_for_events(channel='cr1', since=seq, epoch=epoch, timeout_sec=0)
+        assert [(e['type'], e['jobId']) for e in events] == [('jobDeleted', 'j2')]
+
+        assert await fetch_job('j1') is None and await fetch_job('j2') is None
+        assert await fetch_job('j3') is not None
+        assert sorted([f.fileId for f in await fetch_project_files('p1')]) == ['f3', 'orphan', 'other']
+
+        # deleting a job removes the files it produced
+        await _remove_detached_files_and_jobs('p1', deleted_file_ids=[], deleted_job_ids=['j-missing'])
+        assert sorted([f.fileId for f in await fetch_project_files('p1')]) == ['f3', 'other']
+    finally:
+        set_event_broker(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
+
+
+@pytest.mark.api
+def test_job_listings_include_archived_jobs():
+    import asyncio
+    from dendro.common._api_request import _use_api_test_client
+    from dendro.mock import set_use_mock
+    from dendro.common.dendro_types import DendroJob, ComputeResourceSpecProcessor
+    from dendro.api_helpers.clients.db import insert_job, archive_old_jobs
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.routers.gui._authenticate_gui_request import _create_mock_github_access_token
+    from test_integration import _get_fastapi_app, _create_project
+
+    from fastapi.testclient import TestClient
+    app = _get_fastapi_app()
+    test_client = TestClient(app)
+    _use_api_test_client(test_client)
+    set_use_mock(True)
+
+    try:
+        github_access_token = _create_mock_github_access_token()
+        project_id = _create_project('project1', github_access_token=github_access_token)
+
+        async def insert_jobs():
+            for job_id, status, timestamp_finished in [('j1', 'completed', 100), ('j2', 'pending', None)]:
+                await insert_job(DendroJob(
+                    projectId=project_id,
+                    jobId=job_id,
+                    jobPrivateKey='k1',
+                    userId='u1',
+                    processorName='proc',
+                    inputFiles=[],
+                    inputFileIds=[],
+                    inputParameters=[],
+                    outputFiles=[],
+                    timestampCreated=0,
+                    timestampFinished=timestamp_finished,
+                    computeResourceId='cr1',
+                    status=status,
+                    processorSpec=ComputeResourceSpecProcessor(name='proc', inputs=[], outputs=[], parameters=[], attributes=[], tags=[])
+                ))
+        asyncio.run(insert_jobs())
+        project_before = test_client.get(f'/api/gui/projects/{project_id}').json()['project']
+        assert asyncio.run(archive_old_jobs(min_age_sec=60)) == 1
+
+        # archiving bumps the version of the project, so that versioned cached listings are not stale
+        project = test_client.get(f'/api/gui/projects/{project_id}').json()['project']
+        assert project['timestampModified'] > project_before['timestampModified']
+
+        # the job history includes the archived jobs unless only the live set is asked for
+        for url_path in [f'/api/gui/projects/{project_id}/jobs', f'/api/client/projects/{project_id}/jobs']:
+            resp = test_client.get(url_path)
+            assert resp.status_code == 200
+            assert sorted([j['jobId'] for j in resp.json()['jobs']]) == ['j1', 'j2']
+            resp = test_client.get(url_path, params={'include_archived': 'false'})
+            assert resp.status_code == 200
+            assert [j['jobId'] for j in resp.json()['jobs']] == ['j2']
+    finally:
+        _use_api_test_client(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
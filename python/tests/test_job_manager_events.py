@@ -0,0 +1,75 @@
+def test_job_manager_applies_job_events(monkeypatch, create_job):
+    from dendro.compute_resource import JobManager as job_manager_module
+    from dendro.compute_resource.JobManager import JobManager
+
+    job_manager = JobManager(compute_resource_id='cr1', compute_resource_private_key='', app_manager=None) # type: ignore
+
+    # serve the requests for individual jobs from this "server-side" table, and record them
+    server_jobs = {'j3': create_job('j3', status='pending')}
+    server_waiting_job_ids = set()
+    fetched = []
+
+    def compute_resource_get_api_request(*, url_path: str, compute_resource_id: str, compute_resource_private_key: str, params: dict, timeout: float = 60):
+        assert url_path == '/api/compute_resource/compute_resources/cr1/jobs'
+        job_ids = params['job_ids'].split(',')
+        fetched.append(job_ids)
+        return {
+            'jobs': [_model_dump(server_jobs[job_id]) for job_id in job_ids if job_id in server_jobs],
+            'waitingJobIds': [job_id for job_id in job_ids if job_id in server_waiting_job_ids],
+            'success': True
+        }
+    monkeypatch.setattr(job_manager_module, '_compute_resource_get_api_request', compute_resource_get_api_request)
+    job_manager._schedule_jobs = lambda: None # type: ignore
+
+    # full sync
+    job_manager.handle_jobs([create_job('j1', status='pending'), create_job('j2', status='starting')], waiting_job_ids=['j4'])
+    assert sorted(j.jobId for j in job_manager.get_jobs()) == ['j1', 'j2']
+
+    # status changes are applied without fetching
+    job_manager.handle_job_events([
+        {'type': 'jobStatusChanged', 'jobId': 'j2', 'status': 'running'},
+        {'type': 'jobStatusChanged', 'jobId': 'j1', 'status': 'failed'}
+    ])
+    assert fetched == []
+    assert [(j.jobId, j.status) for j in job_manager.get_jobs()] == [('j2', 'running')]
+
+    # a new job is fetched by ID
+    job_manager.handle_job_events([{'type': 'newPendingJob', 'jobId': 'j3'}])
+    assert fetched == [['j3']]
+    assert sorted(j.jobId for j in job_manager.get_jobs()) == ['j2', 'j3']
+
+    # a job that is not ready yet is tracked as waiting
+    server_waiting_job_ids.add('j5')
+    job_manager.handle_job_events([{'type': 'newPendingJob', 'jobId': 'j5'}])
+    assert fetched[-1] == ['j5']
+    assert job_manager._waiting_job_ids == {'j4', 'j5'}
+
+    # when a job completes, the waiting jobs are fetched because they may be ready now
+    server_jobs['j4'] = create_job('j4', status='pending')
+    server_waiting_job_ids.discard('j4')
+    job_manager.handle_job_events([{'type': 'jobStatusChanged', 'jobId': 'j2', 'status': 'completed'}])
+    assert sorted(fetched[-1]) == ['j4', 'j5']
+    assert sorted(j.jobId for j in job_manager.get_jobs()) == ['j3', 'j4']
+    assert job_manager._waiting_job_ids == {'j5'}
+
+    # approval is not a real status change, so the job is fetched
+    job_manager.handle_job_events([{'type': 'jobStatusChanged', 'jobId': 'j3', 'status': 'pending'}])
+    assert fetched[-1] == ['j3']
+
+    # for coalesced messages all the jobs are fetched
+    del server_jobs['j3']
+    job_manager.handle_job_events([{'type': 'jobStatusChanged', 'jobId': 'j4', 'jobIds': ['j3', 'j4'], 'status': 'running'}])
+    assert fetched[-1][:2] == ['j3', 'j4']
+    assert sorted(j.jobId for j in job_manager.get_jobs()) == ['j4']
+
+    # a deleted job is removed right away, without fetching
+    num_fetched = len(fetched)
+    job_manager.handle_job_events([{'type': 'jobDeleted', 'jobId': 'j4', 'jobIds': ['j4', 'j5']}])
+    assert len(fetched) == num_fetched
+    assert job_manager.get_jobs() == [] and len(job_manager._waiting_job_ids) == 0
+
+def _model_dump(model):
+    # handle both pydantic v1 and v2
+    if hasattr(model, 'model_dump'):
+        return model.model_dump()
+    return model.dict()
@@ -0,0 +1,39 @@
+import time
+import threading
+
+
+def test_job_manager_launches_jobs_concurrently(monkeypatch, create_job, mock_app_manager):
+    from dendro.compute_resource.JobManager import JobManager
+
+    monkeypatch.setenv('LOCAL_MAX_NUM_CPUS', '10')
+    monkeypatch.setenv('LOCAL_MAX_MEMORY_GB', '100')
+    monkeypatch.setenv('MAX_CONCURRENT_JOB_LAUNCHES', '4')
+    job_manager = JobManager(compute_resource_id='cr1', compute_resource_private_key='', app_manager=mock_app_manager) # type: ignore
+
+    release = threading.Event()
+    launched = []
+    launched_lock = threading.Lock()
+
+    def launch_job(job, run_process=True, return_shell_command=False):
+        if job.jobId == 'bad':
+            raise Exception('Unexpected error')
+        release.wait(10) # a slow launch (e.g., docker pull)
+        with launched_lock:
+            launched.append(job.jobId)
+    job_manager._launch_job = launch_job # type: ignore
+
+    try:
+        jobs = [create_job('bad', timestamp_created=0)] + [create_job(f'j{i}', timestamp_created=i + 1) for i in range(6)]
+        timer = time.time()
+        job_manager.handle_jobs(jobs)
+        # the daemon loop is not blocked by the slow launches
+        assert time.time() - timer < 1
+        assert job_manager._attempted_to_start_job_ids == set(j.jobId for j in jobs)
+
+        # jobs are not started again while their launch is in progress
+        job_manager.handle_jobs(jobs)
+        release.set()
+    finally:
+        job_manager.close()
+    # the error launching one job does not affect the others
+    assert sorted(launched) == [f'j{i}' for i in range(6)]
@@ -0,0 +1,47 @@
+def test_fair_share_job_queue_policy(create_job):
+    from dendro.compute_resource.JobQueuePolicy import FairShareJobQueuePolicy, FifoJobQueuePolicy
+
+    # a big batch from one user does not block the jobs of another user
+    jobs = [create_job(f'a{i}', user_id='alice', project_id='pa', timestamp_created=i) for i in range(1000)]
+    jobs.append(create_job('b0', user_id='bob', project_id='pb', timestamp_created=5000))
+    jobs.append(create_job('b1', user_id='bob', project_id='pb', timestamp_created=5001))
+    assert [j.jobId for j in FifoJobQueuePolicy().order_pending_jobs(jobs)][-2:] == ['b0', 'b1']
+    policy = FairShareJobQueuePolicy()
+    ordered = [j.jobId for j in policy.order_pending_jobs(jobs)]
+    assert len(ordered) == len(jobs)
+    assert ordered.index('b0') <= 2 and ordered.index('b1') <= 4
+    assert [x for x in ordered if x.startswith('a')] == [f'a{i}' for i in range(1000)]
+
+    # recent usage counts against a user
+    for i in range(10):
+        policy.record_job_started(create_job(f'x{i}', user_id='bob', project_id='pb'))
+    ordered = [j.jobId for j in policy.order_pending_jobs(jobs)]
+    assert ordered.index('b0') >= 10
+
+    # usage decays
+    policy = FairShareJobQueuePolicy(half_life_sec=0.0001)
+    for i in range(10):
+        policy.record_job_started(create_job(f'x{i}', user_id='bob', project_id='pb'))
+    import time
+    time.sleep(0.01)
+    assert policy.get_user_usage('bob') < 0.001
+
+    # priority within the jobs of a user
+    jobs = [
+        create_job('old', timestamp_created=1),
+        create_job('urgent', timestamp_created=2, priority=10),
+        create_job('newer', timestamp_created=3)
+    ]
+    assert [j.jobId for j in FairShareJobQueuePolicy().order_pending_jobs(jobs)] == ['urgent', 'old', 'newer']
+
+def test_slurm_groups_follow_queue_order(create_job):
+    from dendro.compute_resource.SlurmJobHandler import _split_jobs_into_groups
+
+    jobs = [
+        create_job('b0', batch_id='batch1'),
+        create_job('single'),
+        create_job('b1', batch_id='batch1'),
+        create_job('c0', batch_id='batch2')
+    ]
+    groups = _split_jobs_into_groups(jobs)
+    assert [[j.jobId for j in g._jobs] for g in groups] == [['b0', 'b1'], ['single'], ['c0']]
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_job_status_transitions():
+    from dendro.mock import set_use_mock
+    from dendro.common.dendro_types import DendroJob, ComputeResourceSpecProcessor
+    from dendro.api_helpers.clients.db import insert_job, fetch_job
+    from dendro.api_helpers.clients._get_mongo_client import _get_mongo_client, _clear_mock_mongo_databases
+    from dendro.api_helpers.services.processor.update_job_status import update_job_status, JobStatusTransitionError
+
+    set_use_mock(True)
+    try:
+        await _get_mongo_client()['dendro']['projects'].insert_one({'projectId': 'p1'})
+        await insert_job(DendroJob(
+            projectId='p1',
+            jobId='j1',
+            jobPrivateKey='k1',
+            userId='u1',
+            processorName='proc',
+            inputFiles=[],
+            inputFileIds=[],
+            inputParameters=[],
+            outputFiles=[],
+            timestampCreated=0,
+            computeResourceId='cr1',
+            status='pending',
+            processorSpec=ComputeResourceSpecProcessor(name='proc', inputs=[], outputs=[], parameters=[], attributes=[], tags=[])
+        ))
+
+        # only one of two concurrent transitions from pending to starting succeeds
+        results = await asyncio.gather(
+            update_job_status(job_id='j1', status='starting', error=None),
+            update_job_status(job_id='j1', status='starting', error=None),
+            return_exceptions=True
+        )
+        assert len([r for r in results if isinstance(r, JobStatusTransitionError)]) == 1
+        job = await fetch_job('j1')
+        assert job is not None and job.status == 'starting'
+
+        with pytest.raises(JobStatusTransitionError):
+            await update_job_status(job_id='j1', status='completed', error=None)
+
+        await update_job_status(job_id='j1', status='failed', error='some error')
+        job = await fetch_job('j1')
+        assert job is not None and job.status == 'failed' and job.error == 'some error'
+
+        # force_update skips the check
+        await update_job_status(job_id='j1', status='running', error=None, force_update=True)
+        job = await fetch_job('j1')
+        assert job is not None and job.status == 'running'
+    finally:
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
+
+
+@pytest.mark.asyncio
+@pytest.mark.api
+async def test_complete_job_replaces_pending_output_files(monkeypatch):
+    from dendro.mock import set_use_mock
+    from dendro.common.dendro_types import DendroJob, DendroJobOutputFile, ComputeResourceSpecProcessor
+    from dendro.api_helpers.clients.db import insert_job, fetch_job, fetch_file
+    from dendro.api_helpers.clients._get_mongo_client import _get_mongo_client, _clear_mock_mongo_databases
+    from dendro.api_helpers.services._create_output_file import _create_output_file
+    from dendro.api_helpers.services.processor import update_job_status as update_job_status_module
+    from dendro.api_helpers.services.processor.update_job_status import update_job_status, JobStatusTransitionError
+
+    replace_pending_output_files = update_job_status_module._replace_pending_output_files
+    num_replace_calls = [0]
+
+    async def counting_replace_pending_output_files(**kwargs):
+        num_replace_calls[0] += 1
+        return await replace_pending_output_files(**kwargs)
+    monkeypatch.setattr(update_job_status_module, '_replace_pending_output_files', counting_replace_pending_output_files)
+
+    set_use_mock(True)
+    try:
+        await _get_mongo_client()['dendro']['projects'].insert_one({'projectId': 'p1'})
+        pending_file_ids = {}
+        for name in ['out1', 'out2']:
+            pending_file_ids[name] = await _create_output_file(file_name=f'output/{name}.dat', url='pending', project_id='p1', user_id='u1', job_id='j1')
+        await insert_job(DendroJob(
+            projectId='p1',
+            jobId='j1',
+            jobPrivateKey='k1',
+            userId='u1',
+            processorName='proc',
+            inputFiles=[],
+            inputFileIds=[],
+            inputParameters=[],
+            outputFiles=[
+                DendroJobOutputFile(name='out1', fileName='output/out1.dat'),
+                DendroJobOutputFile(name='out2', fileName='output/out2.dat', skipCloudUpload=True)
+            ],
+            timestampCreated=0,
+            computeResourceId='cr1',
+            status='running',
+            processorSpec=ComputeResourceSpecProcessor(name='proc', inputs=[], outputs=[], parameters=[], attributes=[], tags=[])
+        ))
+
+        # only one of two concurrent completers finalizes the output files
+        results = await asyncio.gather(
+            update_job_status(job_id='j1', status='completed', error=None, output_file_sizes={'out1': 100, 'out2': 200}),
+            update_job_status(job_id='j1', status='completed', error=None, output_file_sizes={'out1': 100, 'out2': 200}),
+            return_exceptions=True
+        )
+        assert len([r for r in results if isinstance(r, JobStatusTransitionError)]) == 1
+        assert num_replace_calls[0] == 1
+
+        job = await fetch_job('j1')
+        assert job is not None and job.status == 'completed'
+        assert job.outputFileIds == [pending_file_ids['out1'], pending_file_ids['out2']]
+        f1 = await fetch_file('p1', 'output/out1.dat')
+        assert f1 is not None and f1.fileId == pending_file_ids['out1'] and f1.content == 'url:https://mock-bucket/dendro-outputs/p1/j1/out1'
+        f2 = await fetch_file('p1', 'output/out2.dat')
+        assert f2 is not None and f2.size == 200 and f2.content.startswith(f'dendro:?project=p1&file_id={pending_file_ids["out2"]}&')
+    finally:
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
@@ -0,0 +1,56 @@
+import pytest
+
+
+def test_processor_spec_validator():
+    from dendro.common.dendro_types import ComputeResourceSpecProcessor, ComputeResourceSpecProcessorInput, ComputeResourceSpecProcessorOutput, ComputeResourceSpecProcessorParameter
+    from dendro.common._processor_spec_validator import get_processor_spec_validator, ProcessorSpecValidationError
+
+    def create_spec():
+        return ComputeResourceSpecProcessor(
+            name='proc1',
+            inputs=[
+                ComputeResourceSpecProcessorInput(name='input'),
+                ComputeResourceSpecProcessorInput(name='extra', list=True)
+            ],
+            outputs=[ComputeResourceSpecProcessorOutput(name='output')],
+            parameters=[
+                ComputeResourceSpecProcessorParameter(name='p1', type='int'),
+                ComputeResourceSpecProcessorParameter(name='p2', type='str', default='x'),
+                ComputeResourceSpecProcessorParameter(name='p3', type='Optional[float]')
+            ],
+            attributes=[],
+            tags=[]
+        )
+
+    # identical specs share a compiled validator
+    validator = get_processor_spec_validator(create_spec())
+    assert get_processor_spec_validator(create_spec()) is validator
+
+    validator.validate(
+        processor_name='proc1',
+        input_files=[('input', False), ('extra[0]', False), ('extra[1]', False)],
+        output_files=[('output', False)],
+        parameters=[('p1', 3)]
+    )
+
+    def check_error(msg: str, **kwargs):
+        args = {
+            'processor_name': 'proc1',
+            'input_files': [('input', False)],
+            'output_files': [('output', False)],
+            'parameters': [('p1', 3)],
+            **kwargs
+        }
+        with pytest.raises(ProcessorSpecValidationError, match=msg):
+            validator.validate(**args)
+
+    check_error('Processor name mismatch', processor_name='proc2')
+    check_error('Processor input not found: other', input_files=[('input', False), ('other', False)])
+    check_error('Processor input is not a list: input', input_files=[('input[0]', False)])
+    check_error('Processor input folder not found: input', input_files=[('input', True)])
+    check_error('Required input not found: input', input_files=[])
+    check_error('Required output not found: output', output_files=[])
+    check_error('Processor output folder not found: output', output_files=[('output', True)])
+    check_error('Processor parameter not found: p4', parameters=[('p1', 3), ('p4', 1)])
+    check_error('Parameter value is not consistent with type: p1', parameters=[('p1', 'abc')])
+    check_error('Required parameter not found: p1', parameters=[])
@@ -0,0 +1,94 @@
+import pytest
+
+
+@pytest.mark.api
+def test_project_folder_listing():
+    from dendro.common._api_request import _use_api_test_client
+    from dendro.mock import set_use_mock
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.routers.gui._authenticate_gui_request import _create_mock_github_access_token
+    from dendro.client import load_project
+    from test_integration import _get_fastapi_app, _create_project, _create_project_file
+
+    from fastapi.testclient import TestClient
+    app = _get_fastapi_app()
+    test_client = TestClient(app)
+    _use_api_test_client(test_client)
+    set_use_mock(True)
+
+    try:
+        github_access_token = _create_mock_github_access_token()
+        project_id = _create_project('project1', github_access_token=github_access_token)
+        for file_name in ['a.txt', 'd1/b.txt', 'd1/d2/c.txt', 'd1/d2/c2.txt', 'd3/e.txt', 'd1x.txt']:
+            _create_project_file(project_id=project_id, file_name=file_name, content='url:https://fake-url', github_access_token=github_access_token)
+
+        resp = test_client.get(f'/api/client/projects/{project_id}/folder', params={'path': 'd1'})
+        assert resp.status_code == 200
+        assert [f['fileName'] for f in resp.json()['files']] == ['d1/b.txt']
+        assert [(f['path'], f['numFiles']) for f in resp.json()['folders']] == [('d1/d2', 2)]
+        resp = test_client.get(f'/api/client/projects/{project_id}/folder', params={'path': ''})
+        assert resp.status_code == 200
+        assert [f['fileName'] for f in resp.json()['files']] == ['a.txt', 'd1x.txt']
+        # the mock files have a size of 1
+        assert [(f['path'], f['numFiles'], f['totalSize']) for f in resp.json()['folders']] == [('d1', 3, 3), ('d3', 1, 1)]
+
+        for lazy_files in [False, True]:
+            project = load_project(project_id, lazy_files=lazy_files)
+            root = project.get_folder('')
+            assert [f.file_name for f in root.get_files()] == ['a.txt', 'd1x.txt']
+            assert [f.path for f in root.get_folders()] == ['d1', 'd3']
+            d1 = project.get_folder('d1')
+            assert [f.file_name for f in d1.get_files()] == ['d1/b.txt']
+            assert [f.path for f in d1.get_folders()] == ['d1/d2']
+            assert d1.num_files == 3
+            assert [f.file_name for f in project.get_folder('d1/d2').get_files()] == ['d1/d2/c.txt', 'd1/d2/c2.txt']
+            assert project.get_file('d1/d2/c.txt') is not None
+            assert project.get_file('d1/d2/nonexistent.txt') is None
+    finally:
+        _use_api_test_client(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
+
+
+@pytest.mark.api
+def test_set_file_on_lazily_loaded_project():
+    import os
+    from dendro.common._api_request import _use_api_test_client
+    from dendro.mock import set_use_mock
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.routers.gui._authenticate_gui_request import _create_mock_github_access_token
+    from dendro.client import load_project, set_file
+    from test_integration import _get_fastapi_app, _create_project, _create_project_file
+
+    from fastapi.testclient import TestClient
+    app = _get_fastapi_app()
+    test_client = TestClient(app)
+    _use_api_test_client(test_client)
+    set_use_mock(True)
+    old_env = os.environ.copy()
+
+    try:
+        github_access_token = _create_mock_github_access_token()
+        user_id = 'github|' + github_access_token[len('mock:'):]
+        resp = test_client.post(f'/api/gui/users/{user_id}/dendro_api_key', headers={'github-access-token': github_access_token})
+        assert resp.status_code == 200
+        os.environ['DENDRO_API_KEY'] = resp.json()['dendroApiKey']
+        project_id = _create_project('project1', github_access_token=github_access_token)
+        _create_project_file(project_id=project_id, file_name='d1/a.txt', content='url:https://fake-url', github_access_token=github_access_token)
+
+        project = load_project(project_id, lazy_files=True)
+        assert project._files is None
+        # unchanged: nothing is sent
+        set_file(project=project, file_name='d1/a.txt', url='https://fake-url')
+        # new metadata for an existing file
+        set_file(project=project, file_name='d1/a.txt', url='https://fake-url', metadata={'x': 1})
+
+        project = load_project(project_id, lazy_files=True)
+        a = project.get_file('d1/a.txt')
+        assert a is not None and a._file_data.metadata == {'x': 1}
+    finally:
+        os.environ.clear()
+        os.environ.update(old_env)
+        _use_api_test_client(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
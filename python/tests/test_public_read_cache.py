@@ -0,0 +1,64 @@
+import pytest
+
+
+@pytest.mark.api
+def test_public_read_cache_headers():
+    from dendro.common._api_request import _use_api_test_client
+    from dendro.mock import set_use_mock
+    from dendro.api_helpers.clients._get_mongo_client import _clear_mock_mongo_databases
+    from dendro.api_helpers.routers.gui._authenticate_gui_request import _create_mock_github_access_token
+    from dendro.api_helpers.core._public_read_cache import VERSIONED_S_MAXAGE_SEC, VERSIONED_STALE_WHILE_REVALIDATE_SEC
+    from test_integration import _get_fastapi_app, _create_project, _create_project_file, _set_project_publicly_readable
+
+    from fastapi.testclient import TestClient
+    app = _get_fastapi_app()
+    test_client = TestClient(app)
+    _use_api_test_client(test_client)
+    set_use_mock(True)
+
+    try:
+        github_access_token = _create_mock_github_access_token()
+        project_id = _create_project('project1', github_access_token=github_access_token)
+
+        resp = test_client.get(f'/api/client/projects/{project_id}')
+        assert resp.status_code == 200
+        version = resp.json()['project']['timestampModified']
+        etag = resp.headers['etag']
+        assert resp.headers['cache-control'] == 'public, no-cache'
+        assert f'project-{project_id}' in resp.headers['surrogate-key'].split(' ')
+
+        # requests for the current version can be cached by the CDN
+        resp = test_client.get(f'/api/client/projects/{project_id}/files?v={version}')
+        assert resp.status_code == 200
+        assert 's-maxage=' in resp.headers['cache-control'] and 'stale-while-revalidate=' in resp.headers['cache-control']
+
+        # revalidation
+        resp = test_client.get(f'/api/client/projects/{project_id}/jobs', headers={'If-None-Match': etag})
+        assert resp.status_code == 304
+
+        # writes bump the version
+        _create_project_file(project_id=project_id, file_name='file1.txt', content='url:https://fake-url', github_access_token=github_access_token)
+        resp = test_client.get(f'/api/gui/projects/{project_id}/files?v={version}', headers={'If-None-Match': etag})
+        assert resp.status_code == 200
+        assert resp.headers['cache-control'] == 'public, no-cache'
+        assert resp.headers['etag'] != etag
+        assert [f['fileName'] for f in resp.json()['files']] == ['file1.txt']
+
+        # private projects are not cached
+        _set_project_publicly_readable(project_id=project_id, publicly_readable=False, github_access_token=github_access_token)
+        resp = test_client.get(f'/api/gui/projects/{project_id}/jobs')
+        assert resp.status_code == 200
+        assert resp.headers['cache-control'] == 'private, no-store'
+        assert 'etag' not in resp.headers
+
+        # the cached responses of a project that is made private expire soon
+        assert VERSIONED_S_MAXAGE_SEC + VERSIONED_STALE_WHILE_REVALIDATE_SEC <= 60 * 10
+
+        # missing project
+        for url_path in ['/api/client/projects/nonexistent/files', '/api/client/projects/nonexistent/folder', '/api/client/projects/nonexistent/jobs', '/api/gui/projects/nonexistent/files', '/api/gui/projects/nonexistent/jobs']:
+            assert test_client.get(url_path).status_code == 404
+            assert test_client.get(url_path, headers={'If-None-Match': etag}).status_code == 404
+    finally:
+        _use_api_test_client(None)
+        set_use_mock(False)
+        _clear_mock_mongo_databases()
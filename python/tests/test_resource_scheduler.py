@@ -0,0 +1,96 @@
+def test_choose_pending_jobs_to_start(create_job):
+    from dendro.compute_resource.ResourceScheduler import RunMethodCapacity, choose_pending_jobs_to_start
+
+    capacity = RunMethodCapacity(num_cpus=32, num_gpus=1, memory_gb=64)
+
+    # many small jobs fit on a big machine
+    jobs = [create_job(f'j{i}', timestamp_created=i) for i in range(40)]
+    to_start = choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set())
+    assert [j.jobId for j in to_start] == [f'j{i}' for i in range(32)]
+
+    # running jobs and jobs that were started (but are still pending) reserve resources
+    jobs = [
+        create_job('running', status='running', memory_gb=40),
+        create_job('started', memory_gb=20, timestamp_created=1),
+        create_job('too-big', memory_gb=10, timestamp_created=2),
+        create_job('small', memory_gb=4, timestamp_created=3)
+    ]
+    to_start = choose_pending_jobs_to_start(jobs, capacity, started_job_ids={'started'})
+    assert [j.jobId for j in to_start] == ['small']
+
+    # GPUs
+    jobs = [create_job('gpu1', num_gpus=1, timestamp_created=1), create_job('gpu2', num_gpus=1, timestamp_created=2)]
+    to_start = choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set())
+    assert [j.jobId for j in to_start] == ['gpu1']
+
+    # a job that can never fit runs alone
+    jobs = [create_job('huge', num_cpus=64, timestamp_created=1), create_job('small', timestamp_created=2)]
+    to_start = choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set())
+    assert [j.jobId for j in to_start] == ['huge']
+    jobs = [create_job('running', status='running'), create_job('huge', num_cpus=64, timestamp_created=1)]
+    assert choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set()) == []
+
+    # limit on the number of jobs
+    capacity = RunMethodCapacity(max_num_jobs=2)
+    jobs = [create_job('running', status='running')] + [create_job(f'j{i}', timestamp_created=i) for i in range(5)]
+    to_start = choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set())
+    assert [j.jobId for j in to_start] == ['j0']
+
+def test_large_jobs_are_not_starved(create_job):
+    import time
+    from dendro.compute_resource.ResourceScheduler import RunMethodCapacity, choose_pending_jobs_to_start
+
+    capacity = RunMethodCapacity(num_cpus=4)
+    now = time.time()
+
+    # a large job that has not waited long lets younger small jobs go ahead of it
+    jobs = [
+        create_job('running', status='running', num_cpus=2),
+        create_job('large', num_cpus=4, timestamp_created=now - 10),
+        create_job('small', num_cpus=1, timestamp_created=now - 5)
+    ]
+    to_start = choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set(), max_backfill_wait_sec=60)
+    assert [j.jobId for j in to_start] == ['small']
+
+    # once it has waited too long, younger jobs are held back until it fits
+    jobs[1] = create_job('large', num_cpus=4, timestamp_created=now - 100)
+    assert choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set(), max_backfill_wait_sec=60) == []
+    assert [j.jobId for j in choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set())] == ['small']
+    to_start = choose_pending_jobs_to_start(jobs[1:], capacity, started_job_ids=set(), max_backfill_wait_sec=60)
+    assert [j.jobId for j in to_start] == ['large']
+
+    # the same goes for a job that requires more than the total capacity and can only run alone
+    jobs = [
+        create_job('running', status='running', num_cpus=1),
+        create_job('huge', num_cpus=64, timestamp_created=now - 100),
+        create_job('small', num_cpus=1, timestamp_created=now - 5)
+    ]
+    assert choose_pending_jobs_to_start(jobs, capacity, started_job_ids=set(), max_backfill_wait_sec=60) == []
+    to_start = choose_pending_jobs_to_start(jobs[1:], capacity, started_job_ids=set(), max_backfill_wait_sec=60)
+    assert [j.jobId for j in to_start] == ['huge']
+
+def test_get_run_method_capacity(monkeypatch):
+    from dendro.compute_resource.ResourceScheduler import get_run_method_capacity
+
+    monkeypatch.setenv('LOCAL_MAX_NUM_CPUS', '8')
+    monkeypatch.setenv('LOCAL_MAX_MEMORY_GB', '15.5')
+    monkeypatch.setenv('LOCAL_MAX_NUM_GPUS', '')
+    capacity = get_run_method_capacity('local')
+    assert capacity.num_cpus == 8
+    assert capacity.memory_gb == 15.5
+    assert capacity.num_gpus is not None
+    assert capacity.max_num_jobs is None
+
+    capacity = get_run_method_capacity('aws_batch')
+    assert capacity.max_num_jobs == 20
+    assert capacity.num_cpus is None
+
+def test_get_max_backfill_wait_sec(monkeypatch):
+    from dendro.compute_resource.ResourceScheduler import get_max_backfill_wait_sec, DEFAULT_MAX_BACKFILL_WAIT_SEC
+
+    monkeypatch.delenv('JOB_MAX_BACKFILL_WAIT_SEC', raising=False)
+    assert get_max_backfill_wait_sec() == DEFAULT_MAX_BACKFILL_WAIT_SEC
+    monkeypatch.setenv('JOB_MAX_BACKFILL_WAIT_SEC', '30')
+    assert get_max_backfill_wait_sec() == 30
+    monkeypatch.setenv('JOB_MAX_BACKFILL_WAIT_SEC', '-1')
+    assert get_max_backfill_wait_sec() is None
@@ -0,0 +1,107 @@
+import os
+import threading
+
+
+def test_sif_image_cache(tmp_path):
+    from dendro.compute_resource.SifImageCache import SifImageCache
+
+    cache_dir = str(tmp_path / 'sif_cache')
+    builds = []
+    release_build = threading.Event()
+
+    def create_cache():
+        cache = SifImageCache(container_executable='apptainer', cache_dir=cache_dir)
+        cache._resolve_digest = lambda image: 'sha256:0123456789abcdef0123' # type: ignore
+
+        def build(image, output_path):
+            builds.append(image)
+            release_build.wait(10)
+            with open(output_path, 'w') as f:
+                f.write('sif')
+        cache._build = build # type: ignore
+        return cache
+
+    # two caches with the same directory (e.g., two compute resource processes on a cluster)
+    cache1 = create_cache()
+    cache2 = create_cache()
+
+    # without waiting, the build starts in the background and the job falls back to docker://
+    assert cache1.get_sif_path('user/app:1', wait=False) is None
+    results = []
+    thread = threading.Thread(target=lambda: results.append(cache2.get_sif_path('user/app:1', wait=True)))
+    thread.start()
+    release_build.set()
+    thread.join(10)
+
+    # built only once, and moved into place
+    assert builds == ['user/app:1']
+    sif_path = results[0]
+    assert sif_path == os.path.join(cache_dir, 'user_app_1-0123456789abcdef.sif')
+    assert os.path.exists(sif_path)
+    assert [f for f in os.listdir(cache_dir) if f.endswith('.tmp')] == []
+    assert cache1.get_sif_path('user/app:1', wait=True) == sif_path
+    assert builds == ['user/app:1']
+
+    # a new digest means a new build
+    cache1._resolve_digest = lambda image: 'sha256:fedcba9876543210fedc' # type: ignore
+    cache1.refresh()
+    cache1._get_future('user/app:1').result()
+    assert builds == ['user/app:1', 'user/app:1']
+    assert cache1.get_sif_path('user/app:1', wait=True) == os.path.join(cache_dir, 'user_app_1-fedcba9876543210.sif')
+
+
+def test_sif_image_cache_refresh_and_cleanup(tmp_path):
+    import time
+    from dendro.compute_resource.SifImageCache import SifImageCache
+
+    cache_dir = str(tmp_path / 'sif_cache')
+    os.makedirs(cache_dir)
+    resolving = threading.Event()
+    release_resolve = threading.Event()
+    digests = ['sha256:0123456789abcdef0123']
+
+    cache = SifImageCache(container_executable='apptainer', cache_dir=cache_dir, resolve_max_age_sec=0, stale_lock_sec=60)
+
+    def resolve_digest(image):
+        if len(cache._resolved) > 0:
+            resolving.set()
+            release_resolve.wait(10) # e.g., a slow registry
+        return digests[-1]
+
+    def build(image, output_path):
+        with open(output_path, 'w') as f:
+            f.write('sif')
+    cache._resolve_digest = resolve_digest # type: ignore
+    cache._build = build # type: ignore
+
+    # a stale lock file (e.g., the build was interrupted on another node) is taken over
+    old_sif_path = os.path.join(cache_dir, 'user_app_1-0123456789abcdef.sif')
+    with open(old_sif_path + '.lock', 'w') as f:
+        f.write('')
+    os.utime(old_sif_path + '.lock', (time.time() - 120, time.time() - 120))
+    assert cache.get_sif_path('user/app:1', wait=True) == old_sif_path
+    assert not os.path.exists(old_sif_path + '.lock')
+
+    # the last .sif is used while the image is resolved again in the background
+    digests.append('sha256:fedcba9876543210fedc')
+    assert cache.get_sif_path('user/app:1', wait=False) == old_sif_path
+    assert resolving.wait(10)
+    assert cache.get_sif_path('user/app:1', wait=True) == old_sif_path
+    release_resolve.set()
+    cache._get_future('user/app:1').result()
+    new_sif_path = os.path.join(cache_dir, 'user_app_1-fedcba9876543210.sif')
+    assert cache.get_sif_path('user/app:1', wait=True) == new_sif_path
+
+    # the previous .sif is removed once the new one has been there for a while, along with leftover lock files
+    other_sif_path = os.path.join(cache_dir, 'other_app-0123456789abcdef.sif')
+    for path in [other_sif_path, other_sif_path + '.lock']:
+        with open(path, 'w') as f:
+            f.write('')
+    os.utime(other_sif_path + '.lock', (time.time() - 120, time.time() - 120))
+    cache._remove_old_files()
+    assert os.path.exists(old_sif_path)
+    os.utime(new_sif_path, (time.time() - 60 * 60 * 25, time.time() - 60 * 60 * 25))
+    cache._remove_old_files()
+    assert not os.path.exists(old_sif_path)
+    assert os.path.exists(new_sif_path)
+    assert os.path.exists(other_sif_path) and not os.path.exists(other_sif_path + '.lock')
@@ -509,8 +509,9 @@ export const approveJob = async (jobId: string, auth: Auth): Promise<void> => {
     if (!resp.success) throw Error(`Error in approveJob: ${resp.error}`)
 }
 
-export const fetchJobsForProject = async (projectId: string, auth: Auth): Promise<DendroJob[]> => {
-    const url = `${apiBase}/api/gui/projects/${projectId}/jobs`
+export const fetchJobsForProject = async (projectId: string, auth: Auth, o: {includeArchived?: boolean} = {}): Promise<DendroJob[]> => {
+    // archived jobs (finished a while ago) are included unless includeArchived is false
+    const url = `${apiBase}/api/gui/projects/${projectId}/jobs${o.includeArchived === false ? '?include_archived=false' : ''}`
     const response = await getRequest(url, auth)
     if (!response.success) throw Error(`Error in fetchJobsForProject: ${response.error}`)
     for (const job of response.jobs) {
@@ -522,8 +523,8 @@ export const fetchJobsForProject = async (projectId: string, auth: Auth): Promis
     return response.jobs
 }
 
-export const fetchJobsForComputeResource = async (computeResourceId: string, auth: Auth): Promise<DendroJob[]> => {
-    const url = `${apiBase}/api/gui/compute_resources/${computeResourceId}/jobs`
+export const fetchJobsForComputeResource = async (computeResourceId: string, auth: Auth, o: {includeArchived?: boolean} = {}): Promise<DendroJob[]> => {
+    const url = `${apiBase}/api/gui/compute_resources/${computeResourceId}/jobs${o.includeArchived === false ? '?include_archived=false' : ''}`
     const response = await getRequest(url, auth)
     if (!response.success) throw Error(`Error in fetchJobsForComputeResource: ${response.error}`)
     return response.jobs
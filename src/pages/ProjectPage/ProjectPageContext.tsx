@@ -288,7 +288,7 @@ export const SetupProjectPage: FunctionComponent<PropsWithChildren<Props>> = ({c
 
     useEffect(() => {
         const cancel = onPubsubMessage(message => {
-            if ((message.type === 'jobStatusChanged') || (message.type === 'newPendingJob')) {
+            if ((message.type === 'jobStatusChanged') || (message.type === 'newPendingJob') || (message.type === 'jobDeleted')) {
                 if (message.projectId === projectId) {
                     refreshJobs()
                     refreshFiles()
@@ -274,6 +274,7 @@ export type DendroJob = {
     dandiApiKey?: string
     deleted?: boolean
     pendingApproval?: boolean
+    priority?: number
 }
 
 export const isDendroJob = (x: any): x is DendroJob => {
@@ -308,10 +309,37 @@ export const isDendroJob = (x: any): x is DendroJob => {
         processorSpec: isComputeResourceSpecProcessor,
         dandiApiKey: optional(isString),
         deleted: optional(isBoolean),
-        pendingApproval: optional(isBoolean)
+        pendingApproval: optional(isBoolean),
+        priority: optional(isNumber)
     }, {callback: (e) => {console.warn(e);}})
 }
 
+export type DendroFileManifestFile = {
+    name: string
+    size?: number
+}
+
+export const isDendroFileManifestFile = (x: any): x is DendroFileManifestFile => {
+    return validateObject(x, {
+        name: isString,
+        size: optional(isNumber)
+    })
+}
+
+export type DendroFileManifest = {
+    numFiles: number
+    totalSize: number
+    files?: DendroFileManifestFile[]
+}
+
+export const isDendroFileManifest = (x: any): x is DendroFileManifest => {
+    return validateObject(x, {
+        numFiles: isNumber,
+        totalSize: isNumber,
+        files: optional(isArrayOf(isDendroFileManifestFile))
+    })
+}
+
 export type DendroFile = {
     projectId: string
     fileId: string
@@ -323,6 +351,7 @@ export type DendroFile = {
     metadata: any
     isFolder?: boolean
     jobId?: string | null
+    fileManifest?: DendroFileManifest
 }
 
 export const isDendroFile = (x: any): x is DendroFile => {
@@ -336,7 +365,8 @@ export const isDendroFile = (x: any): x is DendroFile => {
         content: isString,
         metadata: () => true,
         isFolder: optional(isBoolean),
-        jobId: optional(isOneOf([isString, isNull]))
+        jobId: optional(isOneOf([isString, isNull])),
+        fileManifest: optional(isDendroFileManifest)
     })
 }
 
@@ -473,13 +503,15 @@ export type PubsubSubscription = {
     pubnubSubscribeKey: string
     pubnubChannel: string
     pubnubUser: string
+    eventStream?: boolean
 }
 
 export const isPubsubSubscription = (x: any): x is PubsubSubscription => {
     return validateObject(x, {
         pubnubSubscribeKey: isString,
         pubnubChannel: isString,
-        pubnubUser: isString
+        pubnubUser: isString,
+        eventStream: optional(isBoolean)
     })
 }
 